@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+# Check that the carve/cavern core of the maze package imports quickly and without the optional backends.
+# Every module is imported in a fresh interpreter, several times, and the fastest run is compared with the budget.
+coreModules = ['maze.helpers', 'maze.excavation']
+heavyModules = ['matplotlib', 'PIL', 'scipy', 'pymclevel']
+budgetSeconds = 0.25
+repeats = 5
+
+withinBudget = True
+for module in coreModules:
+	script = 'import sys, time; t = time.perf_counter(); import {}; print(time.perf_counter() - t); print(" ".join(sorted(m.split(".")[0] for m in sys.modules)))'.format(module)
+	runs = [subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout.split('\n') for _ in range(repeats)]
+	seconds = min(float(run[0]) for run in runs)
+	loaded = [m for m in heavyModules if m in runs[0][1].split()]
+	print('{}: {:.3f} s (budget {:.2f} s), optional backends loaded: {}'.format(module, seconds, budgetSeconds, ', '.join(loaded) or 'none'))
+	withinBudget = withinBudget and seconds <= budgetSeconds and not loaded
+sys.exit(0 if withinBudget else 1)
@@ -1,16 +1,19 @@
 import maze.helpers
 import maze.plotTools
 import maze.excavation
+import maze.validation
 
 # Generate a maze
 roomSize = (13,13)
 flatness = (0.5,-0.5)
 room = maze.helpers.Room(roomSize)
 print(room.shape)
-# holeyRoom = maze.excavation.carveCaverns(room, fillRatio=0.05, typicalCavernDiameter=5) # currently broken, don't use
+holeyRoom = maze.excavation.carveCaverns(room, fillRatio=0.05, typicalCavernDiameter=3)
 entrancePoint = (0,11)
 print('Carving passages...')
-exampleMaze, stackSize = maze.excavation.carvePassages(holeyRoom, entrancePoint, flatness, livePlot=True)
+exampleMaze, stackSize, exitPoint = maze.excavation.carvePassages(holeyRoom, entrancePoint, flatness, livePlot=True)
+# The caverns are carved before the passages, so connect them to the rest of the maze
+maze.validation.repairMaze(exampleMaze)
 
 # Render the maze to voxels
 passageSize = 8
@@ -19,4 +22,4 @@ renderedMaze = maze.plotTools.renderWalls(exampleMaze, passageSize, 1)
 
 # Plot the rendered maze to PNG
 print('Saving to PNG')
-maze.plotTools.saveToPNG(renderedMaze, 'maze.png')
\ No newline at end of file
+maze.plotTools.saveToPNG(renderedMaze, '.')
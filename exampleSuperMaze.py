@@ -33,7 +33,7 @@ def mergeSuperMaze(superMaze, roomSize):
         segmentMaze = superMaze[superMazeElement]
 
         # Iterate over each cell in the segment maze
-        for cell in np.ndindex(segmentMaze.dimensions):
+        for cell in np.ndindex(segmentMaze.shape):
             # Calculate the corresponding cell in the merged maze
             mergedCell = tuple(c + o for c, o in zip(cell, offset))
 
@@ -57,9 +57,9 @@ entrancePoint = (10,10,0)  # set entrance point to a position in the first room
 # Iterate over each element of the super maze
 for superMazeElement in np.ndindex(superMazeSize):
     room = maze.helpers.Room(roomSize)
-    holeyRoom = maze.excavation.createHoles(room, sum(roomSize) * 0.05, 5)  # 5 holes with a total volume of 5%
+    holeyRoom = maze.excavation.carveCaverns(room, fillRatio=0.05, typicalCavernDiameter=5)  # caverns with a total volume of 5%
 
-    segmentMaze, exitPosition = maze.excavation.carvePassages(holeyRoom, entrancePoint, flatness, livePlot=True)
+    segmentMaze, stackSize, exitPosition = maze.excavation.carvePassages(holeyRoom, entrancePoint, flatness, livePlot=False)
 
     # Store the segment maze in the super maze
     superMaze[superMazeElement] = segmentMaze
@@ -1,10 +1,10 @@
-import matplotlib.pyplot as plt
+import functools
 import maze.helpers
 import numpy as np
 import random
 
 
-def sample_random_value(typical_value, value_deviation):
+def sample_random_value(typical_value, value_deviation, size=None):
 	"""
 	Generates a random sample based on a log-normal distribution.
 	Log-normal distributions emulate distributions found in nature, such as the size of caves.
@@ -19,29 +19,33 @@ def sample_random_value(typical_value, value_deviation):
 		value_deviation = typical_value will make 5% of holes larger than 3 * typical_value and 5% smaller than typical_size / 3.
 		value_deviation = typical_value * 5 will make 5% of holes larger than 20 * typical_value and 5% smaller than typical_size / 20.
 
+	size: int, optional
+		The number of values to draw at once. By default a single value is drawn.
+
 	Returns:
-	value: float
-		A carefully randomized value. Ranges between 0 and infinity, with the median at typical_value.
+	value: float or ndarray
+		A carefully randomized value (or an array of them). Ranges between 0 and infinity, with the median at typical_value.
 	"""
 	mu = np.log(typical_value)
 	sigma = np.log1p(value_deviation / typical_value)
-	value = np.random.lognormal(mu, sigma)
+	value = np.random.lognormal(mu, sigma, size)
 	return value
 
 
 def cavern_diameter_to_shape(cavern_diameter, room_shape):
 	"""
 	Convert a cavern size and a room shape into a tuple of three cavern dimensions.
+	An array of cavern sizes is converted all at once, into an array with one row of dimensions per cavern.
 
 	Parameters:
-	cavern_size: float
+	cavern_size: float or ndarray
 		The volume of the cavern.
 
 	room_shape: tuple of int
 		The shape of the room as a tuple of three integers (length, width, height).
 
 	Returns:
-	tuple of int
+	tuple of int or ndarray
 		The dimensions of the cavern as a tuple of three integers.
 	"""
 	# Calculate the typical length of a side of the cavern assuming it's a perfect cube
@@ -51,9 +55,11 @@ def cavern_diameter_to_shape(cavern_diameter, room_shape):
 	room_aspect_ratio = np.array(room_shape) / np.min(room_shape)
 
 	# Adjust the cavern's dimensions based on the room's aspect ratio
-	cavern_shape = cube_side_length * room_aspect_ratio
+	cavern_shape = np.multiply.outer(cube_side_length, room_aspect_ratio)
 
 	# Round the dimensions to the nearest integers and return as a tuple
+	if np.ndim(cavern_diameter) > 0:
+		return np.round(cavern_shape).astype(np.int64)
 	return tuple(np.round(cavern_shape).astype(int))
 
 
@@ -122,11 +128,152 @@ def has_overlap_or_contact(position1, dimensions1, position2, dimensions2):
 	return True
 
 
+def boxSums(grid, boxShape):
+	"""
+	Count the set cells of a boolean grid inside a box at every position where the box fits, with a summed-area table.
+
+	Parameters:
+	grid: ndarray
+		The boolean grid.
+
+	boxShape: tuple of int
+		The dimensions of the box.
+
+	Returns:
+	ndarray
+		The number of set cells in the box with its lowest corner at each position, with the shape grid.shape - boxShape + 1.
+	"""
+	table = np.pad(grid.astype(np.int32 if grid.size < 2**31 else np.int64), [(1, 0)] * grid.ndim)
+	for dim in range(grid.ndim):
+		np.cumsum(table, axis=dim, out=table)
+	sums = 0
+	for corner in np.ndindex(*(2,) * grid.ndim):
+		sign = (-1)**(grid.ndim - sum(corner))
+		sums = sums + sign * table[tuple(slice(c * d, c * d + g - d + 1) for c, d, g in zip(corner, boxShape, grid.shape))]
+	return sums
+
+
+def planCaverns(roomShape, fillRatio, typicalCavernDiameter, sizeDeviation=1, candidateCount=64, maxBatches=4):
+	"""
+	Plan the layout of the caverns of a room, without touching the room.
+	All cavern sizes are drawn at once and the set is trimmed to the target volume: the caverns are kept while their
+	total volume stays within it, and the next one is shrunk to the volume that is left. The caverns are then placed
+	largest-first against an occupancy grid of the room, keeping at least one cell of wall between two caverns.
+
+	Parameters:
+	roomShape: tuple of int
+		The shape of the room.
+
+	fillRatio: float
+		The target ratio of the room's volume to be filled with caverns. Must be between 0 and 1.
+
+	typicalCavernDiameter: float
+		The diameter of the common cavern. Cavern sizes will be drawn from a log-normal random distribution.
+
+	sizeDeviation: float
+		The variation or deviation in cavern size, as in carveCaverns.
+
+	candidateCount: int, optional
+		The number of random positions that are checked at once for a cavern.
+
+	maxBatches: int, optional
+		The number of batches of random positions that are tried before the free positions of a shape are mapped.
+
+	Returns:
+	positions: ndarray
+		The lowest corner of every placed cavern, one row per cavern, from the largest to the smallest.
+
+	shapes: ndarray
+		The dimensions of every placed cavern.
+	"""
+	roomShape = np.array(roomShape, dtype=np.int64)
+	targetCavernVolume = int(np.prod(roomShape) * fillRatio)
+	typicalCavernVolume = max(int(np.prod(cavern_diameter_to_shape(typicalCavernDiameter, roomShape))), 1)
+
+	# Draw sizes until they add up to the target volume; the first draw almost always suffices
+	shapes = np.zeros((0, roomShape.size), dtype=np.int64)
+	volumes = np.zeros(0, dtype=np.int64)
+	for _ in range(8):
+		if volumes.sum() >= targetCavernVolume:
+			break
+		drawCount = 2 * (targetCavernVolume - int(volumes.sum())) // typicalCavernVolume + 1
+		newShapes = np.minimum(cavern_diameter_to_shape(sample_random_value(typicalCavernDiameter, sizeDeviation, drawCount), roomShape), roomShape)
+		newShapes = newShapes[np.all(newShapes > 0, axis=1)]
+		shapes = np.concatenate([shapes, newShapes])
+		volumes = np.concatenate([volumes, np.prod(newShapes, axis=1)])
+
+	# Keep the caverns that fit into the target volume, and shrink the next one to the remaining volume
+	totalVolumes = np.cumsum(volumes)
+	keptCount = int(np.searchsorted(totalVolumes, targetCavernVolume, side='right'))
+	remainingVolume = targetCavernVolume - (int(totalVolumes[keptCount - 1]) if keptCount > 0 else 0)
+	shapes = shapes[:keptCount]
+	if remainingVolume > 0 and keptCount < len(volumes):
+		# The largest box with the room's aspect ratio that does not exceed the remaining volume
+		aspectRatio = roomShape / roomShape.min()
+		lastShape = np.minimum(np.floor(aspectRatio * (remainingVolume / np.prod(aspectRatio))**(1 / roomShape.size)), roomShape).astype(np.int64)
+		if np.all(lastShape > 0):
+			shapes = np.concatenate([shapes, lastShape[np.newaxis]])
+
+	# Place the caverns largest-first into an occupancy grid, in which every cavern is grown by one cell to keep a
+	# wall between caverns. Random candidates are screened by their corners, and the survivors are checked at a
+	# lattice of cells two apart plus their far edges, which cannot miss a grown cavern (they are at least two cells
+	# wide). Once the grid is too crowded for that, a summed-area table finds every free position of a cavern shape,
+	# and this map of free positions is kept up to date for later caverns of the same shape. A shape without free
+	# positions also rules out every larger one, as the grid only fills up
+	shapes = shapes[np.argsort(-np.prod(shapes, axis=1), kind='stable')]
+	occupied = np.zeros(tuple(roomShape), dtype=bool)
+	positions = np.zeros(shapes.shape, dtype=np.int64)
+	placed = np.zeros(len(shapes), dtype=bool)
+	failedShapes = np.zeros((0, roomShape.size), dtype=np.int64)
+	freeMaps = {}
+	for index, cavernShape in enumerate(shapes):
+		if np.all(failedShapes <= cavernShape, axis=1).any():
+			continue
+		freeMap = freeMaps.get(tuple(cavernShape))
+		if freeMap is None:
+			lattice = [np.unique(np.append(np.arange(0, d, 2), d - 1)) for d in cavernShape]
+			offsets = np.stack(np.meshgrid(*lattice, indexing='ij'), axis=-1).reshape(-1, roomShape.size)
+			corners = np.stack(np.meshgrid(*[[0, d - 1] for d in cavernShape], indexing='ij'), axis=-1).reshape(-1, roomShape.size)
+			chunkSize = max(1, 2**18 // len(offsets))
+			for _ in range(maxBatches):
+				candidates = np.random.randint(0, roomShape - cavernShape + 1, size=(candidateCount, roomShape.size))
+				candidates = candidates[~occupied[tuple((candidates[:, np.newaxis] + corners).reshape(-1, roomShape.size).T)].reshape(candidateCount, -1).any(axis=1)]
+				for chunkStart in range(0, len(candidates), chunkSize):
+					chunk = candidates[chunkStart:chunkStart + chunkSize]
+					free = np.flatnonzero(~occupied[tuple((chunk[:, np.newaxis] + offsets).reshape(-1, roomShape.size).T)].reshape(len(chunk), -1).any(axis=1))
+					if free.size > 0:
+						positions[index] = chunk[free[0]]
+						placed[index] = True
+						break
+				if placed[index]:
+					break
+			else:
+				freeMap = freeMaps[tuple(cavernShape)] = boxSums(occupied, cavernShape) == 0
+		if freeMap is not None:
+			candidates = np.random.randint(0, roomShape - cavernShape + 1, size=(candidateCount, roomShape.size))
+			free = np.flatnonzero(freeMap[tuple(candidates.T)])
+			if free.size > 0:
+				positions[index] = candidates[free[0]]
+			else:
+				freePositions = np.flatnonzero(freeMap)
+				if freePositions.size == 0:
+					failedShapes = np.concatenate([failedShapes, cavernShape[np.newaxis]])
+					continue
+				positions[index] = np.unravel_index(np.random.choice(freePositions), freeMap.shape)
+			placed[index] = True
+		grownStarts = np.maximum(positions[index] - 1, 0)
+		grownStops = positions[index] + cavernShape + 1
+		occupied[tuple(slice(start, stop) for start, stop in zip(grownStarts, grownStops))] = True
+		for mapShape, freeMap in freeMaps.items():
+			freeMap[tuple(slice(max(start - d + 1, 0), stop) for start, stop, d in zip(grownStarts, grownStops, mapShape))] = False
+	return positions[placed], shapes[placed]
+
+
 def carveCaverns(room, fillRatio, typicalCavernDiameter, sizeDeviation=1):
 	"""
 	Generate caverns in a given room. The cavern sizes will be drawn from a log-normal distribution, with a
 	typical size and deviation determined by input parameters. The caverns will be carved in the room so as
-	to roughly fill a target volume ratio.
+	to fill a target volume ratio, as long as there is space for them (see planCaverns).
 
 	Parameters:
 	room: ndarray
@@ -145,49 +292,11 @@ def carveCaverns(room, fillRatio, typicalCavernDiameter, sizeDeviation=1):
 	room: ndarray
 		The room after carving out the caverns.
 	"""
+	positions, shapes = planCaverns(room.shape, fillRatio, typicalCavernDiameter, sizeDeviation)
 
-	# Roughly estimate how many times we need to call the generate_cavern_size function
-	roomVolume = np.prod(room.shape)
-	targetCavernVolume = int(roomVolume * fillRatio)
-	typicalCavernVolume = np.prod(cavern_diameter_to_shape(typicalCavernDiameter, room.shape))
-	numberOfCaverns = int(targetCavernVolume / typicalCavernVolume)
-
-	# Generate the estimated number of caverns and place it in the room, taking care to leave at least one wall of distance between caverns.
-	# Cavern distribution throughout space is uniformly random.
-	totalCavernVolume = 0
-	caverns = []
-	for i in range(numberOfCaverns):
-		# Generate a cavern size
-		cavernDiameter = sample_random_value(typicalCavernDiameter, sizeDeviation)
-		cavernShape = cavern_diameter_to_shape(cavernDiameter, room.shape)
-		cavernVolume = np.prod(cavernShape)
-
-		# Update the total volume of the caverns
-		totalCavernVolume += cavernVolume
-
-		# If the total volume of the caverns exceeds the target volume
-		if totalCavernVolume > targetCavernVolume:
-			# Reduce the size of the last cavern to fit the remaining volume
-			excessVolume = totalCavernVolume - targetCavernVolume
-			cavernShape = cavern_diameter_to_shape(cavernDiameter - excessVolume, room.shape)
-			totalCavernVolume = targetCavernVolume
-
-		# Find a position for the cavern in the room
-		cavernPosition = find_cavern_position(room, cavernShape)
-		if cavernPosition is None:
-			continue
-
-		# Add the cavern to the list of caverns
-		cavern = {'shape': cavernShape, 'position': cavernPosition}
-		caverns.append(cavern)
-
-		# Stop if the total volume of the caverns has reached the target volume
-		if totalCavernVolume == targetCavernVolume:
-			# Stop generating caverns
-			break
-
-		# Excavate the cavern by setting the cells to False and removing walls within cavern space
-		room.excavate_cavern(cavern)
+	# Excavate the caverns by setting the cells to False and removing walls within cavern space
+	for position, shape in zip(positions, shapes):
+		room.excavate_cavern({'shape': tuple(shape), 'position': tuple(position)})
 
 	return room
 
@@ -255,7 +364,7 @@ def getDirection(neighborsFilled, directionalWeights, lastSelectedDirections, st
 	return selectedDirection
 
 
-def carvePassages(room, startPosition, flatness, exitWallSide=-1, livePlot=True):
+def carvePassages(room, startPosition, flatness, exitWallSide=-1, livePlot=True, snapshots=None, stackType=int):
 	"""
 	This function generates a maze by carving passages in a given room based on specific rules and parameters.
 	Documentation generated by ChatGPT4 on 2023-07-18
@@ -288,16 +397,24 @@ def carvePassages(room, startPosition, flatness, exitWallSide=-1, livePlot=True)
 		Note that live plotting is only available for 2D mazes.
 		Default value is True.
 
+	snapshots : liveView.SnapshotPublisher, optional
+		If given, the cells and stackSize arrays are published to it after every step, for a viewer in another
+		process or a recording. Use livePlot=False with it, so the carving never waits for a GUI.
+
+	stackType : dtype, optional
+		The integer type of the returned stack size grid. np.int32 halves its memory for rooms with fewer than
+		2**31 cells.
+
 	Returns
 	-------
 	tuple
-		Returns a tuple containing the final room object (with the maze carved in it) and a grid that stores the
-		distance of each cell from the starting position.
+		Returns a tuple containing the final room object (with the maze carved in it), a grid that stores the
+		distance of each cell from the starting position, and the coordinates of the exit.
 	"""
 
 	roomSize = room.shape
 	offsetTable = maze.helpers.generateConversionTable(roomSize)
-	stackSize = np.zeros(roomSize, dtype=int)
+	stackSize = np.zeros(roomSize, dtype=stackType)
 	if any([s > g for s, g in zip(startPosition, roomSize)]):
 		raise ValueError("The starting position lies outside the room's dimensions.")
 	room.cells[startPosition] = True
@@ -311,7 +428,11 @@ def carvePassages(room, startPosition, flatness, exitWallSide=-1, livePlot=True)
 	stack = []
 	lastSelectedDirections = []  # helper for the staircase idea
 	filledCount = np.sum(room.cells)
+	unvisitedCells = maze.helpers.UnvisitedIndex(room.cells)
 	newPlot = True
+	if livePlot and len(roomSize) == 2:
+		# matplotlib is only loaded for live plotting, so carving alone only needs numpy
+		import matplotlib.pyplot as plt
 
 	# Continue until all cells are empty
 	while filledCount > 0:
@@ -350,21 +471,21 @@ def carvePassages(room, startPosition, flatness, exitWallSide=-1, livePlot=True)
 			currentPosition = stack.pop()
 			lastSelectedDirections = []  # helper for the staircase idea
 		else:
-			# current position is in a dead end; start with different random point instead
-			currentPosition = []
+			# current position is in a dead end; start with a different random point that is still filled
+			currentPosition = unvisitedCells.next()
 			lastSelectedDirections = []
-			for i in range(len(roomSize)):
-				randomIndex = random.randint(0, roomSize[i])
-				currentPosition.append(randomIndex)
 			room.cells[currentPosition] = False
 			filledCount -= 1
 
+		if snapshots is not None:
+			snapshots.update(room.cells, stackSize)
+
 		# Plot the current maze if it's 2D
-		a = 0.48
-		plotOffsets = [[a, a, -a, a], [-a, -a, -a, a], [a, -a, a, a],
-					   [a, -a, -a, -a]]  # No need to generalize; we can only plot in 2D anyways
-		s = np.flipud(np.rot90(np.squeeze(stackSize)))
 		if livePlot and len(roomSize) == 2:
+			a = 0.48
+			plotOffsets = [[a, a, -a, a], [-a, -a, -a, a], [a, -a, a, a],
+						   [a, -a, -a, -a]]  # No need to generalize; we can only plot in 2D anyways
+			s = np.flipud(np.rot90(np.squeeze(stackSize)))
 			# first plot all the cells as squares: yellow for False, black for True
 			for x in range(roomSize[0]):
 				for y in range(roomSize[1]):
@@ -381,35 +502,713 @@ def carvePassages(room, startPosition, flatness, exitWallSide=-1, livePlot=True)
 							plt.plot([x + o[0], x + o[2]], [y + o[1], y + o[3]], 'm-')
 						else:
 							plt.plot([x + o[0], x + o[2]], [y + o[1], y + o[3]], 'w-')
-		# finally, plot the stackSize array as a heatmap
-		if newPlot:
-			stackPlot = plt.imshow(s, interpolation='nearest', origin='lower')
-			newPlot = False
-		else:
-			stackPlot.set_data(s)
-		plt.draw()
-		plt.pause(0.01)
+			# finally, plot the stackSize array as a heatmap
+			if newPlot:
+				stackPlot = plt.imshow(s, interpolation='nearest', origin='lower')
+				newPlot = False
+			else:
+				stackPlot.set_data(s)
+			plt.draw()
+			plt.pause(0.01)
+
+	if snapshots is not None:
+		snapshots.publish(room.cells, stackSize)
+
+	exitCoordinates = createExit(room, stackSize, exitWallSide)
+
+	return room, stackSize, exitCoordinates
+
 
-	# Create an exit at the appropriate side
+def createExit(room, distance, exitWallSide=-1):
+	"""
+	Open an exit in the outer wall of the room, at the cell of that wall that is farthest away from the start.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	distance : ndarray or None
+		A grid with the distance of each cell from the starting position, such as the stackSize of carvePassages.
+		If None, the exit is placed at a random cell of the wall.
+
+	exitWallSide : int, optional
+		The side of the room where the exit will be created, using the same numbering as room.walls:
+		2 * d faces the far end of dimension d, 2 * d + 1 faces its beginning.
+		If the value is -1 (default), a random side is chosen.
+
+	Returns
+	-------
+	list
+		The coordinates of the exit cell.
+	"""
 	if exitWallSide == -1:
-		exitWallSide = random.randint(0, 5)
-	# First, extract the correct wall from the array stackSize
-	exitWallOffset = offsetTable[exitWallSide]
-	exitWallDimension = exitWallSide // 2  # using the old Python 2 division on purpose
-	exitWallIndex = sum(exitWallOffset)
+		exitWallSide = random.randint(0, len(room.walls) - 1)
+	if not 0 <= exitWallSide < len(room.walls):
+		raise ValueError('The exit wall side must be between -1 and {:d}.'.format(len(room.walls) - 1))
+	exitWallDimension = exitWallSide // 2
+	if exitWallSide % 2 == 0:
+		exitWallIndex = room.shape[exitWallDimension] - 1
+	else:
+		exitWallIndex = 0
 	# Walls of an n-dimensional body are n-1-dimensional.
 	# I'm constructing a selector that selects everything except for one dimension
-	wallSelector = [slice(None)] * len(
-		stackSize.shape)  # slice takes up to three parameters: (start, stop, step). Passing None is equal to the [:] notation
-	wallSelector[exitWallDimension] = slice(exitWallIndex, None,
-											None)  # this selects either the first, or the last element on this axis
-	exitWall = stackSize[wallSelector]
-	# Second, determine the coordinates of the largest element in the selected slice of stackSize
-	# Selecting the biggest stackSize ensures that the exit is reasonably far away from the entrance
-	exitWallElement = np.argmax(exitWall)
-	exitCoordinates = list(np.unravel_index(exitWallElement, exitWall.shape))
-	# Third, convert the local coordinates into global coordinates and remove the wall
-	exitCoordinates[exitWallDimension] = exitWallIndex
-	room.walls[exitWallSide][exitCoordinates] = False
+	wallShape = tuple(s for dim, s in enumerate(room.shape) if dim != exitWallDimension)
+	if distance is None:
+		exitWallElement = random.randint(0, int(np.prod(wallShape)) - 1)
+	else:
+		wallSelector = [slice(None)] * distance.ndim
+		wallSelector[exitWallDimension] = exitWallIndex
+		exitWall = distance[tuple(wallSelector)]
+		# Selecting the biggest distance ensures that the exit is reasonably far away from the entrance
+		exitWallElement = np.argmax(exitWall)
+	exitCoordinates = [int(c) for c in np.unravel_index(exitWallElement, wallShape)]
+	# Convert the local coordinates into global coordinates and remove the wall
+	exitCoordinates.insert(exitWallDimension, exitWallIndex)
+	room.walls[exitWallSide][tuple(exitCoordinates)] = False
+	return exitCoordinates
+
+
+def measureDistances(room, startPosition):
+	"""
+	Measure the length of the shortest path from the starting position to every cell of the room.
+	The search runs breadth-first, but advances the whole frontier with one array operation per direction,
+	so the number of Python steps equals the largest distance instead of the number of cells.
 
-	return room, stackSize, exitCoordinates
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	startPosition : tuple
+		The position from which distances are measured.
+
+	Returns
+	-------
+	ndarray
+		A grid with the distance of each cell from the starting position. Unreachable cells are set to -1.
+	"""
+	roomSize = room.shape
+	strides = maze.helpers.flatStrides(roomSize)
+	distance = np.full(int(np.prod(roomSize)), -1, dtype=np.int64)
+	frontier = np.array([np.ravel_multi_index(startPosition, roomSize)], dtype=np.int64)
+	distance[frontier] = 0
+	step = 0
+	while frontier.size > 0:
+		step += 1
+		neighbors = []
+		for dim in range(len(roomSize)):
+			coordinate = (frontier // strides[dim]) % roomSize[dim]
+			forward = ~room.walls[2 * dim].flat[frontier] & (coordinate < roomSize[dim] - 1)
+			backward = ~room.walls[2 * dim + 1].flat[frontier] & (coordinate > 0)
+			neighbors.append(frontier[forward] + strides[dim])
+			neighbors.append(frontier[backward] - strides[dim])
+		frontier = np.unique(np.concatenate(neighbors))
+		frontier = frontier[distance[frontier] < 0]
+		distance[frontier] = step
+	return distance.reshape(roomSize)
+
+
+def carveDivisions(room, startPosition, flatness, exitWallSide=-1, batchSize=2**22):
+	"""
+	Generate a maze by recursive division: the room is opened up completely, then split by wall planes
+	with a single gap, and every part is split again until it is only one cell wide.
+	All boxes of one recursion level are split together, so each level costs a handful of array operations.
+	This is much faster than carvePassages for very large rooms, at the price of a more regular texture.
+
+	Parameters
+	----------
+	room : object
+		The room in which the maze is to be generated. Caverns that were carved before stay open,
+		so they may connect neighboring divisions.
+
+	startPosition : tuple
+		The position from which distances are measured.
+
+	flatness : list or tuple
+		One value per dimension, with the same meaning as in carvePassages.
+		High values make long passages along that dimension, by splitting the room across it less often.
+
+	exitWallSide : int, optional
+		The side of the room where the exit will be created, see createExit.
+
+	batchSize : int, optional
+		The maximum number of wall cells that are placed in one array operation. Limits the memory used per level.
+
+	Returns
+	-------
+	tuple
+		The room object with the maze carved in it, a grid with the distance of each cell from the starting
+		position, and the coordinates of the exit.
+	"""
+	roomSize = room.shape
+	dimCount = len(roomSize)
+	if any([s >= g or s < 0 for s, g in zip(startPosition, roomSize)]):
+		raise ValueError("The starting position lies outside the room's dimensions.")
+	strides = maze.helpers.flatStrides(roomSize)
+	# A split across a dimension blocks passages along it, so flat dimensions are split less often
+	splitWeights = np.array([0.5 - np.arctan(f) / np.pi for f in flatness])
+	caverns = ~room.cells if not np.all(room.cells) else None
+
+	# Open the whole room
+	for dim in range(dimCount):
+		forwardSelector = [slice(None)] * dimCount
+		backwardSelector = [slice(None)] * dimCount
+		forwardSelector[dim] = slice(0, -1)
+		backwardSelector[dim] = slice(1, None)
+		room.walls[2 * dim][tuple(forwardSelector)] = False
+		room.walls[2 * dim + 1][tuple(backwardSelector)] = False
+	room.cells[...] = False
+
+	# Every box is given by its lowest corner and its extent; boxes that are at most one cell wide are finished
+	corners = np.zeros((1, dimCount), dtype=np.int64)
+	extents = np.array([roomSize], dtype=np.int64)
+	while corners.shape[0] > 0:
+		splittable = np.sum(extents > 1, axis=1) > 1
+		corners = corners[splittable]
+		extents = extents[splittable]
+		boxCount = corners.shape[0]
+		if boxCount == 0:
+			break
+
+		# Choose the dimension to split across, favouring long extents
+		weights = np.where(extents > 1, extents * splitWeights, 0).cumsum(axis=1)
+		threshold = np.random.random(boxCount) * weights[:, -1]
+		splitDims = np.argmax(weights > threshold[:, None], axis=1)
+		boxes = np.arange(boxCount)
+		splitExtents = extents[boxes, splitDims]
+		# The wall plane lies between the cells splitPositions - 1 and splitPositions
+		splitPositions = corners[boxes, splitDims] + 1 + (np.random.random(boxCount) * (splitExtents - 1)).astype(np.int64)
+
+		# Place the wall planes, one batch of boxes at a time
+		planeCorners = corners.copy()
+		planeCorners[boxes, splitDims] = splitPositions - 1
+		planeExtents = extents.copy()
+		planeExtents[boxes, splitDims] = 1
+		planeSizes = np.prod(planeExtents, axis=1)
+		batches = np.searchsorted(np.cumsum(planeSizes), np.arange(batchSize, planeSizes.sum(), batchSize), side='right')
+		for batch in np.split(boxes, batches):
+			cells, owners = maze.helpers.boxCellIndices(planeCorners[batch], planeExtents[batch], roomSize)
+			cellDims = splitDims[batch][owners]
+			for dim in range(dimCount):
+				before = cells[cellDims == dim]
+				after = before + strides[dim]
+				if caverns is not None:
+					# Leave caverns in one piece
+					keep = ~(caverns.flat[before] & caverns.flat[after])
+					before = before[keep]
+					after = after[keep]
+				room.walls[2 * dim].flat[before] = True
+				room.walls[2 * dim + 1].flat[after] = True
+
+		# Punch a single gap into every wall plane
+		gaps = planeCorners + (np.random.random(planeCorners.shape) * planeExtents).astype(np.int64)
+		gaps = np.ravel_multi_index(tuple(gaps.T), roomSize)
+		for dim in range(dimCount):
+			before = gaps[splitDims == dim]
+			room.walls[2 * dim].flat[before] = False
+			room.walls[2 * dim + 1].flat[before + strides[dim]] = False
+
+		# Both halves of every box become new boxes
+		lowerExtents = extents.copy()
+		lowerExtents[boxes, splitDims] = splitPositions - corners[boxes, splitDims]
+		upperCorners = corners.copy()
+		upperCorners[boxes, splitDims] = splitPositions
+		upperExtents = extents.copy()
+		upperExtents[boxes, splitDims] = extents[boxes, splitDims] - lowerExtents[boxes, splitDims]
+		corners = np.concatenate([corners, upperCorners])
+		extents = np.concatenate([lowerExtents, upperExtents])
+
+	distance = measureDistances(room, startPosition)
+	exitCoordinates = createExit(room, distance, exitWallSide)
+
+	return room, distance, exitCoordinates
+
+
+def carveKruskal(room, startPosition, flatness, exitWallSide=-1, batchSize=2**20):
+	"""
+	Generate a maze with Kruskal's algorithm: all closed walls between neighboring cells are shuffled,
+	and every wall is opened if the cells on both sides are not connected yet.
+	Connectivity is kept in an array-based union-find, and the shuffled walls are processed in batches with
+	vectorized root lookups, so there is neither a Python step per cell nor a deep stack.
+	The texture differs from carvePassages: many short dead ends instead of long winding passages.
+
+	Parameters
+	----------
+	room : object
+		The room in which the maze is to be generated. Caverns that were carved before are treated as connected areas.
+
+	startPosition : tuple
+		The position from which distances are measured.
+
+	flatness : list or tuple
+		One value per dimension, with the same meaning as in carvePassages.
+		Walls across dimensions with high flatness are sorted towards the front, so they are more likely to be opened.
+
+	exitWallSide : int, optional
+		The side of the room where the exit will be created, see createExit.
+
+	batchSize : int, optional
+		The number of walls that are processed in one vectorized step.
+
+	Returns
+	-------
+	tuple
+		The room object with the maze carved in it, a grid with the distance of each cell from the starting
+		position, and the coordinates of the exit.
+	"""
+	roomSize = room.shape
+	if any([s >= g or s < 0 for s, g in zip(startPosition, roomSize)]):
+		raise ValueError("The starting position lies outside the room's dimensions.")
+	openSpanningWalls(room, flatness, batchSize)
+	room.cells[...] = False
+
+	distance = measureDistances(room, startPosition)
+	exitCoordinates = createExit(room, distance, exitWallSide)
+
+	return room, distance, exitCoordinates
+
+
+def carveFrontier(room, startPosition, flatness, walkerCount=64, selection='newest', exitWallSide=-1):
+	"""
+	Generate a maze with a growing tree of many walkers: a frontier holds all carved cells that may still have
+	filled neighbors, and every step lets walkerCount of them carve into a random filled neighbor at once.
+	When two walkers claim the same cell, only one of them gets it. All accepted moves are committed with one
+	array update, so the number of Python steps drops by roughly a factor of walkerCount compared to carvePassages.
+
+	Parameters
+	----------
+	room : object
+		The room in which the maze is to be generated.
+
+	startPosition : tuple
+		The starting position for carving the maze.
+
+	flatness : list or tuple
+		One value per dimension, with the same meaning as in carvePassages.
+
+	walkerCount : int, optional
+		The number of frontier cells that are advanced per step.
+
+	selection : str, optional
+		'newest' advances the most recently carved frontier cells, which gives long winding passages like carvePassages.
+		'random' advances random frontier cells, which gives many short dead ends.
+
+	exitWallSide : int, optional
+		The side of the room where the exit will be created, see createExit.
+
+	Returns
+	-------
+	tuple
+		The room object with the maze carved in it, a grid with the distance of each cell from the starting
+		position (or from a restart point, for areas that could not be reached), and the coordinates of the exit.
+	"""
+	roomSize = room.shape
+	dimCount = len(roomSize)
+	if any([s >= g or s < 0 for s, g in zip(startPosition, roomSize)]):
+		raise ValueError("The starting position lies outside the room's dimensions.")
+	if selection not in ('newest', 'random'):
+		raise ValueError("The selection must be 'newest' or 'random'.")
+	strides = np.array(maze.helpers.flatStrides(roomSize), dtype=np.int64)
+	shape = np.array(roomSize, dtype=np.int64)
+	directionalWeights = np.array([(np.arctan(f) / np.pi) + 0.5 for f in flatness for _ in (0, 1)])
+	# Direction 2 * d steps forward along dimension d, direction 2 * d + 1 steps backward
+	directionOffsets = np.array([s * o for s in strides for o in (1, -1)], dtype=np.int64)
+	cellCount = int(np.prod(roomSize))
+	distance = np.zeros(cellCount, dtype=np.int64)
+	unvisitedCells = maze.helpers.UnvisitedIndex(room.cells)
+
+	# The frontier is kept in a preallocated array; removed cells are replaced by cells from its end
+	frontier = np.zeros(cellCount, dtype=np.int64)
+	frontier[0] = np.ravel_multi_index(startPosition, roomSize)
+	frontierSize = 1
+	room.cells.flat[frontier[0]] = False
+	filledCount = int(np.sum(room.cells))
+
+	while filledCount > 0:
+		if frontierSize == 0:
+			# Everything around the frontier is carved; start with a different random point that is still filled
+			frontier[0] = np.ravel_multi_index(unvisitedCells.next(), roomSize)
+			frontierSize = 1
+			room.cells.flat[frontier[0]] = False
+			filledCount -= 1
+			continue
+
+		# Select the walkers of this step
+		if frontierSize <= walkerCount:
+			slots = np.arange(frontierSize)
+		elif selection == 'newest':
+			slots = np.arange(frontierSize - walkerCount, frontierSize)
+		else:
+			slots = np.unique(np.random.randint(0, frontierSize, walkerCount))
+		walkers = frontier[slots]
+
+		# Look up which neighbors of every walker are still filled
+		coordinates = (walkers[:, None] // strides) % shape
+		neighbors = walkers[:, None] + directionOffsets
+		inside = np.empty(neighbors.shape, dtype=bool)
+		inside[:, 0::2] = coordinates < shape - 1
+		inside[:, 1::2] = coordinates > 0
+		filled = np.zeros(neighbors.shape, dtype=bool)
+		filled[inside] = room.cells.flat[neighbors[inside]]
+
+		# Walkers without filled neighbors leave the frontier
+		stuck = ~filled.any(axis=1)
+		if stuck.any():
+			frontierSize = removeFrontierSlots(frontier, frontierSize, slots[stuck])
+			walkers = walkers[~stuck]
+			neighbors = neighbors[~stuck]
+			filled = filled[~stuck]
+			if walkers.size == 0:
+				continue
+
+		# Every walker picks a filled neighbor, weighted by direction
+		weights = np.cumsum(filled * directionalWeights, axis=1)
+		threshold = np.random.random(walkers.size) * weights[:, -1]
+		directions = np.argmax(weights > threshold[:, None], axis=1)
+		targets = neighbors[np.arange(walkers.size), directions]
+
+		# Resolve conflicts: walkers are in random order, so the first claim on each cell wins
+		order = np.random.permutation(walkers.size)
+		targets, firstClaims = np.unique(targets[order], return_index=True)
+		walkers = walkers[order][firstClaims]
+		directions = directions[order][firstClaims]
+
+		# Commit all accepted moves
+		room.cells.flat[targets] = False
+		distance[targets] = distance[walkers] + 1
+		for direction in range(2 * dimCount):
+			# The wall on the opposite side of the new cell is the neighboring direction with the other sign
+			selected = directions == direction
+			room.walls[direction].flat[walkers[selected]] = False
+			room.walls[direction ^ 1].flat[targets[selected]] = False
+		frontier[frontierSize:frontierSize + targets.size] = targets
+		frontierSize += targets.size
+		filledCount -= targets.size
+
+	distance = distance.reshape(roomSize)
+	exitCoordinates = createExit(room, distance, exitWallSide)
+
+	return room, distance, exitCoordinates
+
+
+def removeFrontierSlots(frontier, frontierSize, slots):
+	"""
+	Remove entries from the frontier array of carveFrontier, by moving entries from its end into the holes.
+
+	Parameters
+	----------
+	frontier : ndarray
+		The preallocated frontier array. Updated in place.
+
+	frontierSize : int
+		The number of valid entries in the frontier array.
+
+	slots : ndarray
+		The unique positions of the entries that are to be removed.
+
+	Returns
+	-------
+	int
+		The new number of valid entries.
+	"""
+	newSize = frontierSize - slots.size
+	holes = slots[slots < newSize]
+	tail = np.arange(newSize, frontierSize)
+	tail = tail[~np.isin(tail, slots)]
+	frontier[holes] = frontier[tail]
+	return newSize
+
+
+def chooseUpwardDimensions(randomValues, weights):
+	"""
+	Choose one dimension per cell, with a probability proportional to the weight of each dimension at that cell.
+
+	Parameters
+	----------
+	randomValues : ndarray
+		Uniform random values between 0 and 1, one per cell.
+
+	weights : list
+		One weight array per dimension, broadcastable to the shape of randomValues. A weight of 0 forbids the dimension.
+
+	Returns
+	-------
+	ndarray
+		The chosen dimension of every cell, or -1 where all weights are 0.
+	"""
+	total = sum(weights)
+	threshold = randomValues * total
+	chosen = np.full(randomValues.shape, -1, dtype=np.int8)
+	cumulative = np.zeros(randomValues.shape)
+	for dim, weight in enumerate(weights):
+		cumulative += weight
+		chosen[(chosen < 0) & (cumulative > threshold)] = dim
+	return chosen
+
+
+def openWallsAlong(room, slab, mask, dim):
+	"""
+	Open the walls between the cells of a slab selected by mask and their forward neighbors along dimension dim.
+
+	Parameters
+	----------
+	room : object
+		The room.
+
+	slab : slice
+		The range of the slab along the first dimension.
+
+	mask : ndarray
+		A boolean array with the shape of the slab, True where the forward wall is to be opened.
+
+	dim : int
+		The dimension along which the walls are opened.
+	"""
+	room.walls[2 * dim][slab][mask] = False
+	if dim == 0:
+		# The neighbors of the last layer lie in the next slab
+		neighborSlab = slice(slab.start + 1, min(slab.stop + 1, room.shape[0]))
+		room.walls[1][neighborSlab][mask[:neighborSlab.stop - neighborSlab.start]] = False
+	else:
+		selector = [slice(None)] * len(room.shape)
+		selector[dim] = slice(0, -1)
+		neighborSelector = [slice(None)] * len(room.shape)
+		neighborSelector[dim] = slice(1, None)
+		room.walls[2 * dim + 1][slab][tuple(neighborSelector)][mask[tuple(selector)]] = False
+
+
+def slabWeights(room, slab, directionalWeights):
+	"""
+	Build the weight of every forward direction for a slab; directions that would leave the room get weight 0.
+
+	Parameters
+	----------
+	room : object
+		The room.
+
+	slab : slice
+		The range of the slab along the first dimension.
+
+	directionalWeights : list
+		The weight of each dimension.
+
+	Returns
+	-------
+	list
+		One weight array per dimension, broadcastable to the shape of the slab.
+	"""
+	dimCount = len(room.shape)
+	weights = []
+	for dim in range(dimCount):
+		if dim == 0:
+			coordinates = np.arange(slab.start, slab.stop)
+		else:
+			coordinates = np.arange(room.shape[dim])
+		broadcastShape = [1] * dimCount
+		broadcastShape[dim] = coordinates.size
+		weights.append((coordinates < room.shape[dim] - 1).reshape(broadcastShape) * directionalWeights[dim])
+	return weights
+
+
+def carveBinaryTree(room, startPosition, flatness, exitWallSide=-1, measureDistance=True, slabCells=2**24):
+	"""
+	Generate a maze with the binary tree algorithm: every cell opens the wall to its forward neighbor along one
+	random dimension. This needs a single random draw per cell and no knowledge of other cells, so the room is
+	processed slab by slab along the first dimension and may be backed by memory-mapped files (see memmapRoom).
+	The texture is strongly biased: there are long straight passages along the far sides of the room.
+
+	Parameters
+	----------
+	room : object
+		The room in which the maze is to be generated. Caverns are ignored.
+
+	startPosition : tuple
+		The position from which distances are measured.
+
+	flatness : list or tuple
+		One value per dimension, with the same meaning as in carvePassages.
+
+	exitWallSide : int, optional
+		The side of the room where the exit will be created, see createExit.
+
+	measureDistance : bool, optional
+		If False, no distance grid is calculated (it needs a full int64 grid), and the exit is placed at random.
+
+	slabCells : int, optional
+		The number of cells that are processed at once.
+
+	Returns
+	-------
+	tuple
+		The room object with the maze carved in it, a grid with the distance of each cell from the starting
+		position (or None), and the coordinates of the exit.
+	"""
+	roomSize = room.shape
+	if any([s >= g or s < 0 for s, g in zip(startPosition, roomSize)]):
+		raise ValueError("The starting position lies outside the room's dimensions.")
+	directionalWeights = [(np.arctan(f) / np.pi) + 0.5 for f in flatness]
+	for slab in maze.helpers.slabRanges(roomSize, slabCells):
+		slabShape = (slab.stop - slab.start,) + tuple(roomSize[1:])
+		chosen = chooseUpwardDimensions(np.random.random(slabShape), slabWeights(room, slab, directionalWeights))
+		for dim in range(len(roomSize)):
+			openWallsAlong(room, slab, chosen == dim, dim)
+		room.cells[slab] = False
+
+	distance = measureDistances(room, startPosition) if measureDistance else None
+	exitCoordinates = createExit(room, distance, exitWallSide)
+
+	return room, distance, exitCoordinates
+
+
+def carveSidewinder(room, startPosition, flatness, exitWallSide=-1, measureDistance=True, slabCells=2**24):
+	"""
+	Generate a maze with the sidewinder algorithm, generalized to n dimensions: every row along the last dimension
+	is split into random runs, each run is opened along the row, and one random cell of every run opens the wall
+	to its forward neighbor along one of the other dimensions. Rows without any forward neighbor stay a single run.
+	Runs are found with cumulative operations along the rows, so the room is processed slab by slab along the
+	first dimension and may be backed by memory-mapped files (see memmapRoom).
+
+	Parameters
+	----------
+	room : object
+		The room in which the maze is to be generated. Caverns are ignored.
+
+	startPosition : tuple
+		The position from which distances are measured.
+
+	flatness : list or tuple
+		One value per dimension, with the same meaning as in carvePassages.
+		The flatness of the last dimension sets how long the runs are.
+
+	exitWallSide : int, optional
+		The side of the room where the exit will be created, see createExit.
+
+	measureDistance : bool, optional
+		If False, no distance grid is calculated (it needs a full int64 grid), and the exit is placed at random.
+
+	slabCells : int, optional
+		The number of cells that are processed at once.
+
+	Returns
+	-------
+	tuple
+		The room object with the maze carved in it, a grid with the distance of each cell from the starting
+		position (or None), and the coordinates of the exit.
+	"""
+	roomSize = room.shape
+	dimCount = len(roomSize)
+	runDim = dimCount - 1
+	runLength = roomSize[runDim]
+	if any([s >= g or s < 0 for s, g in zip(startPosition, roomSize)]):
+		raise ValueError("The starting position lies outside the room's dimensions.")
+	directionalWeights = [(np.arctan(f) / np.pi) + 0.5 for f in flatness]
+	runPositions = np.arange(runLength)
+	for slab in maze.helpers.slabRanges(roomSize, slabCells):
+		slabShape = (slab.stop - slab.start,) + tuple(roomSize[1:])
+		upwardWeights = slabWeights(room, slab, directionalWeights)[:runDim]
+		if dimCount == 1:
+			# A single row can only be one long run
+			closed = np.zeros(slabShape, dtype=bool)
+			upward = np.zeros(slabShape, dtype=bool)
+		else:
+			# Rows that have a forward neighbor along another dimension are split into runs
+			upward = np.broadcast_to(sum(upwardWeights) > 0, slabShape[:runDim] + (1,))
+			closed = upward & (np.random.random(slabShape) >= directionalWeights[runDim])
+			closed[..., -1] = upward[..., -1]
+
+		# Open every run along the row
+		openWallsAlong(room, slab, ~closed & (runPositions < runLength - 1), runDim)
+
+		# Pick a random cell of every run, and open it along a random other dimension
+		if closed.any():
+			runStarts = np.zeros(slabShape, dtype=np.int64)
+			runStarts[..., 1:] = np.where(closed[..., :-1], runPositions[1:], 0)
+			runStarts = np.maximum.accumulate(runStarts, axis=-1)
+			runEnds = np.flatnonzero(closed)
+			endPositions = runEnds % runLength
+			starts = runStarts.ravel()[runEnds]
+			picked = runEnds - endPositions + starts + (np.random.random(runEnds.size) * (endPositions - starts + 1)).astype(np.int64)
+			pickedCoordinates = np.unravel_index(picked, slabShape)
+			pickedWeights = [np.broadcast_to(w, slabShape)[pickedCoordinates] for w in upwardWeights]
+			pickedDims = chooseUpwardDimensions(np.random.random(picked.size), pickedWeights)
+			chosen = np.full(slabShape, -1, dtype=np.int8)
+			chosen.ravel()[picked] = pickedDims
+			for dim in range(runDim):
+				openWallsAlong(room, slab, chosen == dim, dim)
+		room.cells[slab] = False
+
+	distance = measureDistances(room, startPosition) if measureDistance else None
+	exitCoordinates = createExit(room, distance, exitWallSide)
+
+	return room, distance, exitCoordinates
+
+
+def openSpanningWalls(room, flatness, batchSize=2**20, randomSource=np.random):
+	"""
+	The core of carveKruskal: open the closed walls of a room in weighted random order, whenever they join two parts
+	that are not connected yet. Cells are not marked as carved, and no exit is created.
+
+	Parameters
+	----------
+	room : object
+		The room. Its walls are updated in place.
+
+	flatness : list or tuple
+		One value per dimension, with the same meaning as in carvePassages.
+
+	batchSize : int, optional
+		The number of walls that are processed in one vectorized step.
+
+	randomSource : optional
+		Where random numbers come from: the np.random module (default), or a np.random.Generator for reproducible results
+		that do not touch the global random state.
+	"""
+	roomSize = room.shape
+	dimCount = len(roomSize)
+	strides = maze.helpers.flatStrides(roomSize)
+	cellCount = int(np.prod(roomSize))
+	parent = np.arange(cellCount, dtype=np.int64)
+	directionalWeights = [(np.arctan(f) / np.pi) + 0.5 for f in flatness]
+
+	# Collect the closed walls as flat indices (cell * dimCount + dim), and join cells that are already connected
+	cellIndices = np.arange(cellCount, dtype=np.int64).reshape(roomSize)
+	closedWalls = []
+	sortKeys = []
+	for dim in range(dimCount):
+		wallSelector = [slice(None)] * dimCount
+		wallSelector[dim] = slice(0, -1)
+		lowerCells = cellIndices[tuple(wallSelector)].ravel()
+		isOpen = ~room.walls[2 * dim][tuple(wallSelector)].ravel()
+		maze.helpers.connectEdges(parent, lowerCells[isOpen], lowerCells[isOpen] + strides[dim])
+		lowerCells = lowerCells[~isOpen]
+		closedWalls.append(lowerCells * dimCount + dim)
+		# Exponential keys divided by the weight give a weighted random order
+		sortKeys.append((randomSource.exponential(size=lowerCells.size) / directionalWeights[dim]).astype(np.float32))
+	del cellIndices
+	closedWalls = np.concatenate(closedWalls)
+	closedWalls = closedWalls[np.argsort(np.concatenate(sortKeys), kind='stable')]
+	del sortKeys
+
+	for batchStart in range(0, closedWalls.size, batchSize):
+		batch = closedWalls[batchStart:batchStart + batchSize]
+		lowerCells = batch // dimCount
+		wallDims = batch % dimCount
+		upperCells = lowerCells + np.take(strides, wallDims)
+		opened = maze.helpers.uniteEdges(parent, lowerCells, upperCells)
+		for dim in range(dimCount):
+			selected = opened & (wallDims == dim)
+			room.walls[2 * dim].flat[lowerCells[selected]] = False
+			room.walls[2 * dim + 1].flat[upperCells[selected]] = False
+
+
+# All generators by name. They are called as generator(room, startPosition, flatness, exitWallSide=...) and return
+# the room, the distance grid and the exit coordinates.
+generators = {
+	'passages': functools.partial(carvePassages, livePlot=False),
+	'divisions': carveDivisions,
+	'kruskal': carveKruskal,
+	'frontier': carveFrontier,
+	'binaryTree': carveBinaryTree,
+	'sidewinder': carveSidewinder,
+}
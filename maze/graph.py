@@ -0,0 +1,108 @@
+import maze.helpers
+import numpy as np
+import scipy.sparse
+
+"""
+Export of a maze as a sparse graph, for analytics with scipy.sparse.csgraph.
+Cells are the nodes of the graph, numbered by their flat (C-order) index, and every open wall between two cells is an edge.
+The toAdjacencyMatrix() function builds the CSR adjacency matrix without a Python loop over cells or walls.
+The cellIndices(), cellCoordinates() and toGrid() functions convert between node numbers, coordinates and grids.
+"""
+
+
+def toAdjacencyMatrix(room, dtype=np.float64):
+	"""
+	Build the symmetric adjacency matrix of a maze, in CSR format.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	dtype : data-type, optional
+		The type of the matrix entries. All entries are 1.
+
+	Returns
+	-------
+	scipy.sparse.csr_matrix
+		A matrix with one row and one column per cell, with an entry for every pair of cells connected by an open wall.
+	"""
+	cellCount = int(np.prod(room.shape))
+	indexType = np.int32 if cellCount < 2**31 else np.int64
+	strides = maze.helpers.flatStrides(room.shape)
+	wholeRoom = slice(0, room.shape[0])
+	lowerCells = []
+	upperCells = []
+	for dim in range(len(room.shape)):
+		cells = maze.helpers.forwardWallIndices(room, dim, wholeRoom).astype(indexType)
+		lowerCells.append(cells)
+		upperCells.append(cells + indexType(strides[dim]))
+	lowerCells = np.concatenate(lowerCells)
+	upperCells = np.concatenate(upperCells)
+	rows = np.concatenate([lowerCells, upperCells])
+	columns = np.concatenate([upperCells, lowerCells])
+	del lowerCells, upperCells
+	data = np.ones(rows.size, dtype=dtype)
+	return scipy.sparse.coo_matrix((data, (rows, columns)), shape=(cellCount, cellCount)).tocsr()
+
+
+def cellIndices(coordinates, room):
+	"""
+	Convert cell coordinates into node numbers of the adjacency matrix.
+
+	Parameters
+	----------
+	coordinates : array_like
+		The coordinates of one cell, or an array with one row of coordinates per cell.
+
+	room : object
+		The room.
+
+	Returns
+	-------
+	int or ndarray
+		The node number of every cell.
+	"""
+	coordinates = np.asarray(coordinates)
+	return np.ravel_multi_index(tuple(coordinates.T), room.shape)
+
+
+def cellCoordinates(indices, room):
+	"""
+	Convert node numbers of the adjacency matrix back into cell coordinates.
+	This is the inverse of cellIndices().
+
+	Parameters
+	----------
+	indices : int or array_like
+		The node numbers, for example a path or the result of scipy.sparse.csgraph.breadth_first_order.
+
+	room : object
+		The room.
+
+	Returns
+	-------
+	ndarray
+		The coordinates of every node, with one row per node.
+	"""
+	return np.stack(np.unravel_index(indices, room.shape), axis=-1)
+
+
+def toGrid(values, room):
+	"""
+	Arrange a result with one value per node (such as distances or component labels) as a grid in the shape of the room.
+
+	Parameters
+	----------
+	values : ndarray
+		One value per cell.
+
+	room : object
+		The room.
+
+	Returns
+	-------
+	ndarray
+		The values, reshaped to the room's dimensions.
+	"""
+	return np.asarray(values).reshape(room.shape)
@@ -1,15 +1,21 @@
 import numpy as np
-import itertools
+import os
 import random
 
 """
 The class Room represents a room with certain dimensions, and methods for setting and removing walls at certain positions.
+The memmapRoom() function creates a filled room whose arrays live in memory-mapped files.
+The class UnvisitedIndex hands out random cells that are still filled, for restarting the carving process.
 The weightedRandom() function chooses a random index from a list, with the probability of each index being chosen proportional to its corresponding weight.
 The subtractLists() and addLists() functions perform element-wise subtraction and addition respectively on two lists.
 The convertOffset() function converts a dimension and offset into an index used for wall placement and removal.
 The generateConversionTable() function creates a conversion table that converts direction into a dimensional offset and vice versa.
 The lookupDirection() function looks up the neighboring cell position given the current position and direction.
 The findNeighborPositions() function finds all neighbor cell positions from the current position.
+The flatStrides() function returns the distance between neighboring cells in flat index space.
+The boxCellIndices() function lists the flat indices of all cells inside a batch of boxes.
+The forwardWallIndices() function lists the cells of a slab whose forward wall along one dimension is open or closed.
+The findRoots(), connectEdges() and uniteEdges() functions implement an array-based union-find over flat cell indices.
 """
 
 class Room:
@@ -21,11 +27,16 @@ class Room:
 		Each entry in this list represents a different direction in n-dimensional space.
 		walls[0] and walls [1] represent the left and right walls respectively. walls[2] and walls[3] represent top and bottom walls, and this continues for higher dimensions.
 	Only the walls variable is used for plotting the finished maze.
+	Instead of allocating new arrays, existing cells and walls arrays (for example memory-mapped files) can be passed in.
 	"""
-	def __init__(self, shape):
-		self.shape = shape
-		self.cells = np.ones(shape, dtype=bool)
-		self.walls = [np.ones(shape, dtype=bool) for d in range(2 * len(shape))]
+	def __init__(self, shape, cells=None, walls=None):
+		self.shape = tuple(shape)
+		if cells is None:
+			cells = np.ones(shape, dtype=bool)
+		if walls is None:
+			walls = [np.ones(shape, dtype=bool) for d in range(2 * len(shape))]
+		self.cells = cells
+		self.walls = walls
 
 	def __repr__(self):
 		return 'Room grid with dimensions {}'.format(self.shape)
@@ -89,32 +100,106 @@ class Room:
 		# Set all cells in the room to False if they are within the cavern
 		self.cells[tuple(coordinate_slices)] = False
 
-		# For each cell in the cavern, remove the walls with its neighbors
-		# We do this by iterating over all possible directions (i.e., neighboring cells) and call room.removeWalls() for each one.
-		directions = [np.eye(len(shape), dtype=int), -np.eye(len(shape), dtype=int)]
-		for direction in itertools.chain(*directions):
+		# Remove the walls between neighboring cells of the cavern, one dimension at a time:
+		# the forward walls of all but the last layer, and the backward walls of all but the first layer
+		for dim in range(len(shape)):
+			forward_slices = list(coordinate_slices)
+			backward_slices = list(coordinate_slices)
+			forward_slices[dim] = slice(position[dim], position[dim] + shape[dim] - 1)
+			backward_slices[dim] = slice(position[dim] + 1, position[dim] + shape[dim])
+			self.walls[2 * dim][tuple(forward_slices)] = False
+			self.walls[2 * dim + 1][tuple(backward_slices)] = False
 
-			# Get the slice in each dimension that has a neighbor in the current direction
-			neighbor_slices = []
-			neighbor_positions = []
-			for p, d, s in zip(position, direction, self.shape):  # Iterate over each dimension of the room
-				# Get the slice in the current dimension that has a neighbor in the current direction
-				startPosition = max(p - d, 0)  # The start position of the slice is the current position minus the direction, but not less than 0
-				endPosition = min(p + d, s - d)  # The end position of the slice is the current position plus the direction, but not more than the room size minus the direction
-				neighbor_slice = slice(startPosition, endPosition)
-				neighbor_slices.append(neighbor_slice)
 
-				# Calculate the position of the neighbor in the current dimension
-				neighbor_position = slice(np.clip(p + d, 0,
-												  s - 1))  # The position of the neighbor is the current position plus the direction, but not less than 0 and not more than the room size minus 1
-				neighbor_positions.append(neighbor_position)
+def memmapRoom(shape, directory, slabCells=2**24):
+	"""
+	Create a completely filled room whose cells and walls are stored in memory-mapped files,
+	for rooms that do not fit into memory. The files are filled slab by slab along the first dimension.
+
+	Parameters
+	----------
+	shape : tuple
+		The dimensions of the room.
+
+	directory : str
+		The directory in which the files cells.bin and walls<direction>.bin are created.
+
+	slabCells : int, optional
+		The number of cells that are written at once.
+
+	Returns
+	-------
+	Room
+		The memory-mapped room.
+	"""
+	arrays = []
+	for name in ['cells'] + ['walls{:d}'.format(d) for d in range(2 * len(shape))]:
+		array = np.memmap(os.path.join(directory, name + '.bin'), dtype=bool, mode='w+', shape=tuple(shape))
+		for slab in slabRanges(shape, slabCells):
+			array[slab] = True
+		arrays.append(array)
+	return Room(shape, cells=arrays[0], walls=arrays[1:])
+
+
+def slabRanges(shape, slabCells=2**24):
+	"""
+	Split a grid into slabs along its first dimension, each with at most slabCells cells (but at least one layer).
+
+	Parameters
+	----------
+	shape : tuple
+		The dimensions of the grid.
+
+	slabCells : int, optional
+		The preferred number of cells per slab.
+
+	Returns
+	-------
+	list
+		A slice along the first dimension for each slab.
+	"""
+	layerCells = int(np.prod(shape[1:]))
+	layers = max(1, slabCells // max(layerCells, 1))
+	return [slice(start, min(start + layers, shape[0])) for start in range(0, shape[0], layers)]
+
 
-			# Get all cells that have a neighbor in the current direction
-			cells = np.array(np.where(self.cells[tuple(neighbor_slices)]))
+class UnvisitedIndex:
+	"""
+	An index of the cells of a room that are still filled.
+	All flat cell indices are shuffled once, and a cursor moves along this permutation.
+	Cells that have been carved in the meantime are skipped, and since the cursor never moves back,
+	every cell is inspected at most once. Drawing a restart position is therefore O(1) amortized.
+	The permutation is scanned in blocks, so skipping a long stretch of carved cells takes only a few vectorized lookups.
+	"""
+	def __init__(self, cells, blockSize=64):
+		self.cells = cells
+		self.order = np.random.permutation(cells.size)
+		self.cursor = 0
+		self.blockSize = blockSize
+
+	def __len__(self):
+		return self.order.size - self.cursor
 
-			# For each cell, remove the wall with its neighbor in the current direction
-			for cell in cells.T:
-				self.removeWalls(tuple(cell), tuple(cell + direction))
+	def next(self):
+		"""
+		Return a random cell that is still filled, or None if all cells have been carved.
+
+		Returns
+		-------
+		tuple
+			The position of a filled cell.
+		"""
+		blockSize = self.blockSize
+		while self.cursor < self.order.size:
+			block = self.order[self.cursor:self.cursor + blockSize]
+			filled = np.flatnonzero(self.cells[np.unravel_index(block, self.cells.shape)])
+			if filled.size > 0:
+				self.cursor += int(filled[0]) + 1
+				return tuple(int(c) for c in np.unravel_index(block[filled[0]], self.cells.shape))
+			self.cursor += block.size
+			# Long runs of carved cells are common near the end, so widen the search window
+			blockSize *= 2
+		return None
 
 
 def weightedRandom(weights):
@@ -278,4 +363,195 @@ def findNeighborPositions(currentPosition, roomSize, offsetTable):
 			positions.append(tuple(position))
 		else:
 			positions.append(None)
-	return positions
\ No newline at end of file
+	return positions
+
+def flatStrides(roomSize):
+	"""
+	Calculate how far apart two neighboring cells are in flat (C-order) index space, for each dimension.
+
+	Parameters
+	----------
+	roomSize : list
+		The dimensions of the room.
+
+	Returns
+	-------
+	list
+		The flat index offset of a step along each dimension.
+	"""
+	strides = [1] * len(roomSize)
+	for dim in range(len(roomSize) - 2, -1, -1):
+		strides[dim] = strides[dim + 1] * int(roomSize[dim + 1])
+	return strides
+
+def boxCellIndices(corners, extents, roomSize):
+	"""
+	List the flat indices of all cells inside a batch of axis-aligned boxes, without a Python loop over the boxes.
+
+	Parameters
+	----------
+	corners : ndarray
+		The lowest corner of every box, with one row per box.
+
+	extents : ndarray
+		The size of every box, with one row per box.
+
+	roomSize : list
+		The dimensions of the room.
+
+	Returns
+	-------
+	tuple
+		The flat indices of all cells, and for each cell the row of the box it belongs to.
+	"""
+	strides = flatStrides(roomSize)
+	counts = np.prod(extents, axis=1)
+	owners = np.repeat(np.arange(counts.size), counts)
+	local = np.arange(owners.size, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+	cells = np.zeros(owners.size, dtype=np.int64)
+	for dim in range(len(roomSize) - 1, -1, -1):
+		extent = extents[owners, dim]
+		cells += (corners[owners, dim] + local % extent) * strides[dim]
+		local //= extent
+	return cells, owners
+
+def findRoots(parent, nodes):
+	"""
+	Find the root of every node in an array-based union-find, shortening the paths along the way (path halving).
+	All nodes are processed together, so the number of Python steps depends on the tree depth, not on the node count.
+
+	Parameters
+	----------
+	parent : ndarray
+		The parent of every element. Roots are their own parent. Updated in place.
+
+	nodes : ndarray
+		The elements whose roots are wanted.
+
+	Returns
+	-------
+	ndarray
+		The root of every node.
+	"""
+	current = np.array(nodes, dtype=parent.dtype)
+	roots = np.empty_like(current)
+	pending = np.arange(current.size)
+	while current.size > 0:
+		parents = parent[current]
+		grandparents = parent[parents]
+		moving = parents != grandparents
+		# Nodes whose parent is a root are done; only the others are followed further
+		roots[pending[~moving]] = parents[~moving]
+		current = current[moving]
+		grandparents = grandparents[moving]
+		pending = pending[moving]
+		parent[current] = grandparents
+		current = grandparents
+	return roots
+
+def connectEdges(parent, first, second):
+	"""
+	Join the components at both ends of a set of edges, when the order of the edges does not matter.
+	Every round, the root with the larger index hooks onto the other one; when several edges hook the same root,
+	one of them wins and the others are retried, so no sorting is needed.
+
+	Parameters
+	----------
+	parent : ndarray
+		The parent array of the union-find. Updated in place.
+
+	first, second : ndarray
+		The two ends of every edge.
+	"""
+	while len(first) > 0:
+		firstRoots = findRoots(parent, first)
+		secondRoots = findRoots(parent, second)
+		separate = firstRoots != secondRoots
+		first = first[separate]
+		second = second[separate]
+		firstRoots = firstRoots[separate]
+		secondRoots = secondRoots[separate]
+		parent[np.maximum(firstRoots, secondRoots)] = np.minimum(firstRoots, secondRoots)
+
+def uniteEdges(parent, first, second):
+	"""
+	Join the components at both ends of a sequence of edges, with the same result as processing the edges one by one
+	(like Kruskal's algorithm does): an edge is accepted if its two ends were not connected by any earlier edge.
+	Every round, each component hooks onto its neighbor across its earliest remaining edge,
+	which always belongs to the result, so only a few vectorized rounds are needed per batch.
+
+	Parameters
+	----------
+	parent : ndarray
+		The parent array of the union-find. Updated in place.
+
+	first, second : ndarray
+		The two ends of every edge, in processing order.
+
+	Returns
+	-------
+	ndarray
+		A boolean array that is True for every edge that joined two components.
+	"""
+	joined = np.zeros(len(first), dtype=bool)
+	candidates = np.arange(len(first))
+	while candidates.size > 0:
+		firstRoots = findRoots(parent, first[candidates])
+		secondRoots = findRoots(parent, second[candidates])
+		separate = firstRoots != secondRoots
+		candidates = candidates[separate]
+		firstRoots = firstRoots[separate]
+		secondRoots = secondRoots[separate]
+		if candidates.size == 0:
+			break
+
+		# Every component picks the earliest edge that touches it
+		endpoints = np.stack([firstRoots, secondRoots], axis=1).ravel()
+		components, firstOccurrence = np.unique(endpoints, return_index=True)
+		edges = firstOccurrence // 2
+		targets = np.where(firstOccurrence % 2 == 0, secondRoots[edges], firstRoots[edges])
+
+		# Two components that picked the same edge would hook onto each other, so only the larger one hooks
+		mutual = edges[np.searchsorted(components, targets)] == edges
+		hooking = ~mutual | (components > targets)
+		parent[components[hooking]] = targets[hooking]
+
+		accepted = np.zeros(candidates.size, dtype=bool)
+		accepted[edges] = True
+		joined[candidates[accepted]] = True
+		candidates = candidates[~accepted]
+	return joined
+
+def forwardWallIndices(room, dim, slab, isOpen=True):
+	"""
+	List the flat indices of the cells in a slab whose wall to the forward neighbor along a dimension is open
+	(or closed). Walls on the outside of the room are never listed.
+
+	Parameters
+	----------
+	room : object
+		The room.
+
+	dim : int
+		The dimension of the walls.
+
+	slab : slice
+		The range of the slab along the first dimension, as returned by slabRanges().
+
+	isOpen : bool, optional
+		Whether open or closed walls are listed.
+
+	Returns
+	-------
+	ndarray
+		The flat indices (in the whole room) of the cells in front of the listed walls.
+	"""
+	walls = room.walls[2 * dim][slab]
+	selector = [slice(None)] * walls.ndim
+	if dim == 0:
+		selector[0] = slice(0, min(slab.stop, room.shape[0] - 1) - slab.start)
+	else:
+		selector[dim] = slice(0, -1)
+	selected = np.zeros(walls.shape, dtype=bool)
+	selected[tuple(selector)] = walls[tuple(selector)] != isOpen
+	return np.flatnonzero(selected) + slab.start * flatStrides(room.shape)[0]
@@ -0,0 +1,182 @@
+import functools
+import maze.excavation
+import maze.helpers
+import maze.voxels
+import numpy as np
+
+"""
+A procedural maze on an infinite grid, for endless-maze servers.
+The grid is split into tiles. The maze inside a tile, and the door in every face between two tiles, are a pure function of
+the seed and the tile coordinates, so any bounding box can be generated on demand, without generating anything outside of it,
+and neighboring queries always agree. Every tile is a perfect maze, and every pair of neighboring tiles shares one door.
+The class InfiniteMaze generates tiles (with an LRU cache), cell regions and rendered voxel regions.
+"""
+
+
+def zigzag(value):
+	"""
+	Map an integer to a non-negative integer without collisions (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...), for seeding.
+	"""
+	value = int(value)
+	return 2 * value if value >= 0 else -2 * value - 1
+
+
+class InfiniteMaze:
+	"""
+	An infinite maze, generated tile by tile.
+
+	Parameters
+	----------
+	seed : int
+		The seed of the whole maze.
+
+	tileShape : tuple, optional
+		The number of cells per tile in every dimension. The number of dimensions of the maze follows from it.
+
+	flatness : list or tuple, optional
+		One value per dimension, with the same meaning as in carvePassages. Defaults to 0 in every dimension.
+
+	cacheSize : int, optional
+		The number of generated tiles that are kept in memory.
+	"""
+	def __init__(self, seed, tileShape=(16, 16), flatness=None, cacheSize=256):
+		self.seed = int(seed)
+		self.tileShape = tuple(int(t) for t in tileShape)
+		self.flatness = tuple(flatness) if flatness is not None else (0,) * len(self.tileShape)
+		# Tiles are returned from the cache, so callers must not change them (region() returns copies)
+		self.tile = functools.lru_cache(maxsize=cacheSize)(self.generateTile)
+
+	def __repr__(self):
+		return 'Infinite maze with seed {:d} and tiles of {}'.format(self.seed, self.tileShape)
+
+	def randomSource(self, tileCoordinates, purpose):
+		"""
+		Create the random generator for one purpose of one tile.
+
+		Parameters
+		----------
+		tileCoordinates : tuple
+			The coordinates of the tile in the tile grid.
+
+		purpose : int
+			0 for the maze inside the tile, 1 + d for the door to the next tile along dimension d.
+
+		Returns
+		-------
+		np.random.Generator
+			A generator that only depends on the seed, the tile and the purpose.
+		"""
+		return np.random.default_rng([zigzag(self.seed), purpose] + [zigzag(c) for c in tileCoordinates])
+
+	def doorPosition(self, tileCoordinates, dim):
+		"""
+		Find the door between a tile and the next tile along a dimension.
+
+		Parameters
+		----------
+		tileCoordinates : tuple
+			The coordinates of the lower of the two tiles.
+
+		dim : int
+			The dimension along which the two tiles are neighbors.
+
+		Returns
+		-------
+		list
+			The coordinates of the door cell inside the lower tile (on its last layer along dim).
+		"""
+		randomSource = self.randomSource(tileCoordinates, 1 + dim)
+		door = [int(randomSource.integers(0, t)) for t in self.tileShape]
+		door[dim] = self.tileShape[dim] - 1
+		return door
+
+	def generateTile(self, tileCoordinates):
+		"""
+		Generate the maze inside one tile, including the doors to all its neighbors.
+		Use the cached tile() method instead of calling this directly.
+
+		Parameters
+		----------
+		tileCoordinates : tuple
+			The coordinates of the tile in the tile grid.
+
+		Returns
+		-------
+		Room
+			The maze of the tile.
+		"""
+		tileCoordinates = tuple(int(c) for c in tileCoordinates)
+		room = maze.helpers.Room(self.tileShape)
+		maze.excavation.openSpanningWalls(room, self.flatness, randomSource=self.randomSource(tileCoordinates, 0))
+		room.cells[...] = False
+		for dim in range(len(self.tileShape)):
+			# The door to the next tile is stored on this tile's last layer
+			room.walls[2 * dim][tuple(self.doorPosition(tileCoordinates, dim))] = False
+			# The door to the previous tile belongs to the previous tile, and ends on this tile's first layer
+			previousTile = list(tileCoordinates)
+			previousTile[dim] -= 1
+			door = self.doorPosition(tuple(previousTile), dim)
+			door[dim] = 0
+			room.walls[2 * dim + 1][tuple(door)] = False
+		return room
+
+	def region(self, position, shape):
+		"""
+		Generate the maze inside a box of the infinite grid. Only the tiles that overlap the box are generated.
+		The walls on the outside of the box are the real walls of the infinite maze, so some of them are open.
+
+		Parameters
+		----------
+		position : tuple
+			The lowest corner of the box, in cell coordinates (may be negative).
+
+		shape : tuple
+			The size of the box, in cells.
+
+		Returns
+		-------
+		Room
+			The maze inside the box.
+		"""
+		room = maze.helpers.Room(shape)
+		room.cells[...] = False
+		firstTile = [p // t for p, t in zip(position, self.tileShape)]
+		lastTile = [(p + s - 1) // t for p, s, t in zip(position, shape, self.tileShape)]
+		for offset in np.ndindex(*[l - f + 1 for f, l in zip(firstTile, lastTile)]):
+			tileCoordinates = tuple(f + o for f, o in zip(firstTile, offset))
+			tileStarts = [c * t for c, t in zip(tileCoordinates, self.tileShape)]
+			starts = [max(p, a) for p, a in zip(position, tileStarts)]
+			stops = [min(p + s, a + t) for p, s, a, t in zip(position, shape, tileStarts, self.tileShape)]
+			tileSlices = tuple(slice(a - b, c - b) for a, c, b in zip(starts, stops, tileStarts))
+			regionSlices = tuple(slice(a - p, c - p) for a, c, p in zip(starts, stops, position))
+			tile = self.tile(tileCoordinates)
+			for regionWalls, tileWalls in zip(room.walls, tile.walls):
+				regionWalls[regionSlices] = tileWalls[tileSlices]
+		return room
+
+	def renderRegion(self, voxelPosition, voxelShape, passageSize, wallThickness):
+		"""
+		Render the maze inside a box of voxels, for example one Minecraft chunk, generating only the cells it touches.
+
+		Parameters
+		----------
+		voxelPosition : tuple
+			The lowest corner of the box, in voxel coordinates (may be negative).
+
+		voxelShape : tuple
+			The size of the box, in voxels.
+
+		passageSize, wallThickness : int
+			The rendering parameters, as in plotTools.renderWalls.
+
+		Returns
+		-------
+		ndarray
+			A boolean array with the shape voxelShape, True where there is a wall.
+		"""
+		cellSize = passageSize + 2 * wallThickness
+		firstCell = [v // cellSize for v in voxelPosition]
+		lastCell = [(v + s - 1) // cellSize for v, s in zip(voxelPosition, voxelShape)]
+		room = self.region(firstCell, [l - f + 1 for f, l in zip(firstCell, lastCell)])
+		localPosition = [v - f * cellSize for v, f in zip(voxelPosition, firstCell)]
+		return maze.voxels.renderBox(room, localPosition, voxelShape, passageSize, wallThickness)
@@ -0,0 +1,270 @@
+import multiprocessing
+import numpy as np
+import struct
+import time
+import zlib
+from multiprocessing import shared_memory
+
+"""
+Live viewing of carvePassages() in a separate process.
+The class SnapshotPublisher copies the cells and stackSize arrays of the carving process into a shared memory block
+at a fixed cadence, and optionally appends every snapshot to a recording file. Publishing never waits for anyone;
+a sequence counter that is odd while a snapshot is being written lets readers detect torn copies and try again.
+The startViewer() function starts a viewer process that plots the snapshots with matplotlib, so the GUI event loop
+never blocks the carving. The readRecording() and replayRecording() functions play a recording back.
+
+Shared memory layout: a header of four int64 values (sequence counter, carving step, finished flag, unused), the cells
+as one byte per cell, and stackSize as int64, starting at the next multiple of 8 bytes.
+Recording layout (little endian): magic 'MAZESNAP', number of dimensions (uint16), shape (n x uint64), then one frame
+per snapshot: carving step (int64), seconds since the start (float64), the byte lengths of both compressed arrays
+(2 x uint32), the zlib-compressed packed cell bits and the zlib-compressed int64 stackSize.
+"""
+
+recordingMagic = b'MAZESNAP'
+frameFormat = '<qdII'
+
+
+def snapshotLayout(shape):
+	"""
+	The byte offsets of the cells and stackSize arrays in the shared memory block, and its total size.
+	"""
+	cellCount = int(np.prod(shape))
+	cellsOffset = 32
+	stackOffset = (cellsOffset + cellCount + 7) // 8 * 8
+	return cellsOffset, stackOffset, stackOffset + 8 * cellCount
+
+
+def snapshotArrays(buffer, shape):
+	"""
+	Wrap a shared memory buffer in the header, cells and stackSize arrays.
+	"""
+	cellsOffset, stackOffset, size = snapshotLayout(shape)
+	header = np.ndarray(4, dtype=np.int64, buffer=buffer)
+	cells = np.ndarray(shape, dtype=bool, buffer=buffer, offset=cellsOffset)
+	stackSize = np.ndarray(shape, dtype=np.int64, buffer=buffer, offset=stackOffset)
+	return header, cells, stackSize
+
+
+class SnapshotPublisher:
+	"""
+	Publishes snapshots of a carving process into shared memory and, optionally, a recording file.
+	Pass it to carvePassages() as the snapshots argument, which calls update() after every step.
+	"""
+	def __init__(self, shape, interval=0.1, recordPath=None, checkEvery=256):
+		"""
+		Parameters
+		----------
+		shape : tuple
+			The shape of the room.
+
+		interval : float, optional
+			The time between two snapshots in seconds.
+
+		recordPath : str, optional
+			A file that every snapshot is appended to, for replaying it later.
+
+		checkEvery : int, optional
+			The number of steps between two looks at the clock.
+		"""
+		self.shape = tuple(shape)
+		self.interval = interval
+		self.checkEvery = checkEvery
+		self.steps = 0
+		self.startTime = time.perf_counter()
+		self.nextTime = self.startTime
+		self.memory = shared_memory.SharedMemory(create=True, size=snapshotLayout(self.shape)[2])
+		self.header, self.cells, self.stackSize = snapshotArrays(self.memory.buf, self.shape)
+		self.header[:] = 0
+		self.recording = None
+		if recordPath is not None:
+			self.recording = open(recordPath, 'wb')
+			self.recording.write(recordingMagic + struct.pack('<H{:d}Q'.format(len(self.shape)), len(self.shape), *self.shape))
+
+	@property
+	def name(self):
+		"""
+		The name of the shared memory block.
+		"""
+		return self.memory.name
+
+	def update(self, cells, stackSize):
+		"""
+		Count a carving step, and publish a snapshot if the interval has passed.
+		"""
+		self.steps += 1
+		if self.steps % self.checkEvery:
+			return
+		now = time.perf_counter()
+		if now >= self.nextTime:
+			self.publish(cells, stackSize, now)
+			self.nextTime = now + self.interval
+
+	def publish(self, cells, stackSize, now=None):
+		"""
+		Publish a snapshot right away.
+		"""
+		if now is None:
+			now = time.perf_counter()
+		self.header[0] += 1
+		self.cells[...] = cells
+		self.stackSize[...] = stackSize
+		self.header[1] = self.steps
+		self.header[0] += 1
+		if self.recording is not None:
+			packedCells = zlib.compress(np.packbits(self.cells, bitorder='little').tobytes(), 1)
+			packedStack = zlib.compress(self.stackSize.astype('<i8').tobytes(), 1)
+			self.recording.write(struct.pack(frameFormat, self.steps, now - self.startTime, len(packedCells), len(packedStack)))
+			self.recording.write(packedCells)
+			self.recording.write(packedStack)
+
+	def close(self, cells=None, stackSize=None):
+		"""
+		Publish the final state if given, tell the viewers that the carving is finished, and release the shared memory.
+		Viewers that are already attached keep their mapping.
+		"""
+		if cells is not None:
+			self.publish(cells, stackSize)
+		self.header[2] = 1
+		if self.recording is not None:
+			self.recording.close()
+			self.recording = None
+		del self.header, self.cells, self.stackSize
+		self.memory.close()
+		self.memory.unlink()
+
+
+def plotSnapshot(cells, stackSize, image=None):
+	"""
+	Plot a snapshot as a heatmap of stackSize, with the cells that are still filled left blank.
+	Rooms with more than two dimensions show their first layer.
+	"""
+	# matplotlib is only needed by the viewer process
+	import matplotlib.pyplot as plt
+	while cells.ndim > 2:
+		cells, stackSize = cells[..., 0], stackSize[..., 0]
+	data = np.ma.masked_where(cells.T, stackSize.T)
+	if image is None:
+		image = plt.imshow(data, interpolation='nearest', origin='lower')
+	else:
+		image.set_data(data)
+		image.set_clim(0, max(int(stackSize.max()), 1))
+	return image
+
+
+def viewSnapshots(name, shape, interval, attached, keepOpen=True):
+	"""
+	The viewer process: plot the snapshots in a shared memory block until the carving is finished.
+
+	Parameters
+	----------
+	name : str
+		The name of the shared memory block.
+
+	shape : tuple
+		The shape of the room.
+
+	interval : float
+		The time between two looks at the shared memory in seconds.
+
+	attached : multiprocessing.Event
+		Set as soon as the viewer has attached to the shared memory.
+
+	keepOpen : bool, optional
+		If True, the window stays open after the carving is finished.
+	"""
+	memory = shared_memory.SharedMemory(name=name)
+	attached.set()
+	# Loading matplotlib can take a while or fail without a display, so it happens after the publisher is released
+	import matplotlib.pyplot as plt
+	header, sharedCells, sharedStack = snapshotArrays(memory.buf, shape)
+	image = None
+	shownSequence = 0
+	while True:
+		finished = header[2] == 1
+		sequence = header[0]
+		if sequence != shownSequence and sequence % 2 == 0:
+			cells, stackSize = sharedCells.copy(), sharedStack.copy()
+			# Skip the copy if the publisher started a new snapshot in the meantime
+			if header[0] == sequence:
+				image = plotSnapshot(cells, stackSize, image)
+				plt.title('Step {:d}'.format(int(header[1])))
+				shownSequence = sequence
+		if finished and shownSequence == header[0]:
+			break
+		plt.pause(interval)
+	del header, sharedCells, sharedStack
+	memory.close()
+	if keepOpen:
+		plt.show()
+
+
+def startViewer(publisher, keepOpen=True):
+	"""
+	Start a viewer process for a publisher, and wait until it is attached to the shared memory.
+
+	Returns
+	-------
+	multiprocessing.Process
+		The viewer process.
+
+	Raises
+	------
+	RuntimeError
+		If the viewer process ends before it is attached.
+	"""
+	attached = multiprocessing.Event()
+	viewer = multiprocessing.Process(target=viewSnapshots, args=(publisher.name, publisher.shape, publisher.interval, attached, keepOpen))
+	viewer.start()
+	while not attached.wait(0.1):
+		if not viewer.is_alive():
+			raise RuntimeError('The viewer process ended with exit code {} before it attached to the snapshots.'.format(viewer.exitcode))
+	return viewer
+
+
+def readRecording(path):
+	"""
+	Read the snapshots of a recording one at a time.
+
+	Yields
+	------
+	tuple
+		The carving step, the seconds since the start, and the cells and stackSize arrays.
+	"""
+	with open(path, 'rb') as f:
+		if f.read(len(recordingMagic)) != recordingMagic:
+			raise ValueError('{} is not a snapshot recording.'.format(path))
+		dimensionCount = struct.unpack('<H', f.read(2))[0]
+		shape = struct.unpack('<{:d}Q'.format(dimensionCount), f.read(8 * dimensionCount))
+		cellCount = int(np.prod(shape))
+		frameSize = struct.calcsize(frameFormat)
+		while True:
+			frame = f.read(frameSize)
+			if len(frame) < frameSize:
+				return
+			step, elapsed, cellsLength, stackLength = struct.unpack(frameFormat, frame)
+			cells = np.unpackbits(np.frombuffer(zlib.decompress(f.read(cellsLength)), dtype=np.uint8), count=cellCount, bitorder='little')
+			stackSize = np.frombuffer(zlib.decompress(f.read(stackLength)), dtype='<i8')
+			yield step, elapsed, cells.astype(bool).reshape(shape), stackSize.reshape(shape)
+
+
+def replayRecording(path, speed=1.0):
+	"""
+	Play a recording back with matplotlib, at the pace it was recorded with.
+
+	Parameters
+	----------
+	path : str
+		The recording file.
+
+	speed : float, optional
+		The replay speed relative to the recording.
+	"""
+	import matplotlib.pyplot as plt
+	image = None
+	lastElapsed = 0
+	for step, elapsed, cells, stackSize in readRecording(path):
+		image = plotSnapshot(cells, stackSize, image)
+		plt.title('Step {:d}'.format(step))
+		plt.pause(max((elapsed - lastElapsed) / speed, 0.001))
+		lastElapsed = elapsed
+	plt.show()
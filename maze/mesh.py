@@ -0,0 +1,284 @@
+import json
+import maze.helpers
+import numpy as np
+import os
+import shutil
+import struct
+import tempfile
+
+"""
+Greedy-meshed export of rendered 3D mazes to OBJ, STL and binary glTF (.glb) files.
+Every face between a wall voxel and an empty voxel (or the outside) becomes part of a quad. The faces of each slice
+are merged into runs along the last in-plane axis, and runs with the same extent in consecutive rows are merged into
+rectangles, all with array operations. The volume is processed slab by slab along the first dimension and the quads
+are streamed to disk, so only one slab of voxels is in memory. Faces parallel to the slabs are merged across the
+whole slice; the other faces are split at slab boundaries.
+"""
+
+meshFormats = ('obj', 'stl', 'glb')
+
+
+def greedyRectangles(mask):
+	"""
+	Merge the set cells of a stack of 2D masks into rectangles.
+
+	Parameters
+	----------
+	mask : ndarray
+		A boolean array with the shape (slices, rows, columns).
+
+	Returns
+	-------
+	tuple
+		The slice, first row, row after the last, first column and column after the last of every rectangle.
+	"""
+	before = np.zeros(mask.shape, dtype=bool)
+	before[:, :, 1:] = mask[:, :, :-1]
+	after = np.zeros(mask.shape, dtype=bool)
+	after[:, :, :-1] = mask[:, :, 1:]
+	columnCount = mask.shape[2]
+	starts = np.flatnonzero(mask & ~before)
+	firstColumns = starts % columnCount
+	lastColumns = np.flatnonzero(mask & ~after) % columnCount + 1
+	planes, rows = np.divmod(starts // columnCount, mask.shape[1])
+	# The runs are ordered by slice and row; a stable sort by slice and extent keeps that row order, so runs that
+	# continue a rectangle follow it directly
+	order = np.argsort((planes * columnCount + firstColumns) * (columnCount + 1) + lastColumns, kind='stable')
+	planes, rows, firstColumns, lastColumns = planes[order], rows[order], firstColumns[order], lastColumns[order]
+	continues = np.zeros(planes.size, dtype=bool)
+	continues[1:] = (planes[1:] == planes[:-1]) & (firstColumns[1:] == firstColumns[:-1]) & (lastColumns[1:] == lastColumns[:-1]) & (rows[1:] == rows[:-1] + 1)
+	firsts = np.flatnonzero(~continues)
+	lasts = np.append(firsts[1:] - 1, planes.size - 1)[:firsts.size]
+	return planes[firsts], rows[firsts], rows[lasts] + 1, firstColumns[firsts], lastColumns[firsts]
+
+
+def planeQuads(mask, axis, sign, origin):
+	"""
+	Turn the faces of a set of planes into quads.
+
+	Parameters
+	----------
+	mask : ndarray
+		A boolean array with the shape (planes, rows, columns). The planes are perpendicular to axis, and the rows and
+		columns follow the two other axes in increasing order.
+
+	axis : int
+		The axis the faces are perpendicular to.
+
+	sign : int
+		1 if the faces point along +axis, -1 if they point along -axis.
+
+	origin : tuple
+		The coordinates of the first plane, row and column.
+
+	Returns
+	-------
+	ndarray
+		The corners of every quad with the shape (quads, 4, 3), counterclockwise seen from the outside.
+	"""
+	planes, firstRows, lastRows, firstColumns, lastColumns = greedyRectangles(mask)
+	rowAxis, columnAxis = [d for d in range(3) if d != axis]
+	corners = np.empty((planes.size, 4, 3), dtype=np.int64)
+	corners[:, :, axis] = (planes + origin[0])[:, None]
+	corners[:, :, rowAxis] = np.stack((firstRows, lastRows, lastRows, firstRows), axis=1) + origin[1]
+	corners[:, :, columnAxis] = np.stack((firstColumns, firstColumns, lastColumns, lastColumns), axis=1) + origin[2]
+	# The corners run from the row axis to the column axis, which turns around +axis only for cyclic axis orders
+	if sign * (1 if (rowAxis - axis) % 3 == 1 else -1) < 0:
+		corners = corners[:, ::-1]
+	return corners
+
+
+def slabQuads(previousLayer, slab, start):
+	"""
+	Find the quads of one slab of a rendered maze.
+
+	Parameters
+	----------
+	previousLayer : ndarray
+		The last layer of the previous slab, or an empty layer for the first slab.
+
+	slab : ndarray
+		The voxels of the slab, True for walls.
+
+	start : int
+		The position of the slab along the first dimension.
+
+	Yields
+	------
+	tuple
+		The corners of a batch of quads and their normal.
+	"""
+	layers = np.concatenate((previousLayer[None], slab))
+	# Faces between consecutive layers, including the layer before the slab
+	yield planeQuads(layers[:-1] & ~layers[1:], 0, 1, (start, 0, 0)), (1, 0, 0)
+	yield planeQuads(layers[1:] & ~layers[:-1], 0, -1, (start, 0, 0)), (-1, 0, 0)
+	for axis in (1, 2):
+		padding = [(0, 0)] * 3
+		padding[axis] = (1, 1)
+		padded = np.moveaxis(np.pad(slab, padding), axis, 0)
+		yield planeQuads(padded[:-1] & ~padded[1:], axis, 1, (0, start, 0)), tuple(int(d == axis) for d in range(3))
+		yield planeQuads(padded[1:] & ~padded[:-1], axis, -1, (0, start, 0)), tuple(-int(d == axis) for d in range(3))
+
+
+def meshQuads(volume, slabVoxels=2**24):
+	"""
+	Greedy-mesh a rendered maze.
+
+	Parameters
+	----------
+	volume : ndarray, RunLengthVolume or iterable
+		A 3D boolean array, a runLength.RunLengthVolume, or an iterable of (slab range, dense slab) pairs along the
+		first dimension, in order.
+
+	slabVoxels : int, optional
+		The preferred number of voxels per slab when the volume is an array.
+
+	Yields
+	------
+	tuple
+		The corners of a batch of quads with the shape (quads, 4, 3) and the normal of the batch.
+	"""
+	if isinstance(volume, np.ndarray):
+		slabs = ((slab, volume[slab]) for slab in maze.helpers.slabRanges(volume.shape, slabVoxels))
+	elif hasattr(volume, 'iterateSlabs'):
+		slabs = volume.iterateSlabs(slabVoxels)
+	else:
+		slabs = volume
+	previousLayer = None
+	for slab, voxels in slabs:
+		voxels = np.asarray(voxels, dtype=bool)
+		if voxels.ndim != 3:
+			raise ValueError('Only 3D volumes can be meshed.')
+		if previousLayer is None:
+			previousLayer = np.zeros(voxels.shape[1:], dtype=bool)
+		for corners, normal in slabQuads(previousLayer, voxels, slab.start):
+			if len(corners):
+				yield corners, normal
+		previousLayer = voxels[-1]
+		end = slab.stop
+	if previousLayer is not None:
+		# The faces of the last layer towards the outside
+		yield planeQuads(previousLayer[None], 0, 1, (end, 0, 0)), (1, 0, 0)
+
+
+def exportMesh(path, volume, scale=1.0, meshFormat=None, slabVoxels=2**24):
+	"""
+	Greedy-mesh a rendered maze and stream it into a mesh file.
+
+	Parameters
+	----------
+	path : str
+		The file to write.
+
+	volume : ndarray, RunLengthVolume or iterable
+		The rendered maze, see meshQuads().
+
+	scale : float, optional
+		The size of one voxel in the mesh units.
+
+	meshFormat : str, optional
+		'obj', 'stl' or 'glb'. By default the format follows the file extension.
+
+	slabVoxels : int, optional
+		The preferred number of voxels per slab when the volume is an array.
+
+	Returns
+	-------
+	int
+		The number of triangles in the mesh.
+	"""
+	if meshFormat is None:
+		meshFormat = os.path.splitext(path)[1][1:].lower()
+	if meshFormat not in meshFormats:
+		raise ValueError('The mesh format must be one of {}.'.format(', '.join(meshFormats)))
+	quads = meshQuads(volume, slabVoxels)
+	if meshFormat == 'obj':
+		return writeOBJ(path, quads, scale)
+	elif meshFormat == 'stl':
+		return writeSTL(path, quads, scale)
+	return writeGLB(path, quads, scale)
+
+
+def quadTriangles(corners):
+	"""
+	Split quads into two triangles each, with the shape (2 * quads, 3, 3).
+	"""
+	return corners[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3, 3)
+
+
+def writeOBJ(path, quads, scale):
+	"""
+	Stream quads into a Wavefront OBJ file. Every quad gets its own four vertices.
+	"""
+	triangleCount = 0
+	vertexCount = 0
+	with open(path, 'w') as f:
+		f.write('# Maze mesh\n')
+		for corners, normal in quads:
+			vertices = corners.reshape(-1, 3) * scale
+			faces = vertexCount + 1 + np.arange(corners.shape[0] * 4).reshape(-1, 4)
+			# One format string for the whole batch is much faster than formatting line by line
+			f.write(('v %.6g %.6g %.6g\n' * vertices.shape[0]) % tuple(vertices.ravel().tolist()))
+			f.write(('f %d %d %d %d\n' * faces.shape[0]) % tuple(faces.ravel().tolist()))
+			vertexCount += faces.size
+			triangleCount += 2 * faces.shape[0]
+	return triangleCount
+
+
+def writeSTL(path, quads, scale):
+	"""
+	Stream quads into a binary STL file. The triangle count in the header is filled in at the end.
+	"""
+	triangleType = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+	triangleCount = 0
+	with open(path, 'wb') as f:
+		f.write(b'Maze mesh'.ljust(80, b' '))
+		f.write(struct.pack('<I', 0))
+		for corners, normal in quads:
+			triangles = np.zeros(2 * corners.shape[0], dtype=triangleType)
+			triangles['normal'] = normal
+			triangles['vertices'] = quadTriangles(corners) * scale
+			f.write(triangles.tobytes())
+			triangleCount += triangles.size
+		f.seek(80)
+		f.write(struct.pack('<I', triangleCount))
+	return triangleCount
+
+
+def writeGLB(path, quads, scale):
+	"""
+	Stream quads into a binary glTF file with one non-indexed triangle mesh.
+	The vertex data goes to a temporary file first, since the JSON chunk that describes it comes before it.
+	"""
+	vertexCount = 0
+	lower = np.full(3, np.inf)
+	upper = np.full(3, -np.inf)
+	with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path))) as buffer:
+		for corners, normal in quads:
+			vertices = (quadTriangles(corners).reshape(-1, 3) * scale).astype('<f4')
+			lower = np.minimum(lower, vertices.min(axis=0))
+			upper = np.maximum(upper, vertices.max(axis=0))
+			buffer.write(vertices.tobytes())
+			vertexCount += vertices.shape[0]
+		byteLength = vertexCount * 12
+		description = {
+			'asset': {'version': '2.0', 'generator': 'maze.mesh'},
+			'scene': 0,
+			'scenes': [{'nodes': [0]}],
+			'nodes': [{'mesh': 0}],
+			'meshes': [{'primitives': [{'attributes': {'POSITION': 0}, 'mode': 4}]}],
+			'buffers': [{'byteLength': byteLength}],
+			'bufferViews': [{'buffer': 0, 'byteOffset': 0, 'byteLength': byteLength, 'target': 34962}],
+			'accessors': [{'bufferView': 0, 'componentType': 5126, 'count': vertexCount, 'type': 'VEC3',
+				'min': lower.tolist() if vertexCount else [0, 0, 0], 'max': upper.tolist() if vertexCount else [0, 0, 0]}],
+		}
+		header = json.dumps(description).encode()
+		header += b' ' * (-len(header) % 4)
+		with open(path, 'wb') as f:
+			f.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(header) + 8 + byteLength))
+			f.write(struct.pack('<II', len(header), 0x4E4F534A))
+			f.write(header)
+			f.write(struct.pack('<II', byteLength, 0x004E4942))
+			buffer.seek(0)
+			shutil.copyfileobj(buffer, f)
+	return vertexCount // 3
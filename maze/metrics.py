@@ -0,0 +1,189 @@
+import maze.graph
+import maze.helpers
+import numpy as np
+import scipy.sparse.csgraph
+
+"""
+Quality metrics for finished mazes, computed straight from the wall arrays of a Room, without rendering.
+The cellDegrees() function counts the open walls of every cell.
+The corridorRunLengths() function measures the straight corridors along one dimension.
+The deadEndLengths() function measures the passages that lead from a dead end to the next junction.
+The solutionPath() function finds the shortest path from the entrance to the exit.
+The measureMaze() function combines all of these into a small summary, for scoring large parameter searches.
+"""
+
+
+def cellDegrees(room):
+	"""
+	Count the open walls between every cell and its neighbors inside the room.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	Returns
+	-------
+	ndarray
+		A grid with the number of open walls of every cell: 1 is a dead end, 2 a passage, 3 or more a junction.
+	"""
+	degrees = np.zeros(room.shape, dtype=np.int8)
+	for dim in range(len(room.shape)):
+		forwardSelector = [slice(None)] * len(room.shape)
+		backwardSelector = [slice(None)] * len(room.shape)
+		forwardSelector[dim] = slice(0, -1)
+		backwardSelector[dim] = slice(1, None)
+		isOpen = ~room.walls[2 * dim][tuple(forwardSelector)]
+		degrees[tuple(forwardSelector)] += isOpen
+		degrees[tuple(backwardSelector)] += isOpen
+	return degrees
+
+
+def corridorRunLengths(room, dim):
+	"""
+	Measure all straight corridors along one dimension: a corridor is a run of cells connected by open walls along that dimension.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	dim : int
+		The dimension along which corridors are measured.
+
+	Returns
+	-------
+	ndarray
+		A histogram: entry k is the number of straight corridors that are k cells long (k >= 2).
+	"""
+	selector = [slice(None)] * len(room.shape)
+	selector[dim] = slice(0, -1)
+	isOpen = np.moveaxis(~room.walls[2 * dim][tuple(selector)], dim, -1)
+	rowLength = isOpen.shape[-1]
+	# Pad every row with a closed wall on both sides, so runs never continue into the next row
+	padded = np.zeros((int(np.prod(isOpen.shape[:-1])), rowLength + 2), dtype=np.int8)
+	padded[:, 1:-1] = isOpen.reshape(-1, rowLength)
+	edges = np.diff(padded.ravel())
+	runStarts = np.flatnonzero(edges == 1)
+	runEnds = np.flatnonzero(edges == -1)
+	return np.bincount(runEnds - runStarts + 1, minlength=2)
+
+
+def deadEndLengths(room, degrees=None):
+	"""
+	Measure every dead-end passage: the cells from a dead end up to (but not including) the next junction.
+	Long dead-end passages make a maze "flow" like a river; many short ones make it look bushy.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	degrees : ndarray, optional
+		The result of cellDegrees(), if it was calculated before.
+
+	Returns
+	-------
+	ndarray
+		The length of every dead-end passage, in cells.
+	"""
+	if degrees is None:
+		degrees = cellDegrees(room)
+	strides = maze.helpers.flatStrides(room.shape)
+	passage = (degrees > 0) & (degrees <= 2)
+	cellCount = int(np.prod(room.shape))
+	parent = np.arange(cellCount, dtype=np.int64)
+	# Join all neighboring passage cells, which leaves one component per passage
+	for dim in range(len(room.shape)):
+		lowerCells = maze.helpers.forwardWallIndices(room, dim, slice(0, room.shape[0]))
+		upperCells = lowerCells + strides[dim]
+		inPassage = passage.flat[lowerCells] & passage.flat[upperCells]
+		maze.helpers.connectEdges(parent, lowerCells[inPassage], upperCells[inPassage])
+	passageSizes = np.bincount(maze.helpers.findRoots(parent, np.flatnonzero(passage)), minlength=cellCount)
+	# A passage with a dead end at both ends is counted once
+	hasDeadEnd = np.zeros(cellCount, dtype=bool)
+	hasDeadEnd[maze.helpers.findRoots(parent, np.flatnonzero(degrees == 1))] = True
+	return passageSizes[hasDeadEnd]
+
+
+def solutionPath(room, startPosition, exitPosition, adjacency=None):
+	"""
+	Find the cells on a shortest path from the entrance to the exit, by a breadth-first search from the entrance
+	and a walk back along the predecessors from the exit. The walk uses pointer doubling, so it takes about
+	log2(path length) array operations over all cells instead of one Python step per cell of the path.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	startPosition, exitPosition : tuple
+		The entrance and the exit of the maze.
+
+	adjacency : scipy.sparse.csr_matrix, optional
+		The result of maze.graph.toAdjacencyMatrix(), if it was calculated before.
+
+	Returns
+	-------
+	tuple
+		The length of the path in steps (-1 if the exit cannot be reached), and a boolean grid that is True on the path.
+	"""
+	if adjacency is None:
+		adjacency = maze.graph.toAdjacencyMatrix(room)
+	start, end = maze.graph.cellIndices([startPosition, exitPosition], room)
+	# The matrix is symmetric, so it can be searched as a directed graph, which skips a conversion
+	order, predecessors = scipy.sparse.csgraph.breadth_first_order(adjacency, start, directed=True)
+	onPath = np.zeros(room.shape, dtype=bool)
+	if predecessors[end] < 0 and end != start:
+		return -1, onPath
+	# The entrance and unreached cells point to themselves, so a walk stops at the entrance
+	jump = np.where(predecessors < 0, np.arange(predecessors.size), predecessors)
+	# path[i] is the cell i steps back from the exit; every round doubles the known part of the path and the jump
+	path = np.array([end])
+	while not np.any(path == start):
+		path = np.concatenate([path, jump[path]])
+		jump = jump[jump]
+	length = int(np.argmax(path == start))
+	onPath.flat[path[:length + 1]] = True
+	return length, onPath
+
+
+def measureMaze(room, startPosition, exitPosition, solution=True):
+	"""
+	Compute a summary of quality metrics for a finished maze.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	startPosition, exitPosition : tuple
+		The entrance and the exit of the maze, as returned by the generators.
+
+	solution : bool, optional
+		If False, the solution metrics (which need the adjacency matrix of the whole maze) are skipped.
+
+	Returns
+	-------
+	dict
+		cells: the number of cells.
+		deadEnds: the number of cells with a single open wall.
+		degreeHistogram: entry k is the number of cells with k open walls.
+		runLengths: one histogram per dimension, see corridorRunLengths().
+		meanDeadEndLength: the mean length of the dead-end passages (the "river factor").
+		solutionLength: the number of steps from the entrance to the exit.
+		solutionFraction: the fraction of all cells that lie on the shortest solution path.
+	"""
+	degrees = cellDegrees(room)
+	metrics = dict()
+	metrics['cells'] = int(degrees.size)
+	metrics['degreeHistogram'] = np.bincount(degrees.ravel(), minlength=2 * len(room.shape) + 1)
+	metrics['deadEnds'] = int(metrics['degreeHistogram'][1])
+	metrics['runLengths'] = [corridorRunLengths(room, dim) for dim in range(len(room.shape))]
+	lengths = deadEndLengths(room, degrees)
+	metrics['meanDeadEndLength'] = float(np.mean(lengths)) if lengths.size > 0 else 0.0
+	if solution:
+		length, onPath = solutionPath(room, startPosition, exitPosition)
+		metrics['solutionLength'] = length
+		metrics['solutionFraction'] = float(np.count_nonzero(onPath)) / degrees.size
+	return metrics
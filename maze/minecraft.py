@@ -1,11 +1,79 @@
-import pymclevel
+import hashlib
+import json
 import numpy as np
-from scipy.ndimage.morphology import binary_erosion
+import os
 
 
-def insertToMinecraft(worldFilename, renderedMaze, insertionHeight):
+def chunkHashes(renderedMaze):
+    """
+    Hashes the content of every 16 x 16 block column of a rendered maze, to find the Minecraft chunks that changed
+    between two insertions.
+
+    Parameters
+    ----------
+    renderedMaze : ndarray
+        A 3D numpy array representing the maze, where True values represent walls.
+
+    Returns
+    -------
+    hashes : dict
+        The hex digest of every chunk, keyed by 'x,z' chunk coordinates relative to the maze.
+    """
+    hashes = {}
+    for mazeXchunk in range(int(np.ceil(renderedMaze.shape[0] / 16))):
+        for mazeZchunk in range(int(np.ceil(renderedMaze.shape[1] / 16))):
+            wallSelector = renderedMaze[mazeXchunk*16:(mazeXchunk+1)*16, mazeZchunk*16:(mazeZchunk+1)*16, :]
+            digest = hashlib.blake2b(np.array(wallSelector.shape, dtype='<i8').tobytes(), digest_size=16)
+            digest.update(np.packbits(wallSelector).tobytes())
+            hashes['{:d},{:d}'.format(mazeXchunk, mazeZchunk)] = digest.hexdigest()
+    return hashes
+
+def manifestPath(worldFilename, name):
+    """
+    The path of the chunk manifest of an inserted maze, which is stored in the world's directory.
+    """
+    worldDirectory = worldFilename if os.path.isdir(worldFilename) else os.path.dirname(worldFilename)
+    return os.path.join(worldDirectory, 'maze-{}.manifest.json'.format(name))
+
+def findPlacement(minecraftWorld, renderedMaze):
+    """
+    Finds the chunk offset of a new maze: the free area of existing chunks closest to the world origin.
+    """
+    # scipy is large, so it is only imported when a maze is placed
+    from scipy.ndimage import binary_erosion
+
+    allChunkPositions = np.array(list(minecraftWorld.allChunks))
+    # See if there are enough chunks to place the maze
+    chunkMapSize = [-1,-1]
+    chunkMapOrigin = [-1,-1]
+    for dim in [0,1]:
+        chunkMapSize[dim] = np.max(allChunkPositions[:,dim]) - np.min(allChunkPositions[:,dim]) + 1
+        chunkMapOrigin[dim] = np.min(allChunkPositions[:,dim])
+    chunkMap = np.zeros(chunkMapSize, dtype=bool)
+    for chunkPosition in allChunkPositions:
+        pos = [chunkPosition[dim] - chunkMapOrigin[dim] for dim in [0,1]]
+        chunkMap[pos[0], pos[1]] = True
+    mazeChunkSize = [int(np.ceil(renderedMaze.shape[dim] / 16)) for dim in [0,1]]
+    halfMazeChunkSize = [int(np.ceil(mazeChunkSize[dim] / 2)) for dim in [0,1]]
+    erodedWidthMap = binary_erosion(chunkMap, structure = np.ones((1,3)), iterations=mazeChunkSize[0])
+    erodedHeightMap = binary_erosion(chunkMap, structure = np.ones((3,1)), iterations=mazeChunkSize[1])
+    possiblePlacementMap = np.logical_and(erodedWidthMap, erodedHeightMap)
+    if not possiblePlacementMap.any():
+        errorText = 'Your maze is too big!\nTo insert this maze, generate an area of {:d}x{:d} blocks ({:d}x{:d} chunks)!'
+        raise ValueError(errorText.format(renderedMaze.shape[0], renderedMaze.shape[1], mazeChunkSize[0], mazeChunkSize[1]))
+    possiblePlacementCoordinates = np.transpose(np.array(np.where(possiblePlacementMap)))
+    distanceToZero = [(p[0] - chunkMapOrigin[0])**2 + (p[1] - chunkMapOrigin[1])**2 for p in possiblePlacementCoordinates]
+    placementCenterCoordinates = possiblePlacementCoordinates[np.argmin(distanceToZero)]
+    return [int(placementCenterCoordinates[dim] - halfMazeChunkSize[dim] + chunkMapOrigin[dim]) for dim in [0,1]]
+
+def insertToMinecraft(worldFilename, renderedMaze, insertionHeight, entrancePoint=(0, 0, 0), name='maze', incremental=True):
     """
     Inserts a rendered 3D maze into a specified Minecraft world at a given height.
+    A manifest with the placement and a content hash of every chunk (see chunkHashes) is stored next to the world. When
+    a maze with the same name is inserted again, it keeps its placement, and only the chunks whose content changed are
+    rewritten, relit and saved: their old content is cleared to air before the new content is written, and so are the
+    chunks that the new maze no longer covers. A maze that grows beyond the existing chunks around it is removed and
+    placed anew.
 
     Parameters
     ----------
@@ -20,6 +88,15 @@ def insertToMinecraft(worldFilename, renderedMaze, insertionHeight):
         above the bottom of the world. The world's height limit is 256 blocks, so the sum of insertionHeight and the height
         of the maze cannot exceed this value.
 
+    entrancePoint : tuple, optional
+        The [x, z, y] voxel coordinates of the entrance in the rendered maze.
+
+    name : str, optional
+        The name of the maze, which identifies its manifest.
+
+    incremental : bool, optional
+        If False, the manifest is ignored and the maze is placed and written as a new one.
+
     Returns
     -------
     mazeEntrance : list
@@ -37,52 +114,132 @@ def insertToMinecraft(worldFilename, renderedMaze, insertionHeight):
     way that it does not intersect with any existing structures in the world.
     """
 
+    # pymclevel loads its material files, so it is only imported when a maze is inserted
+    import pymclevel
+
     y = [insertionHeight, insertionHeight + renderedMaze.shape[2], renderedMaze.shape[2]]
     if y[1] > 256:
-        error('Your maze is too tall and exceeds the level limits by {:d} blocks. Please lower insertionHeight or your maze.'.format(256 - y[1]))
+        raise ValueError('Your maze is too tall and exceeds the level limits by {:d} blocks. Please lower insertionHeight or your maze.'.format(y[1] - 256))
     minecraftWorld = pymclevel.mclevel.fromFile(worldFilename)
-    allChunkPositions = np.array(list(minecraftWorld.allChunks))
-    # See if there are enough chunks to place the maze
-    chunkMapSize = [-1,-1]
-    chunkMapOrigin = [-1,-1]
-    for dim in [0,1]:
-        chunkMapSize[dim] = np.max(allChunkPositions[:,dim]) - np.min(allChunkPositions[:,dim]) + 1
-        chunkMapOrigin[dim] = np.min(allChunkPositions[:,dim])
-    chunkMap = np.zeros(chunkMapSize, dtype=bool)
-    for chunkPosition in allChunkPositions:
-        pos = [chunkPosition[dim] - chunkMapOrigin[dim] for dim in [0,1]]
-        chunkMap[pos[0], pos[1]] = True
+    hashes = chunkHashes(renderedMaze)
+    path = manifestPath(worldFilename, name)
+    manifest = None
+    if incremental and os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+
+    # Find the chunks that changed since the last insertion. The old content of every changed chunk and of every
+    # chunk the maze left is cleared first, so a maze that shrinks inside a chunk leaves no walls behind
     mazeChunkSize = [int(np.ceil(renderedMaze.shape[dim] / 16)) for dim in [0,1]]
-    halfMazeChunkSize = [int(np.ceil(mazeChunkSize[dim] / 2)) for dim in [0,1]]
-    erodedWidthMap = binary_erosion(chunkMap, structure = np.ones((1,3)), iterations=mazeChunkSize[0])
-    erodedHeightMap = binary_erosion(chunkMap, structure = np.ones((3,1)), iterations=mazeChunkSize[1])
-    possiblePlacementMap = np.logical_and(erodedWidthMap, erodedHeightMap)
-    if not possiblePlacementMap.any():
-        errorText = 'Your maze is too big!\nTo insert this maze, generate an area of {:d}x{:d} blocks ({:d}x{:d} chunks)!'
-        error(errorText.format(roomSize[0], roomSize[1], mazeChunkSize[0], mazeChunkSize[1]))
-    possiblePlacementCoordinates = np.transpose(np.array(np.where(possiblePlacementMap)))
-    distanceToZero = [(p[0] - chunkMapOrigin[0])**2 + (p[1] - chunkMapOrigin[1])**2 for p in possiblePlacementCoordinates]
-    placementCenterCoordinates = possiblePlacementCoordinates[np.argmin(distanceToZero)]
+    if manifest is not None:
+        mazeOffset = manifest['offset']
+        footprint = [(mazeXchunk + mazeOffset[0], mazeZchunk + mazeOffset[1]) for mazeXchunk in range(mazeChunkSize[0]) for mazeZchunk in range(mazeChunkSize[1])]
+        if not all(minecraftWorld.containsChunk(*chunkPosition) for chunkPosition in footprint):
+            # The maze grew beyond the generated chunks around it, so it is removed and placed anew
+            print('The maze no longer fits at its old place and is moved.')
+            mazeOffset = None
+    if manifest is None:
+        mazeOffset = findPlacement(minecraftWorld, renderedMaze)
+        changedChunks = list(hashes)
+        clearedChunks = []
+    elif mazeOffset is None:
+        mazeOffset = findPlacement(minecraftWorld, renderedMaze)
+        changedChunks = list(hashes)
+        clearedChunks = list(manifest['chunks'])
+    else:
+        sameLayers = manifest['insertionHeight'] == y[0] and manifest['shape'][2] == y[2]
+        changedChunks = [key for key in hashes if not sameLayers or manifest['chunks'].get(key) != hashes[key]]
+        clearedChunks = [key for key in manifest['chunks'] if key not in hashes or key in changedChunks]
+    print('Rewriting {:d} chunks, {:d} unchanged...'.format(len(set(changedChunks) | set(clearedChunks)), len(hashes) - len(changedChunks)))
 
-    # Insert the maze into the Minecraft world
     airMaterial = minecraftWorld.materials.Air.ID
     wallMaterial = minecraftWorld.materials.BlockofIron.ID
-    mazeOffset = [placementCenterCoordinates[dim] - halfMazeChunkSize[dim] + chunkMapOrigin[dim] for dim in [0,1]]
-    for mazeXchunk in range(mazeChunkSize[0]):
+    touchedChunks = set()
+    for key in clearedChunks:
+        mazeXchunk, mazeZchunk = [int(c) for c in key.split(',')]
+        chunkPosition = (mazeXchunk + manifest['offset'][0], mazeZchunk + manifest['offset'][1])
+        if minecraftWorld.containsChunk(*chunkPosition):
+            oldShape = manifest['shape']
+            chunkXLims = min(16, oldShape[0] - mazeXchunk*16)
+            chunkZLims = min(16, oldShape[1] - mazeZchunk*16)
+            chunk = minecraftWorld.getChunk(*chunkPosition)
+            chunk.Blocks[:chunkXLims, :chunkZLims, manifest['insertionHeight']:manifest['insertionHeight'] + oldShape[2]] = airMaterial
+            chunk.chunkChanged()
+            touchedChunks.add(chunkPosition)
+
+    # Insert the maze into the Minecraft world
+    for key in changedChunks:
+        mazeXchunk, mazeZchunk = [int(c) for c in key.split(',')]
         mazeXLims = [mazeXchunk*16, min((mazeXchunk+1)*16, renderedMaze.shape[0])]
         chunkXLims = mazeXLims[1] - mazeXLims[0]
-        for mazeZchunk in range(mazeChunkSize[1]):
-            mazeZLims = [mazeZchunk*16, min((mazeZchunk+1)*16, renderedMaze.shape[1])]
-            chunkZLims = mazeZLims[1] - mazeZLims[0]
-            wallSelector = renderedMaze[mazeXLims[0]:mazeXLims[1], mazeZLims[0]:mazeZLims[1], :]
-            mazeChunk = np.ones((chunkXLims, chunkZLims, y[2])) * airMaterial
-            mazeChunk[wallSelector] = wallMaterial
-            chunk = minecraftWorld.getChunk(mazeXchunk + mazeOffset[0], mazeZchunk + mazeOffset[1])
-            chunk.Blocks[:chunkXLims, :chunkZLims, y[0]:y[1]] = mazeChunk
-            chunk.chunkChanged()
-    mazeEntrance = [entrancePoint[dim] + mazeOffset[dim] for dim in [0,1]]
+        mazeZLims = [mazeZchunk*16, min((mazeZchunk+1)*16, renderedMaze.shape[1])]
+        chunkZLims = mazeZLims[1] - mazeZLims[0]
+        wallSelector = renderedMaze[mazeXLims[0]:mazeXLims[1], mazeZLims[0]:mazeZLims[1], :]
+        mazeChunk = np.ones((chunkXLims, chunkZLims, y[2])) * airMaterial
+        mazeChunk[wallSelector] = wallMaterial
+        chunkPosition = (mazeXchunk + mazeOffset[0], mazeZchunk + mazeOffset[1])
+        chunk = minecraftWorld.getChunk(*chunkPosition)
+        chunk.Blocks[:chunkXLims, :chunkZLims, y[0]:y[1]] = mazeChunk
+        chunk.chunkChanged()
+        touchedChunks.add(chunkPosition)
+    mazeEntrance = [entrancePoint[dim] + mazeOffset[dim] * 16 for dim in [0,1]]
     mazeEntrance.append(entrancePoint[2] + insertionHeight)
-    print('Recalculating lights...')
-    minecraftWorld.generateLights()
-    minecraftWorld.saveInPlace()
-    return mazeEntrance
\ No newline at end of file
+    if touchedChunks:
+        print('Recalculating lights...')
+        minecraftWorld.generateLights(sorted(touchedChunks))
+        minecraftWorld.saveInPlace()
+
+    # Only record the new content once the world is saved
+    manifest = {'offset': mazeOffset, 'insertionHeight': y[0], 'shape': list(renderedMaze.shape), 'chunks': hashes}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+    return mazeEntrance
+
+def streamInfiniteMaze(minecraftWorld, infiniteMaze, chunkPositions, insertionHeight, mazeHeight, passageSize, wallThickness):
+    """
+    Writes chunks of an infinite maze (see maze.infinite) into an open Minecraft world, for example whenever players explore new areas.
+    Only the maze cells that touch the requested chunks are generated, and neighboring chunks always fit together.
+
+    Parameters
+    ----------
+    minecraftWorld : pymclevel level
+        The open Minecraft world. Missing chunks are created. The world is not saved; call saveInPlace() when convenient.
+
+    infiniteMaze : maze.infinite.InfiniteMaze
+        A 2D maze (extruded to mazeHeight) or a 3D maze (whose third dimension is the height).
+
+    chunkPositions : list of tuple
+        The (x, z) chunk coordinates to write.
+
+    insertionHeight : int
+        The y-coordinate in the Minecraft world where the bottom of the maze will be placed.
+
+    mazeHeight : int
+        The height of the maze in blocks.
+
+    passageSize, wallThickness : int
+        The rendering parameters, as in plotTools.renderWalls.
+
+    Raises
+    ------
+    ValueError
+        If the maze would exceed the level limits.
+    """
+    if insertionHeight + mazeHeight > 256:
+        raise ValueError('Your maze is too tall and exceeds the level limits by {:d} blocks. Please lower insertionHeight or your maze.'.format(insertionHeight + mazeHeight - 256))
+    airMaterial = minecraftWorld.materials.Air.ID
+    wallMaterial = minecraftWorld.materials.BlockofIron.ID
+    dimensions = len(infiniteMaze.tileShape)
+    for chunkX, chunkZ in chunkPositions:
+        voxelPosition = (chunkX * 16, chunkZ * 16) + (0,) * (dimensions - 2)
+        voxelShape = (16, 16) + (mazeHeight,) * (dimensions - 2)
+        walls = infiniteMaze.renderRegion(voxelPosition, voxelShape, passageSize, wallThickness)
+        if walls.ndim == 2:
+            walls = np.repeat(walls[:, :, np.newaxis], mazeHeight, axis=2)
+        if not minecraftWorld.containsChunk(chunkX, chunkZ):
+            minecraftWorld.createChunk(chunkX, chunkZ)
+        chunk = minecraftWorld.getChunk(chunkX, chunkZ)
+        chunk.Blocks[:, :, insertionHeight:insertionHeight + mazeHeight] = np.where(walls, wallMaterial, airMaterial)
+        chunk.chunkChanged()
+    minecraftWorld.generateLights(list(chunkPositions))
@@ -0,0 +1,321 @@
+import argparse
+import copy
+import json
+import maze.excavation
+import maze.helpers
+import maze.planner
+import maze.runLength
+import maze.validation
+import maze.voxels
+import numpy as np
+import os
+import queue
+import random
+import threading
+import time
+
+"""
+The end-to-end maze pipeline: room, caverns, carve, post-process, render, export.
+A pipeline is described by a configuration dictionary (usually a JSON file, see defaultConfiguration). The memory
+of the whole pipeline is planned first, so jobs that cannot fit fail before anything is allocated.
+The plan's choices are applied: the room backing, the stack size dtype of carvePassages, whether the slab generators
+measure distances, and the render mode.
+Rendering and exporting overlap: the render stage renders the maze slab by slab along the first dimension (or
+decodes a run-length encoded render slab by slab) and puts every slab into a bounded queue for each export that
+consumes slabs, while exports that work on the room itself (like the maze file) run at the same time. Every stage
+is timed.
+
+Slab exports: mesh (OBJ/STL/glTF), png, minecraft. Room exports: storage (maze file), pyramid (2D tile pyramid),
+schematic (3D .schematic file).
+The pipeline can be run from the command line: python -m maze.pipeline configuration.json
+"""
+
+defaultConfiguration = {
+	'shape': [21, 21, 3],
+	'startPosition': None,
+	'generator': 'passages',
+	'flatness': None,
+	'exitWallSide': -1,
+	'seed': None,
+	'caverns': {'fillRatio': 0, 'typicalCavernDiameter': 5, 'sizeDeviation': 1},
+	'postProcess': {'validate': True, 'repair': True, 'breakLoops': False},
+	'render': {'passageSize': 3, 'wallThickness': 1, 'slabVoxels': 2**24, 'queueSlabs': 4},
+	'memory': {'budget': None, 'roomDirectory': None},
+	'exports': [],
+}
+
+
+def loadConfiguration(path):
+	"""
+	Read a JSON pipeline configuration and complete it with the defaults.
+	"""
+	with open(path) as f:
+		return completeConfiguration(json.load(f))
+
+
+def completeConfiguration(configuration):
+	"""
+	Fill in every setting that a configuration leaves out, from defaultConfiguration.
+	"""
+	complete = copy.deepcopy(defaultConfiguration)
+	for key, value in configuration.items():
+		if isinstance(complete.get(key), dict):
+			complete[key].update(value)
+		else:
+			complete[key] = value
+	dimCount = len(complete['shape'])
+	if complete['startPosition'] is None:
+		complete['startPosition'] = [0] * dimCount
+	if complete['flatness'] is None:
+		complete['flatness'] = [0] * dimCount
+	if complete['generator'] not in maze.excavation.generators:
+		raise ValueError('Unknown generator {}; choose one of {}.'.format(complete['generator'], ', '.join(maze.excavation.generators)))
+	for export in complete['exports']:
+		if export['type'] not in slabExports and export['type'] not in roomExports:
+			raise ValueError('Unknown export type {}.'.format(export['type']))
+	return complete
+
+
+def iterateQueue(slabQueue):
+	"""
+	Yield the (slab range, voxels) pairs of a queue until the end marker None.
+	"""
+	while True:
+		item = slabQueue.get()
+		if item is None:
+			return
+		yield item
+
+
+def assembleSlabs(slabs, spaceSize):
+	"""
+	Collect the slabs of a render into one dense volume, for exports that need the whole volume.
+	"""
+	volume = np.zeros(spaceSize, dtype=bool)
+	for slab, voxels in slabs:
+		volume[slab] = voxels
+	return volume
+
+
+def exportMesh(export, slabs, context):
+	"""
+	Stream the slabs into a mesh file (settings: path, scale, format).
+	"""
+	import maze.mesh
+	maze.mesh.exportMesh(export['path'], slabs, export.get('scale', 1.0), export.get('format'))
+
+
+def exportPNG(export, slabs, context):
+	"""
+	Save the rendered maze as PNG layers into a directory (settings: path, the directory, which is created if needed).
+	"""
+	import maze.plotTools
+	os.makedirs(export['path'], exist_ok=True)
+	maze.plotTools.saveToPNG(assembleSlabs(slabs, context['spaceSize']), export['path'])
+
+
+def exportMinecraft(export, slabs, context):
+	"""
+	Insert the rendered maze into a Minecraft world (settings: world, insertionHeight, name). Inserting a maze with the
+	same name again only rewrites the chunks that changed.
+	"""
+	import maze.minecraft
+	maze.minecraft.insertToMinecraft(export['world'], assembleSlabs(slabs, context['spaceSize']), export.get('insertionHeight', 64), name=export.get('name', 'maze'))
+
+
+def exportStorage(export, context):
+	"""
+	Save the finished room as a maze file (settings: path).
+	"""
+	import maze.storage
+	maze.storage.saveMaze(export['path'], context['room'], context['entrance'], context['exit'], context['distance'], context['seed'])
+
+
+def exportPyramid(export, context):
+	"""
+	Render a 2D room into a deep-zoom tile pyramid (settings: path, tileSize, processes).
+	"""
+	import maze.pyramid
+	render = context['render']
+	maze.pyramid.renderTilePyramid(context['room'], export['path'], render['passageSize'], render['wallThickness'], export.get('tileSize', 256), export.get('processes'))
+
+
+def exportSchematic(export, context):
+	"""
+	Stream a 3D room into a .schematic file (settings: path, wallBlock).
+	"""
+	import maze.schematic
+	render = context['render']
+	maze.schematic.exportSchematic(export['path'], context['room'], render['passageSize'], render['wallThickness'], export.get('wallBlock', 42), slabVoxels=render['slabVoxels'])
+
+
+# Exports that consume the rendered slabs, and exports that work on the finished room
+slabExports = {'mesh': exportMesh, 'png': exportPNG, 'minecraft': exportMinecraft}
+roomExports = {'storage': exportStorage, 'pyramid': exportPyramid, 'schematic': exportSchematic}
+
+
+def runExport(function, arguments, name, timings, errors, slabs=None):
+	"""
+	Run one export in its own thread and time it. The slabs that a slab export leaves unread (for example because it
+	failed) are drained, so the render stage never blocks on it.
+	"""
+	startTime = time.perf_counter()
+	try:
+		function(*arguments)
+	except Exception as error:
+		errors.append((name, error))
+	finally:
+		if slabs is not None:
+			for _ in slabs:
+				pass
+		timings[name] = time.perf_counter() - startTime
+
+
+def runPipeline(configuration, log=print):
+	"""
+	Run a complete pipeline.
+
+	Parameters
+	----------
+	configuration : dict
+		The pipeline configuration; missing settings are taken from defaultConfiguration.
+
+	log : function, optional
+		Called with a progress message for every stage. Pass None for a silent run.
+
+	Returns
+	-------
+	dict
+		The room, distance grid, entrance, exit, validation report (None if validation is turned off), memory plan and
+		the time of every stage in seconds.
+	"""
+	configuration = completeConfiguration(configuration)
+	log = log or (lambda message: None)
+	timings = {}
+	shape = tuple(configuration['shape'])
+	start = tuple(configuration['startPosition'])
+	render = configuration['render']
+	cellSize = render['passageSize'] + 2 * render['wallThickness']
+	spaceSize = tuple(g * cellSize for g in shape)
+	exports = configuration['exports']
+	if configuration['seed'] is not None:
+		random.seed(configuration['seed'])
+		np.random.seed(configuration['seed'])
+
+	def timed(stage, function, *arguments, **keywordArguments):
+		log('{}...'.format(stage.capitalize()))
+		startTime = time.perf_counter()
+		result = function(*arguments, **keywordArguments)
+		timings[stage] = time.perf_counter() - startTime
+		return result
+
+	# Plan the memory before anything is allocated; exports that assemble slabs need the dense volume, the other slab
+	# exports are fed from a run-length encoded render, and without slab exports nothing is rendered here
+	if any(export['type'] in ('png', 'minecraft') for export in exports):
+		renderMode = 'dense'
+	elif any(export['type'] in slabExports for export in exports):
+		renderMode = 'runLength'
+	else:
+		renderMode = None
+	postProcessSettings = configuration['postProcess']
+	if not postProcessSettings['validate']:
+		postProcessMode = None
+	else:
+		postProcessMode = 'repair' if postProcessSettings['repair'] else 'validate'
+	plan = timed('plan', maze.planner.planMemory, shape, configuration['generator'], render['passageSize'], render['wallThickness'],
+		render=renderMode, export=[export['type'] for export in exports], budget=configuration['memory']['budget'],
+		directory=configuration['memory']['roomDirectory'], slabCells=render['slabVoxels'], fillRatio=configuration['caverns']['fillRatio'],
+		postProcess=postProcessMode)
+	room = timed('room', maze.planner.createRoom, plan, shape, configuration['memory']['roomDirectory'])
+	caverns = configuration['caverns']
+	if caverns['fillRatio'] > 0:
+		timed('caverns', maze.excavation.carveCaverns, room, caverns['fillRatio'], caverns['typicalCavernDiameter'], caverns['sizeDeviation'])
+	# Carve with the dtypes and options that the plan was computed for
+	generator = maze.excavation.generators[configuration['generator']]
+	generatorOptions = {}
+	if configuration['generator'] == 'passages':
+		generatorOptions['stackType'] = plan['stackType']
+	if configuration['generator'] in maze.planner.slabGenerators:
+		generatorOptions['measureDistance'] = plan['measureDistance']
+	room, distance, exitCoordinates = timed('carve', generator, room, start, configuration['flatness'], exitWallSide=configuration['exitWallSide'], **generatorOptions)
+
+	def postProcess():
+		report = maze.validation.validateMaze(room, start)
+		del report['labels']
+		if postProcessSettings['repair'] and (report['components'] > 1 or (postProcessSettings['breakLoops'] and report['loops'] > 0)):
+			report['opened'], report['closed'] = maze.validation.repairMaze(room, postProcessSettings['breakLoops'])
+		return report
+	# Without validation there is nothing to repair either
+	report = timed('postProcess', postProcess) if postProcessMode is not None else None
+
+	# Render slab by slab while every export runs in its own thread
+	log('Rendering and exporting...')
+	context = {'room': room, 'distance': distance, 'entrance': list(start), 'exit': exitCoordinates, 'seed': configuration['seed'] if configuration['seed'] is not None else -1,
+		'render': render, 'spaceSize': spaceSize}
+	errors = []
+	threads = []
+	slabQueues = []
+	for number, export in enumerate(exports):
+		name = 'export {:d} ({})'.format(number, export['type'])
+		if export['type'] in slabExports:
+			slabQueue = queue.Queue(maxsize=render['queueSlabs'])
+			slabQueues.append(slabQueue)
+			slabs = iterateQueue(slabQueue)
+			threads.append(threading.Thread(target=runExport, args=(slabExports[export['type']], (export, slabs, context), name, timings, errors, slabs)))
+		else:
+			threads.append(threading.Thread(target=runExport, args=(roomExports[export['type']], (export, context), name, timings, errors)))
+	startTime = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	renderTime = 0
+	if slabQueues:
+		try:
+			renderStart = time.perf_counter()
+			if plan['render'] == 'runLength':
+				slabs = maze.runLength.renderRunLength(room, render['passageSize'], render['wallThickness'], render['slabVoxels']).iterateSlabs(render['slabVoxels'])
+			else:
+				slabs = ((slab, maze.voxels.renderBox(room, (slab.start,) + (0,) * (len(shape) - 1), (slab.stop - slab.start,) + spaceSize[1:], render['passageSize'], render['wallThickness']))
+					for slab in maze.helpers.slabRanges(spaceSize, render['slabVoxels']))
+			renderTime += time.perf_counter() - renderStart
+			while True:
+				renderStart = time.perf_counter()
+				item = next(slabs, None)
+				renderTime += time.perf_counter() - renderStart
+				if item is None:
+					break
+				for slabQueue in slabQueues:
+					slabQueue.put(item)
+		finally:
+			for slabQueue in slabQueues:
+				slabQueue.put(None)
+	for thread in threads:
+		thread.join()
+	timings['render'] = renderTime
+	timings['render and export'] = time.perf_counter() - startTime
+	timings['total'] = sum(timings[stage] for stage in ('plan', 'room', 'caverns', 'carve', 'postProcess', 'render and export') if stage in timings)
+	if errors:
+		name, error = errors[0]
+		raise RuntimeError('{} failed: {}'.format(name, error)) from error
+
+	for stage, seconds in timings.items():
+		log('{:>24}: {:.3f} s'.format(stage, seconds))
+	return {'room': room, 'distance': distance, 'entrance': list(start), 'exit': exitCoordinates, 'report': report, 'plan': plan, 'timings': timings}
+
+
+def main(arguments=None):
+	"""
+	The command line interface: run the pipeline of a JSON configuration file.
+	"""
+	parser = argparse.ArgumentParser(description='Generate, render and export a maze as described by a JSON configuration file.')
+	parser.add_argument('configuration', help='the JSON configuration file')
+	parser.add_argument('--seed', type=int, help='override the seed of the configuration')
+	parser.add_argument('--quiet', action='store_true', help='do not print progress and timings')
+	options = parser.parse_args(arguments)
+	configuration = loadConfiguration(options.configuration)
+	if options.seed is not None:
+		configuration['seed'] = options.seed
+	runPipeline(configuration, None if options.quiet else print)
+
+
+if __name__ == '__main__':
+	main()
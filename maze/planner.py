@@ -0,0 +1,288 @@
+import maze.helpers
+import maze.runLength
+import numpy as np
+import os
+
+"""
+A memory planner for the maze pipeline (room, caverns, carve, post-process, render, export).
+The estimateStages() function estimates the memory that every stage keeps and the temporary memory it needs on top,
+from the shape of the room, the generator and the passage size. The planMemory() function tries the possible room
+backings and render modes from the simplest to the most frugal, picks the first one whose peak fits into the budget,
+and raises a MemoryError with the estimate before anything is allocated if none fits. The createRoom() function
+then allocates the room with the planned backing.
+
+Room backings:
+	dense: cells and walls are boolean arrays in memory
+	memmap: cells and walls live in memory-mapped files (helpers.memmapRoom); the operating system pages them in
+Render modes:
+	dense: the whole rendered volume as a boolean array (plotTools.renderWalls)
+	runLength: run-length encoded column patterns, rendered one slab at a time (runLength.renderRunLength)
+"""
+
+pipelineStages = ('room', 'caverns', 'carve', 'postProcess', 'render', 'export')
+roomBackings = ('dense', 'memmap')
+renderModes = ('dense', 'runLength')
+slabGenerators = ('binaryTree', 'sidewinder')
+
+
+def availableMemory():
+	"""
+	The memory that is available to new allocations, in bytes.
+	"""
+	try:
+		with open('/proc/meminfo') as f:
+			for line in f:
+				if line.startswith('MemAvailable:'):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+	return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def formatBytes(size):
+	"""
+	A human readable size.
+	"""
+	for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+		if abs(size) < 1024 or unit == 'TiB':
+			return '{:.1f} {}'.format(size, unit)
+		size /= 1024
+
+
+def estimateStages(shape, generator='passages', passageSize=1, wallThickness=1, backing='dense', render='dense', export=None, stackType=np.int64, measureDistance=True, slabCells=2**24, fillRatio=0, postProcess='validate'):
+	"""
+	Estimate the memory of every stage of the pipeline.
+
+	Parameters
+	----------
+	shape : tuple
+		The dimensions of the room.
+
+	generator : str, optional
+		The name of the generator, as in excavation.generators.
+
+	passageSize, wallThickness : int, optional
+		The render settings.
+
+	backing : str, optional
+		The room backing, 'dense' or 'memmap'.
+
+	render : str or None, optional
+		The render mode, 'dense', 'runLength' or None for no render.
+
+	export : str, list or None, optional
+		The type of an export (as in pipeline.slabExports and pipeline.roomExports), or a list of the types of all
+		exports, which run at the same time.
+
+	stackType : dtype, optional
+		The integer type of the stack size grid of carvePassages.
+
+	measureDistance : bool, optional
+		Whether the slab generators measure the distance grid.
+
+	slabCells : int, optional
+		The number of cells or voxels that the slab-based steps handle at once.
+
+	fillRatio : float, optional
+		The fraction of the room that is carved into caverns. Without caverns, the cavern stage needs nothing.
+
+	postProcess : str or None, optional
+		'validate' for validation.validateMaze, 'repair' for validation and validation.repairMaze, or None.
+
+	Returns
+	-------
+	dict
+		For every stage, a tuple of the bytes it keeps for the later stages and the temporary bytes it needs on top.
+	"""
+	cellCount = int(np.prod(shape))
+	dimCount = len(shape)
+	cellSize = passageSize + 2 * wallThickness
+	voxelCount = cellCount * cellSize**dimCount
+	stages = {}
+
+	if backing == 'dense':
+		stages['room'] = (cellCount * (1 + 2 * dimCount), 0)
+	else:
+		# Filling the files happens one slab at a time; the pages themselves can be evicted
+		stages['room'] = (0, min(slabCells, cellCount))
+	if fillRatio > 0:
+		# planCaverns keeps an occupancy grid, and a crowded room adds a summed-area table with its sums and a map of
+		# free positions per cavern shape
+		stages['caverns'] = (0, 14 * cellCount)
+	else:
+		stages['caverns'] = (0, 0)
+
+	if generator == 'passages':
+		# The distance grid, the shuffled restart order and, at worst, a stack entry (a tuple of ints) for every cell
+		stackEntry = 8 + 56 + 8 * dimCount + 32 * dimCount
+		stages['carve'] = (cellCount * np.dtype(stackType).itemsize, cellCount * (8 + stackEntry))
+	elif generator in slabGenerators:
+		slabTemporary = min(slabCells, cellCount) * 40
+		if measureDistance:
+			stages['carve'] = (8 * cellCount, max(slabTemporary, 8 * cellCount))
+		else:
+			stages['carve'] = (0, slabTemporary)
+	elif generator == 'kruskal':
+		# The union-find parents and flat cell indices, a batch of edges, then the distance measurement
+		stages['carve'] = (8 * cellCount, 16 * cellCount + 120 * min(2**20, cellCount * dimCount))
+	elif generator == 'divisions':
+		stages['carve'] = (8 * cellCount, 8 * cellCount + 40 * min(2**22, cellCount))
+	else:
+		# The frontier generator and anything unknown: a distance grid, a frontier of flat indices and the
+		# neighbor masks of the walkers
+		stages['carve'] = (8 * cellCount, 16 * cellCount)
+
+	# labelComponents keeps a label per cell and a root flag and counter for the relabelling, plus the open walls
+	# and union-find rounds of one slab (2**22 cells by default). Repairing labels the cells again and collects the
+	# closed walls between components, assuming these are a small part of the room
+	validationSlab = min(2**22, cellCount)
+	if postProcess == 'validate':
+		stages['postProcess'] = (0, 17 * cellCount + 50 * validationSlab)
+	elif postProcess == 'repair':
+		stages['postProcess'] = (0, 25 * cellCount + 90 * validationSlab)
+	else:
+		stages['postProcess'] = (0, 0)
+
+	# renderBox builds an int64 cell index per dimension and a few boolean masks for every voxel it renders
+	voxelTemporary = 8 * dimCount + 5
+	if render == 'dense':
+		stages['render'] = (voxelCount, voxelCount * voxelTemporary)
+	elif render == 'runLength':
+		# runLength.renderRunLength renders one voxel per cell and offset class, and stores each distinct column once
+		classCount = len(maze.runLength.offsetClasses(passageSize, wallThickness)[0])
+		reducedCount = cellCount * classCount**dimCount
+		reducedHeight = shape[-1] * classCount
+		columnCount = reducedCount // reducedHeight
+		runStartSize = np.dtype(maze.runLength.runStartType(reducedHeight)).itemsize
+		# At worst every column is distinct: a pattern number, a pointer, a first value and roughly two run starts
+		# per cell along the column
+		encoded = columnCount * (4 + 4 + 1 + runStartSize * (2 * shape[-1] + 1))
+		# Encoding a slab packs and sorts its columns, and the distinct columns are remembered by their packed bits
+		slabTemporary = min(slabCells, reducedCount) * (voxelTemporary + 2 + 32 // classCount)
+		patternKeys = columnCount * (100 + reducedHeight // 8)
+		stages['render'] = (encoded, max(slabTemporary, encoded + 16 * columnCount) + patternKeys)
+	else:
+		stages['render'] = (0, 0)
+
+	# All exports run at the same time, while the slabs are rendered
+	slabVoxels = min(slabCells, voxelCount)
+	exports = [export] if isinstance(export, str) else list(export or [])
+	exportTemporary = 0
+	for exportType in exports:
+		if exportType in ('mesh', 'png', 'minecraft'):
+			# The slabs waiting in the queue of this export (pipeline's default queueSlabs is 4) and the one it works on
+			exportTemporary += 5 * slabVoxels
+		if exportType == 'mesh':
+			# Decoded slab, padded copies, face masks and the rectangles of one slab
+			exportTemporary += slabVoxels * 40
+		elif exportType == 'png':
+			# The assembled volume is kept by the dense render; saveToPNG converts it to bytes, layer by layer in 3D
+			exportTemporary += 2 * (voxelCount if dimCount == 2 else voxelCount // (shape[-1] * cellSize))
+		elif exportType == 'minecraft':
+			# The world chunks that the maze covers
+			exportTemporary += voxelCount
+		elif exportType == 'pyramid':
+			# Every spawned worker loads NumPy and PIL and renders a column of 256 pixel tiles
+			workerCount = os.cpu_count() or 1
+			exportTemporary += workerCount * (2**25 + 256 * shape[-1] * cellSize * (voxelTemporary + 4))
+		elif exportType == 'storage':
+			exportTemporary += min(slabCells, cellCount) * (2 + dimCount)
+		elif exportType == 'schematic':
+			exportTemporary += slabVoxels * (voxelTemporary + 2)
+	# The slab that is rendered or decoded meanwhile
+	stages['export'] = (0, exportTemporary + (slabVoxels * voxelTemporary if exportTemporary > 0 else 0))
+	return stages
+
+
+def peakMemory(stages):
+	"""
+	The peak memory of a pipeline: the largest sum of the memory kept by the earlier stages and a stage's own needs.
+	"""
+	kept = 0
+	peak = 0
+	for stage in pipelineStages:
+		keeps, temporary = stages[stage]
+		peak = max(peak, kept + keeps + temporary)
+		kept += keeps
+	return peak
+
+
+def planMemory(shape, generator='passages', passageSize=1, wallThickness=1, render='dense', export=None, budget=None, directory=None, slabCells=2**24, fillRatio=0, postProcess='validate'):
+	"""
+	Choose the room backing, render mode and dtypes for a pipeline so that its peak memory fits into the budget.
+
+	Parameters
+	----------
+	shape : tuple
+		The dimensions of the room.
+
+	generator : str, optional
+		The name of the generator, as in excavation.generators.
+
+	passageSize, wallThickness : int, optional
+		The render settings.
+
+	render : str or None, optional
+		'dense' or 'runLength' to require a render mode, 'auto' to let the planner choose, or None for no render.
+
+	export : str, list or None, optional
+		The type of an export (as in pipeline.slabExports and pipeline.roomExports), or a list of the types of all
+		exports, which run at the same time.
+
+	budget : int, optional
+		The memory budget in bytes. By default the currently available memory.
+
+	directory : str, optional
+		A directory for memory-mapped room files. The memmap backing is only considered if it is given.
+
+	slabCells : int, optional
+		The number of cells or voxels that the slab-based steps handle at once.
+
+	fillRatio : float, optional
+		The fraction of the room that is carved into caverns. Without caverns, the cavern stage needs nothing.
+
+	postProcess : str or None, optional
+		'validate' for validation.validateMaze, 'repair' for validation and validation.repairMaze, or None.
+
+	Returns
+	-------
+	dict
+		The chosen backing, render mode, stackType and measureDistance setting, the estimate for every stage,
+		the peak and the budget.
+	"""
+	if budget is None:
+		budget = availableMemory()
+	# Stack sizes never exceed the number of cells
+	stackType = np.int32 if int(np.prod(shape)) < 2**31 else np.int64
+	backings = roomBackings if directory is not None else ('dense',)
+	modes = renderModes if render == 'auto' else (render,)
+	candidates = []
+	for backing in backings:
+		for mode in modes:
+			for measureDistance in ((True, False) if generator in slabGenerators else (True,)):
+				stages = estimateStages(shape, generator, passageSize, wallThickness, backing, mode, export, stackType, measureDistance, slabCells, fillRatio, postProcess)
+				plan = {
+					'backing': backing,
+					'render': mode,
+					'stackType': stackType,
+					'measureDistance': measureDistance,
+					'stages': stages,
+					'peak': peakMemory(stages),
+					'budget': budget,
+				}
+				if plan['peak'] <= budget:
+					return plan
+				candidates.append(plan)
+	best = min(candidates, key=lambda plan: plan['peak'])
+	details = ', '.join('{} {}'.format(stage, formatBytes(sum(best['stages'][stage]))) for stage in pipelineStages)
+	raise MemoryError('The pipeline needs at least {} ({} backing, {} render: {}), but the budget is {}.'.format(
+		formatBytes(best['peak']), best['backing'], best['render'], details, formatBytes(budget)))
+
+
+def createRoom(plan, shape, directory=None, slabCells=2**24):
+	"""
+	Allocate a completely filled room with the backing of a plan.
+	"""
+	if plan['backing'] == 'memmap':
+		return maze.helpers.memmapRoom(shape, directory, slabCells)
+	return maze.helpers.Room(shape)
@@ -1,6 +1,5 @@
-import matplotlib.pyplot as plt
+import maze.voxels
 import numpy as np
-from PIL import Image
 
 def plot2DMaze(m, stackSize, newWindow = True):
 	"""
@@ -11,6 +10,8 @@ def plot2DMaze(m, stackSize, newWindow = True):
 	stackSize: A matrix that represents the size of the stack in the maze.
 	newWindow (optional): A boolean value which when True creates a new window for the plot. Defaults to True.
 	"""
+	# The plotting and imaging libraries are loaded on first use, so rendering alone only needs numpy
+	import matplotlib.pyplot as plt
 	# Bring the stack into the same coordinate system as the maze and plot it
 	s = np.flipud(np.rot90(np.squeeze(stackSize)))
 	# Plot the maze walls
@@ -44,56 +45,11 @@ def renderWalls(m, passageSize, wallThickness):
 	passageSize: An integer value representing the size of the passage in the maze.
 	wallThickness: An integer value representing the thickness of the walls in the maze.
 	"""
-	gridSize = m.dimensions # for example, (51,51,10)
+	gridSize = m.shape # for example, (51,51,10)
 	cellSize = passageSize + wallThickness * 2
-	cornerBlocks = [[cellSize-wallThickness, cellSize], [0, wallThickness]]
 	spaceSize = [g * cellSize for g in gridSize]
-	space = np.zeros(spaceSize, dtype=bool)
-
-	# Prepare the 2^dim corner pillars
-	cornerSelectors = []
-	for corner in range(2**len(gridSize)):
-		if len(gridSize) <= 8: # for 8 dimensions or less
-			cornerID = np.uint8(corner)
-		else: # I doubt that everything else will survive more than 8 dimensions, but just to be safe
-			cornerID = np.uint128 # if you actually build a maze with more than 8 dimensions - WHY??? please mail me
-		bitArray = np.unpackbits(cornerID)
-		croppedBitArray = bitArray[-len(gridSize):]
-		cornerSelector = [slice((cellSize - 1) * c, (cellSize - 1) * c + 1, None) for c in croppedBitArray]
-		cornerSelectors.append(cornerSelector)
-
-	# Prepare the border walls
-	blockSelectors = []
-	for direction in range(len(m.walls)):
-		blockSelector = [slice(None)] * len(gridSize)
-		blockSide = direction % 2
-		cornerElements = cornerBlocks[blockSide]
-		dimension = direction // 2
-		blockSelector[dimension] = slice(cornerElements[0], cornerElements[1])
-		blockSelectors.append(blockSelector)
-
-	for gridIndex in range(np.prod(gridSize)):
-		gridCoordinates = np.unravel_index(gridIndex, gridSize)
-		wallCell = [m.walls[direction][gridCoordinates] for direction in range(len(m.walls))]
-		spaceCell = np.zeros([cellSize] * len(gridSize), dtype=bool)
-
-		# draw the border walls
-		for direction, wallSide in enumerate(wallCell):
-			if wallSide:
-				blockSelector = blockSelectors[direction]
-				spaceCell[blockSelector] = True
-
-		#draw the 2^dim corner pillars
-		for cornerSelector in cornerSelectors:
-			spaceCell[cornerSelector] = True
-
-		gridSelector = []
-		for dim in range(len(gridSize)):
-			stopCoordinate = (gridCoordinates[dim] + 1) * cellSize
-			startCoordinate = gridCoordinates[dim] * cellSize
-			gridSelector.append(slice(startCoordinate, stopCoordinate))
-		space[gridSelector] = spaceCell
-	return space
+	# Every voxel is evaluated straight from the walls of its cell, with corner pillars and border walls
+	return maze.voxels.renderBox(m, [0] * len(gridSize), spaceSize, passageSize, wallThickness)
 
 def saveToPNG(renderedMaze, outputPath):
 	"""
@@ -103,6 +59,7 @@ def saveToPNG(renderedMaze, outputPath):
 	renderedMaze: A matrix representing the rendered maze.
 	outputPath: A string representing the path to save the PNG file.
 	"""
+	from PIL import Image
 	imageFilename = '{}/maze-layer{:d}.png'
 	if len(renderedMaze.shape) == 2:
 		image = Image.fromarray(np.rot90(np.uint8(renderedMaze)*255))
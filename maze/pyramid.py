@@ -0,0 +1,150 @@
+import maze.helpers
+import maze.voxels
+import multiprocessing
+import numpy as np
+import os
+
+"""
+A deep-zoom tile pyramid for huge 2D mazes, in the z/x/y layout of web map viewers.
+The deepest zoom level shows one voxel per pixel. Its tiles are rendered straight from the walls of the room with
+voxels.renderBox(), one column of tiles per task, and every task only receives the slab of cells that its column
+covers. Every coarser level pools 2 x 2 pixels of the four tiles below it. Walls are white and passages black,
+oriented like saveToPNG() (the first dimension runs left to right, the second from the bottom to the top).
+The tiles of every level are produced in a pool of spawned processes and written to <directory>/<z>/<x>/<y>.png.
+"""
+
+
+def maximumZoom(spaceSize, tileSize):
+	"""
+	The zoom level at which one pixel is one voxel, for a rendered maze of the given size.
+	"""
+	tiles = -(-max(spaceSize) // tileSize)
+	return int(np.ceil(np.log2(tiles))) if tiles > 1 else 0
+
+
+def tileCounts(spaceSize, zoom, deepestZoom, tileSize):
+	"""
+	The number of tiles along x and y that cover the rendered maze at a zoom level.
+	"""
+	voxelsPerTile = tileSize * 2**(deepestZoom - zoom)
+	return tuple(-(-size // voxelsPerTile) for size in spaceSize)
+
+
+def tilePath(directory, zoom, x, y):
+	"""
+	The file name of a tile.
+	"""
+	return os.path.join(directory, str(zoom), str(x), '{:d}.png'.format(y))
+
+
+def renderTileColumn(task):
+	"""
+	Render and save one column of tiles at the deepest zoom level. This function runs inside the worker processes.
+
+	Parameters
+	----------
+	task : tuple
+		The tile directory, zoom level, tile column, number of tile rows, tile size, the first cell of the slab,
+		the slab of the room, the height of the rendered maze in voxels, the passage size and the wall thickness.
+
+	Returns
+	-------
+	int
+		The number of tiles written.
+	"""
+	from PIL import Image
+	directory, zoom, x, rowCount, tileSize, firstCell, slab, spaceHeight, passageSize, wallThickness = task
+	cellSize = passageSize + 2 * wallThickness
+	os.makedirs(os.path.join(directory, str(zoom), str(x)), exist_ok=True)
+	for y in range(rowCount):
+		# Image rows run from the top, which is the end of the second dimension
+		position = (x * tileSize - firstCell * cellSize, spaceHeight - (y + 1) * tileSize)
+		voxels = maze.voxels.renderBox(slab, position, (tileSize, tileSize), passageSize, wallThickness)
+		# The deepest tiles only hold walls and passages, so they are stored with one bit per pixel
+		Image.fromarray(np.ascontiguousarray(np.rot90(voxels))).save(tilePath(directory, zoom, x, y))
+	return rowCount
+
+
+def poolTileColumn(task):
+	"""
+	Build and save one column of tiles from the tiles of the next zoom level. This function runs inside the worker
+	processes.
+
+	Parameters
+	----------
+	task : tuple
+		The tile directory, zoom level, tile column, number of tile rows and tile size.
+
+	Returns
+	-------
+	int
+		The number of tiles written.
+	"""
+	from PIL import Image
+	directory, zoom, x, rowCount, tileSize = task
+	os.makedirs(os.path.join(directory, str(zoom), str(x)), exist_ok=True)
+	for y in range(rowCount):
+		pixels = np.zeros((2 * tileSize, 2 * tileSize), dtype=np.uint16)
+		for dx in range(2):
+			for dy in range(2):
+				child = tilePath(directory, zoom + 1, 2 * x + dx, 2 * y + dy)
+				if os.path.exists(child):
+					pixels[dy * tileSize:(dy + 1) * tileSize, dx * tileSize:(dx + 1) * tileSize] = np.asarray(Image.open(child).convert('L'))
+		pooled = pixels.reshape(tileSize, 2, tileSize, 2).sum(axis=(1, 3)) // 4
+		Image.fromarray(pooled.astype(np.uint8)).save(tilePath(directory, zoom, x, y))
+	return rowCount
+
+
+def renderTilePyramid(room, directory, passageSize, wallThickness, tileSize=256, processes=None):
+	"""
+	Render a 2D maze into a deep-zoom tile pyramid.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished 2D maze.
+
+	directory : str
+		The directory for the tiles.
+
+	passageSize : int
+		The size of the passage in voxels (pixels at the deepest zoom level).
+
+	wallThickness : int
+		The thickness of the walls in voxels.
+
+	tileSize : int, optional
+		The width and height of a tile in pixels.
+
+	processes : int, optional
+		The number of worker processes. By default every core is used.
+
+	Returns
+	-------
+	int
+		The deepest zoom level.
+	"""
+	cellSize = passageSize + 2 * wallThickness
+	spaceSize = tuple(g * cellSize for g in room.shape)
+	deepestZoom = maximumZoom(spaceSize, tileSize)
+	columnCount, rowCount = tileCounts(spaceSize, deepestZoom, deepestZoom, tileSize)
+
+	def renderTasks():
+		for x in range(columnCount):
+			# Only the cells under this column of tiles travel to the worker
+			firstCell = x * tileSize // cellSize
+			lastCell = min(-(-(x + 1) * tileSize // cellSize), room.shape[0])
+			slab = maze.helpers.Room((lastCell - firstCell,) + tuple(room.shape[1:]), cells=np.asarray(room.cells[firstCell:lastCell]), walls=[np.asarray(w[firstCell:lastCell]) for w in room.walls])
+			yield directory, deepestZoom, x, rowCount, tileSize, firstCell, slab, spaceSize[1], passageSize, wallThickness
+
+	# Forked workers would inherit locks that other threads hold at that moment (like the import lock while another
+	# export imports PIL), so the workers are started fresh
+	with multiprocessing.get_context('spawn').Pool(processes) as pool:
+		for _ in pool.imap_unordered(renderTileColumn, renderTasks()):
+			pass
+		for zoom in range(deepestZoom - 1, -1, -1):
+			columnCount, rowCount = tileCounts(spaceSize, zoom, deepestZoom, tileSize)
+			tasks = [(directory, zoom, x, rowCount, tileSize) for x in range(columnCount)]
+			for _ in pool.imap_unordered(poolTileColumn, tasks):
+				pass
+	return deepestZoom
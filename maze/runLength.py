@@ -0,0 +1,293 @@
+import maze.helpers
+import maze.voxels
+import numpy as np
+
+"""
+A run-length encoded column format for rendered mazes.
+Rendered mazes are mostly long runs of identical voxels, so every column along the last dimension (the height, for
+Minecraft-style (x, z, y) renders) is stored as a list of runs. Consecutive runs of a column alternate between empty
+and filled, so only the start of every run and the value of the first run of every column are kept.
+A voxel only depends on its cell and on which part of the cell it lies in: the corner pillar voxel at either end, the
+rest of a wall, or the passage. The format therefore works on offset classes instead of voxels: every cell is split
+into at most five classes per dimension, runs start at class boundaries, and all voxel columns in the same classes
+are equal. The distinct columns of the reduced volume (one column per class) are stored once as patterns, and every
+reduced column only keeps the number of its pattern.
+The renderRunLength() function renders a room straight into this format, one slab at a time, so the dense volume
+is never materialized. The class RunLengthVolume decodes columns into dense slabs or Minecraft chunk sections.
+"""
+
+
+def offsetClasses(passageSize, wallThickness):
+	"""
+	Split the voxel offsets within a cell into the classes that render alike (see voxels.evaluateVoxels).
+
+	Returns
+	-------
+	tuple
+		The first offset and the size of every class, in order.
+	"""
+	cellSize = passageSize + 2 * wallThickness
+	boundaries = np.unique(np.clip([0, 1, wallThickness, cellSize - wallThickness, cellSize - 1, cellSize], 0, cellSize))
+	return boundaries[:-1], np.diff(boundaries)
+
+
+def encodeColumns(dense):
+	"""
+	Run-length encode every column of a dense array along its last dimension.
+
+	Parameters
+	----------
+	dense : ndarray
+		A boolean array.
+
+	Returns
+	-------
+	tuple
+		The number of runs per column, the start position of every run (in column order) and the value of the first
+		run of every column.
+	"""
+	columns = dense.reshape(-1, dense.shape[-1])
+	isRunStart = np.ones(columns.shape, dtype=bool)
+	isRunStart[:, 1:] = columns[:, 1:] != columns[:, :-1]
+	runCounts = np.count_nonzero(isRunStart, axis=1)
+	runStarts = np.nonzero(isRunStart)[1].astype(runStartType(dense.shape[-1]))
+	return runCounts, runStarts, columns[:, 0].copy()
+
+
+def runStartType(height):
+	"""
+	The smallest integer type that holds every run start of a column with the given height.
+	"""
+	if height <= 2**8:
+		return np.uint8
+	return np.uint16 if height <= 2**16 else np.int32
+
+
+class RunLengthVolume:
+	"""
+	A boolean volume stored as run-length encoded column patterns along its last dimension.
+	Every voxel offset within a cell belongs to one of the classes given by classStarts (see offsetClasses), and the
+	reduced volume has one voxel per cell and class. columnPatterns holds the pattern number of every reduced column;
+	patternPointers[p] is the index of the first run of pattern p and firstValues[p] is the value of that run. Run
+	starts are positions along the last dimension of the reduced volume.
+	"""
+	def __init__(self, shape, cellSize, classStarts, columnPatterns, patternPointers, runStarts, firstValues):
+		self.shape = tuple(int(s) for s in shape)
+		self.cellSize = int(cellSize)
+		self.classStarts = np.asarray(classStarts, dtype=np.int64)
+		self.columnPatterns = columnPatterns
+		self.patternPointers = patternPointers
+		self.runStarts = runStarts
+		self.firstValues = firstValues
+		# The class of every offset within a cell
+		self.offsetClass = np.searchsorted(self.classStarts, np.arange(self.cellSize), side='right') - 1
+
+	def __repr__(self):
+		return 'Run-length volume with dimensions {} ({:d} patterns, {:d} runs)'.format(self.shape, self.firstValues.size, self.runStarts.size)
+
+	@property
+	def nbytes(self):
+		"""
+		The memory taken by the encoded volume, in bytes.
+		"""
+		return self.columnPatterns.nbytes + self.patternPointers.nbytes + self.runStarts.nbytes + self.firstValues.nbytes
+
+	def decodePatterns(self, patterns):
+		"""
+		Decode a set of column patterns into voxel columns.
+
+		Parameters
+		----------
+		patterns : ndarray
+			The pattern numbers.
+
+		Returns
+		-------
+		ndarray
+			An array with one decoded column per row.
+		"""
+		patterns = np.asarray(patterns, dtype=np.int64).ravel()
+		firstRuns = self.patternPointers[patterns].astype(np.int64)
+		runCounts = self.patternPointers[patterns + 1] - firstRuns
+		# Gather the runs of all requested patterns, in order
+		owners = np.repeat(np.arange(patterns.size), runCounts)
+		runOffsets = np.arange(owners.size) - np.repeat(np.cumsum(runCounts) - runCounts, runCounts)
+		runs = firstRuns[owners] + runOffsets
+		values = self.firstValues[patterns][owners] ^ (runOffsets & 1).astype(bool)
+		# Run starts are class boundaries of the reduced volume; translate them to voxels
+		reducedStarts = self.runStarts[runs].astype(np.int64)
+		starts = reducedStarts // self.classStarts.size * self.cellSize + self.classStarts[reducedStarts % self.classStarts.size]
+		ends = np.empty_like(starts)
+		ends[:-1] = starts[1:]
+		# The last run of every column ends at the top of the column
+		ends[np.cumsum(runCounts) - 1] = self.shape[-1]
+		return np.repeat(values, ends - starts).reshape(patterns.size, self.shape[-1])
+
+	def decodeColumns(self, columns):
+		"""
+		Decode a set of columns.
+
+		Parameters
+		----------
+		columns : ndarray
+			The column numbers, in C order over all but the last dimension.
+
+		Returns
+		-------
+		ndarray
+			An array with one decoded column per row.
+		"""
+		columns = np.asarray(columns, dtype=np.int64).ravel()
+		# Find the reduced column of every voxel column
+		reducedIndex = tuple(c // self.cellSize * self.classStarts.size + self.offsetClass[c % self.cellSize] for c in np.unravel_index(columns, self.shape[:-1]))
+		patterns, inverse = np.unique(self.columnPatterns[reducedIndex], return_inverse=True)
+		# Every distinct pattern is decoded once
+		return self.decodePatterns(patterns)[inverse.ravel()]
+
+	def toDense(self, start=0, stop=None):
+		"""
+		Decode a slab of the volume along the first dimension.
+
+		Parameters
+		----------
+		start, stop : int, optional
+			The range along the first dimension. By default the whole volume is decoded.
+
+		Returns
+		-------
+		ndarray
+			The dense slab.
+		"""
+		if stop is None:
+			stop = self.shape[0]
+		columnsPerLayer = int(np.prod(self.shape[1:-1]))
+		columns = np.arange(start * columnsPerLayer, stop * columnsPerLayer)
+		return self.decodeColumns(columns).reshape((stop - start,) + self.shape[1:])
+
+	def iterateSlabs(self, slabVoxels=2**24):
+		"""
+		Decode the volume slab by slab along the first dimension.
+
+		Parameters
+		----------
+		slabVoxels : int, optional
+			The preferred number of voxels per slab.
+
+		Yields
+		------
+		tuple
+			The range of the slab along the first dimension, and the dense slab.
+		"""
+		for slab in maze.helpers.slabRanges(self.shape, slabVoxels):
+			yield slab, self.toDense(slab.start, slab.stop)
+
+	def minecraftChunk(self, chunkX, chunkZ):
+		"""
+		Decode the 16 x 16 block columns of one Minecraft chunk, for a 3D volume with (x, z, y) dimensions.
+		Blocks outside of the volume are False.
+
+		Parameters
+		----------
+		chunkX, chunkZ : int
+			The chunk coordinates, relative to the first voxel of the volume.
+
+		Returns
+		-------
+		ndarray
+			A boolean array with the shape (16, 16, height).
+		"""
+		chunk = np.zeros((16, 16, self.shape[2]), dtype=bool)
+		xRange = np.arange(chunkX * 16, chunkX * 16 + 16)
+		zRange = np.arange(chunkZ * 16, chunkZ * 16 + 16)
+		xInside = (xRange >= 0) & (xRange < self.shape[0])
+		zInside = (zRange >= 0) & (zRange < self.shape[1])
+		if xInside.any() and zInside.any():
+			columns = xRange[xInside][:, None] * self.shape[1] + zRange[zInside][None, :]
+			decoded = self.decodeColumns(columns)
+			chunk[np.ix_(xInside, zInside)] = decoded.reshape(np.count_nonzero(xInside), np.count_nonzero(zInside), self.shape[2])
+		return chunk
+
+	def chunkSection(self, chunkX, chunkZ, sectionY):
+		"""
+		Decode one 16 x 16 x 16 Minecraft chunk section, for a 3D volume with (x, z, y) dimensions.
+
+		Parameters
+		----------
+		chunkX, chunkZ : int
+			The chunk coordinates, relative to the first voxel of the volume.
+
+		sectionY : int
+			The section index along the height, relative to the first voxel of the volume.
+
+		Returns
+		-------
+		ndarray
+			A boolean array with the shape (16, 16, 16); blocks outside of the volume are False.
+		"""
+		section = np.zeros((16, 16, 16), dtype=bool)
+		column = self.minecraftChunk(chunkX, chunkZ)[:, :, sectionY * 16:sectionY * 16 + 16]
+		section[:, :, :column.shape[2]] = column
+		return section
+
+
+def renderRunLength(room, passageSize, wallThickness, slabVoxels=2**24):
+	"""
+	Render a maze like plotTools.renderWalls, but straight into run-length encoded column patterns.
+	Only the reduced volume with one voxel per cell and offset class is rendered, one slab at a time.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	passageSize : int
+		The size of the passage in voxels.
+
+	wallThickness : int
+		The thickness of the walls in voxels.
+
+	slabVoxels : int, optional
+		The preferred number of reduced voxels that are rendered at once.
+
+	Returns
+	-------
+	RunLengthVolume
+		The rendered maze.
+	"""
+	cellSize = passageSize + 2 * wallThickness
+	spaceSize = tuple(g * cellSize for g in room.shape)
+	classStarts, _ = offsetClasses(passageSize, wallThickness)
+	# The voxel coordinate of the first voxel of every cell and class, per dimension
+	coordinates = [(np.arange(g, dtype=np.int64)[:, None] * cellSize + classStarts).ravel() for g in room.shape]
+	reducedSize = tuple(c.size for c in coordinates)
+	patternNumbers = dict()
+	columnPatterns, runCounts, runStarts, firstValues = [], [], [], []
+	for slab in maze.helpers.slabRanges(reducedSize, slabVoxels):
+		openGrid = [coordinates[0][slab].reshape((-1,) + (1,) * (len(reducedSize) - 1))]
+		for dim in range(1, len(reducedSize)):
+			broadcastShape = [1] * len(reducedSize)
+			broadcastShape[dim] = reducedSize[dim]
+			openGrid.append(coordinates[dim].reshape(broadcastShape))
+		columns = np.array(maze.voxels.evaluateVoxels(room, openGrid, passageSize, wallThickness)).reshape(-1, reducedSize[-1])
+		distinct, firstColumns, inverse = np.unique(np.packbits(columns, axis=1), axis=0, return_index=True, return_inverse=True)
+		numbers = np.empty(len(distinct), dtype=np.int64)
+		newColumns = []
+		for i, packed in enumerate(distinct):
+			key = packed.tobytes()
+			if key not in patternNumbers:
+				patternNumbers[key] = len(patternNumbers)
+				newColumns.append(firstColumns[i])
+			numbers[i] = patternNumbers[key]
+		columnPatterns.append(numbers[inverse.ravel()])
+		if newColumns:
+			counts, starts, values = encodeColumns(columns[newColumns])
+			runCounts.append(counts)
+			runStarts.append(starts)
+			firstValues.append(values)
+	patternType = np.uint16 if len(patternNumbers) <= 2**16 else np.uint32
+	columnPatterns = np.concatenate(columnPatterns).astype(patternType).reshape(reducedSize[:-1])
+	runCounts = np.concatenate(runCounts)
+	pointerType = np.int32 if runCounts.sum() < 2**31 else np.int64
+	patternPointers = np.zeros(runCounts.size + 1, dtype=pointerType)
+	np.cumsum(runCounts, out=patternPointers[1:])
+	return RunLengthVolume(spaceSize, cellSize, classStarts, columnPatterns, patternPointers, np.concatenate(runStarts), np.concatenate(firstValues))
@@ -0,0 +1,114 @@
+import gzip
+import maze.helpers
+import maze.voxels
+import numpy as np
+import struct
+
+"""
+Streaming export of 3D mazes to MCEdit/WorldEdit .schematic files, for servers that do not accept direct world edits.
+A schematic is a gzip-compressed NBT compound whose Blocks and Data byte arrays hold one byte per block in (y, z, x)
+order. Because the array lengths only depend on the shape, the whole NBT header can be written up front. The maze is
+then rendered straight from the room in slabs along the height (y) and written into the gzip stream slab by slab,
+so only one slab is ever in memory, however large the schematic is.
+The axes follow maze.minecraft: the three dimensions of the rendered maze are x, z and y (the height).
+"""
+
+tagEnd, tagShort, tagByteArray, tagString, tagList, tagCompound = 0, 2, 7, 8, 9, 10
+
+
+def tagHeader(tagType, name):
+	"""
+	The type and name of a named NBT tag.
+	"""
+	encodedName = name.encode('utf-8')
+	return struct.pack('>bH', tagType, len(encodedName)) + encodedName
+
+
+def schematicHeader(shape, materials='Alpha'):
+	"""
+	Everything in a schematic file before the content of the Blocks array.
+
+	Parameters
+	----------
+	shape : tuple
+		The (width, length, height) of the schematic, i.e. its x, z and y sizes in blocks.
+
+	materials : str, optional
+		The block ID set of the schematic.
+
+	Returns
+	-------
+	bytes
+		The uncompressed NBT bytes.
+	"""
+	width, length, height = shape
+	encodedMaterials = materials.encode('utf-8')
+	return b''.join([
+		tagHeader(tagCompound, 'Schematic'),
+		tagHeader(tagShort, 'Height'), struct.pack('>h', height),
+		tagHeader(tagShort, 'Length'), struct.pack('>h', length),
+		tagHeader(tagShort, 'Width'), struct.pack('>h', width),
+		tagHeader(tagString, 'Materials'), struct.pack('>H', len(encodedMaterials)), encodedMaterials,
+		tagHeader(tagList, 'Entities'), struct.pack('>bi', tagCompound, 0),
+		tagHeader(tagList, 'TileEntities'), struct.pack('>bi', tagCompound, 0),
+		tagHeader(tagByteArray, 'Blocks'), struct.pack('>i', width * length * height),
+	])
+
+
+def exportSchematic(path, room, passageSize, wallThickness, wallBlock=42, airBlock=0, slabVoxels=2**24, compressLevel=6):
+	"""
+	Render a 3D maze into a .schematic file, one slab at a time.
+
+	Parameters
+	----------
+	path : str
+		The schematic file.
+
+	room : object
+		The room with the finished 3D maze.
+
+	passageSize, wallThickness : int
+		The rendering parameters, as in plotTools.renderWalls.
+
+	wallBlock, airBlock : int, optional
+		The block IDs of the walls and passages. By default block of iron and air, as in maze.minecraft.
+
+	slabVoxels : int, optional
+		The number of voxels that are rendered at once.
+
+	compressLevel : int, optional
+		The gzip compression level.
+
+	Returns
+	-------
+	tuple
+		The (width, length, height) of the schematic.
+
+	Raises
+	------
+	ValueError
+		If the maze is not 3D or too large for the format, whose sizes are 16-bit and whose arrays are limited to
+		2**31 - 1 bytes.
+	"""
+	if len(room.shape) != 3:
+		raise ValueError('Schematics need a 3D maze, but this one has {:d} dimensions.'.format(len(room.shape)))
+	cellSize = passageSize + 2 * wallThickness
+	shape = tuple(s * cellSize for s in room.shape)
+	blockCount = int(np.prod(shape))
+	if max(shape) > 32767 or blockCount > 2**31 - 1:
+		raise ValueError('The rendered maze ({}) is too large for a schematic.'.format(' x '.join(str(s) for s in shape)))
+	blockTypes = np.array([airBlock, wallBlock], dtype=np.uint8)
+	width, length, height = shape
+	with gzip.open(path, 'wb', compresslevel=compressLevel) as f:
+		f.write(schematicHeader(shape))
+		# The Blocks array is ordered (y, z, x), so slabs along the height can be appended one after the other
+		for slab in maze.helpers.slabRanges((height, length, width), slabVoxels):
+			voxels = maze.voxels.renderBox(room, (0, 0, slab.start), (width, length, slab.stop - slab.start), passageSize, wallThickness)
+			f.write(blockTypes[voxels.T.view(np.uint8)].tobytes())
+		# The Data array (block variants) is all zeros
+		f.write(tagHeader(tagByteArray, 'Data') + struct.pack('>i', blockCount))
+		zeros = bytes(min(blockCount, max(slabVoxels, 1)))
+		for start in range(0, blockCount, len(zeros)):
+			f.write(zeros[:blockCount - start])
+		f.write(struct.pack('>b', tagEnd))
+	return shape
@@ -0,0 +1,312 @@
+import argparse
+import collections
+import json
+import maze.excavation
+import maze.helpers
+import maze.storage
+import multiprocessing
+import numpy as np
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+"""
+A local maze generation service: a long-lived pool of pre-warmed worker processes behind a small socket API.
+Workers return every maze bit-packed with storage.packMaze(), which is the only thing that crosses process and
+socket boundaries. For the most recently requested parameter sets without a seed, the service keeps a few mazes
+generated in advance, so a burst of requests is answered from the cache while the pool refills it in the background.
+The cache holds a bounded number of parameter sets (least recently used ones are dropped), and the number of mazes
+that are generated in advance is bounded too, so varying requests cannot grow the memory or the worker load.
+
+Protocol (little endian): the client sends the byte length of a JSON request (uint32) and the request itself. The
+service answers with a status byte (0 for success), the byte length of the payload (uint64) and the payload, which
+is the packed maze or a UTF-8 error message.
+Requests hold the generator (a key of excavation.generators), shape, flatness, startPosition, exitWallSide, seed,
+fillRatio, typicalCavernDiameter and sizeDeviation; everything but shape is optional.
+"""
+
+requestDefaults = {
+	'generator': 'kruskal',
+	'flatness': None,
+	'startPosition': None,
+	'exitWallSide': -1,
+	'seed': None,
+	'fillRatio': 0,
+	'typicalCavernDiameter': 5,
+	'sizeDeviation': 1,
+	'distance': False,
+}
+
+
+def completeRequest(request):
+	"""
+	Fill in the defaults of a request and check it.
+	"""
+	if 'shape' not in request:
+		raise ValueError('A request needs a shape.')
+	complete = dict(requestDefaults)
+	complete.update(request)
+	dimCount = len(complete['shape'])
+	if complete['flatness'] is None:
+		complete['flatness'] = [0] * dimCount
+	if complete['startPosition'] is None:
+		complete['startPosition'] = [0] * dimCount
+	if complete['generator'] not in maze.excavation.generators:
+		raise ValueError('Unknown generator {}.'.format(complete['generator']))
+	return complete
+
+
+def requestKey(request):
+	"""
+	The cache key of a request: everything but the seed.
+	"""
+	return json.dumps({k: v for k, v in request.items() if k != 'seed'}, sort_keys=True)
+
+
+def generateMaze(request):
+	"""
+	Generate one maze and pack it. This function runs inside the worker processes.
+
+	Parameters
+	----------
+	request : dict
+		A complete request (see completeRequest). Without a seed, a random seed is drawn and stored in the maze.
+
+	Returns
+	-------
+	bytes
+		The packed maze.
+	"""
+	seed = request['seed'] if request['seed'] is not None else random.SystemRandom().randrange(2**31)
+	random.seed(seed)
+	np.random.seed(seed)
+	room = maze.helpers.Room(tuple(request['shape']))
+	if request['fillRatio'] > 0:
+		maze.excavation.carveCaverns(room, request['fillRatio'], request['typicalCavernDiameter'], request['sizeDeviation'])
+	start = tuple(request['startPosition'])
+	generator = maze.excavation.generators[request['generator']]
+	room, distance, exitCoordinates = generator(room, start, request['flatness'], exitWallSide=request['exitWallSide'])
+	return maze.storage.packMaze(room, start, exitCoordinates, distance if request['distance'] else None, seed)
+
+
+def warmWorker():
+	"""
+	Load everything a worker needs and run every generator once, so the first real request is not slower.
+	"""
+	for name in maze.excavation.generators:
+		generateMaze(completeRequest({'generator': name, 'shape': [4, 4]}))
+
+
+class MazeService:
+	"""
+	A pool of pre-warmed generator processes with a cache of mazes generated in advance for common requests.
+	"""
+	def __init__(self, processes=None, cacheSize=4, warmRequests=(), cacheKeys=16):
+		"""
+		Parameters
+		----------
+		processes : int, optional
+			The number of worker processes. By default every core is used.
+
+		cacheSize : int, optional
+			The number of mazes that are kept ready for every cached request without a seed.
+
+		warmRequests : list, optional
+			Requests whose cache is filled right away, before they are asked for.
+
+		cacheKeys : int, optional
+			The number of different requests that are cached. At most cacheKeys * cacheSize mazes are generated in
+			advance at any time.
+		"""
+		self.pool = multiprocessing.Pool(processes, initializer=warmWorker)
+		self.cacheSize = cacheSize
+		self.cacheKeys = max(cacheKeys, 1)
+		self.cache = collections.OrderedDict()
+		self.inAdvance = 0
+		self.lock = threading.Lock()
+		self.server = None
+		for request in warmRequests:
+			request = completeRequest(request)
+			with self.lock:
+				self.refill(requestKey(request), request)
+
+	def finishedInAdvance(self, result):
+		"""
+		Count a maze that was generated in advance as finished. Called by the pool, also after errors.
+		"""
+		with self.lock:
+			self.inAdvance -= 1
+
+	def refill(self, key, request):
+		"""
+		Mark a request as the most recently used, drop the least recently used ones beyond cacheKeys, and top up its
+		cache as far as the bound on mazes generated in advance allows. The caller holds the lock.
+		"""
+		pending = self.cache.setdefault(key, collections.deque())
+		self.cache.move_to_end(key)
+		while len(self.cache) > self.cacheKeys:
+			# Pending results of dropped requests are simply forgotten; their workers finish and the result is freed
+			self.cache.popitem(last=False)
+		while len(pending) < self.cacheSize and self.inAdvance < self.cacheKeys * self.cacheSize:
+			self.inAdvance += 1
+			pending.append(self.pool.apply_async(generateMaze, (request,), callback=self.finishedInAdvance, error_callback=self.finishedInAdvance))
+
+	def generate(self, request):
+		"""
+		Generate a maze, or take it from the cache if the request has no seed.
+
+		Parameters
+		----------
+		request : dict
+			The request; missing settings are taken from requestDefaults.
+
+		Returns
+		-------
+		bytes
+			The packed maze.
+		"""
+		request = completeRequest(request)
+		if request['seed'] is not None or self.cacheSize == 0:
+			return self.pool.apply(generateMaze, (request,))
+		key = requestKey(request)
+		with self.lock:
+			pending = self.cache.get(key)
+			result = pending.popleft() if pending else self.pool.apply_async(generateMaze, (request,))
+			self.refill(key, request)
+		return result.get()
+
+	def serve(self, address=('127.0.0.1', 0)):
+		"""
+		Answer requests on a TCP socket in a background thread, one thread per connection.
+
+		Returns
+		-------
+		tuple
+			The address the service listens on.
+		"""
+		service = self
+
+		class RequestHandler(socketserver.StreamRequestHandler):
+			def handle(self):
+				while True:
+					header = self.rfile.read(4)
+					if len(header) < 4:
+						return
+					data = self.rfile.read(struct.unpack('<I', header)[0])
+					try:
+						request = json.loads(data)
+						if not isinstance(request, dict):
+							raise ValueError('A request must be a JSON object.')
+						status, payload = 0, service.generate(request)
+					except Exception as error:
+						status, payload = 1, str(error).encode()
+					self.wfile.write(struct.pack('<BQ', status, len(payload)) + payload)
+
+		socketserver.ThreadingTCPServer.allow_reuse_address = True
+		self.server = socketserver.ThreadingTCPServer(address, RequestHandler)
+		self.server.daemon_threads = True
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		return self.server.server_address
+
+	def close(self):
+		"""
+		Stop the socket server and the worker processes.
+		"""
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+		self.pool.terminate()
+		self.pool.join()
+
+
+class MazeClient:
+	"""
+	A client for a maze service socket. One client holds one connection; use one client per thread.
+	"""
+	def __init__(self, address):
+		self.connection = socket.create_connection(address)
+		self.stream = self.connection.makefile('rb')
+
+	def generateBytes(self, **request):
+		"""
+		Request a maze and return it packed.
+		"""
+		payload = json.dumps(request).encode()
+		self.connection.sendall(struct.pack('<I', len(payload)) + payload)
+		status, length = struct.unpack('<BQ', self.stream.read(9))
+		data = self.stream.read(length)
+		if status != 0:
+			raise RuntimeError(data.decode())
+		return data
+
+	def generate(self, **request):
+		"""
+		Request a maze.
+
+		Returns
+		-------
+		tuple
+			The room, the distance grid (or None), the entrance and the exit.
+		"""
+		return maze.storage.unpackMaze(self.generateBytes(**request))
+
+	def close(self):
+		self.stream.close()
+		self.connection.close()
+
+
+def measureLatencies(address, request, requestCount=100, concurrency=8):
+	"""
+	Send a burst of identical requests from several client threads and measure the latency of every request.
+
+	Returns
+	-------
+	ndarray
+		The sorted latencies in seconds.
+	"""
+	latencies = []
+	lock = threading.Lock()
+
+	def sendRequests(count):
+		client = MazeClient(address)
+		for _ in range(count):
+			startTime = time.perf_counter()
+			client.generateBytes(**request)
+			with lock:
+				latencies.append(time.perf_counter() - startTime)
+		client.close()
+
+	threads = [threading.Thread(target=sendRequests, args=(requestCount // concurrency + (i < requestCount % concurrency),)) for i in range(concurrency)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return np.sort(latencies)
+
+
+def main(arguments=None):
+	"""
+	The command line interface: run a maze service until it is interrupted.
+	"""
+	parser = argparse.ArgumentParser(description='Serve mazes from a pool of pre-warmed worker processes.')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--processes', type=int, help='the number of worker processes (default: every core)')
+	parser.add_argument('--cache', type=int, default=4, help='the number of mazes kept ready per request')
+	parser.add_argument('--cache-keys', type=int, default=16, help='the number of different requests that are cached')
+	parser.add_argument('--warm', action='append', default=[], help='a JSON request whose cache is filled at startup')
+	options = parser.parse_args(arguments)
+	service = MazeService(options.processes, options.cache, [json.loads(request) for request in options.warm], options.cache_keys)
+	print('Serving mazes on {}:{:d}'.format(*service.serve((options.host, options.port))))
+	try:
+		while True:
+			time.sleep(3600)
+	except KeyboardInterrupt:
+		service.close()
+
+
+if __name__ == '__main__':
+	main()
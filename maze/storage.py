@@ -0,0 +1,400 @@
+import maze.helpers
+import numpy as np
+import struct
+
+"""
+A compact binary file format for finished mazes, laid out so that it can be opened with np.memmap and queried
+without loading it.
+
+Layout (little endian, every section starts at a multiple of 64 bytes):
+	header: magic 'HYPERMAZ', format version (uint16), number of dimensions n (uint16), exit wall side (int16),
+		bytes per distance entry (uint8, 0 if there is no distance grid), padding (1 byte), seed (int64),
+		shape (n x int64), entrance (n x int64), exit (n x int64)
+	cells: one bit per cell (C order, least significant bit first), 1 for filled cells
+	walls: one bit plane per dimension d, holding room.walls[2 * d]. The backward walls are the forward walls of
+		the previous cell; on the outside of the room they are closed, except at the exit.
+	distance: optional, one signed integer per cell (C order)
+
+The saveMaze() function writes a room slab by slab, openMaze() maps a file into a MazeFile without reading it,
+and loadMaze() unpacks a file into a Room again.
+"""
+
+magic = b'HYPERMAZ'
+formatVersion = 1
+prefixFormat = '<8sHHhBxq'
+sectionAlignment = 64
+
+
+def alignOffset(offset):
+	"""
+	Round a byte offset up to the start of the next section.
+	"""
+	return (offset + sectionAlignment - 1) // sectionAlignment * sectionAlignment
+
+
+def readBits(plane, start, stop):
+	"""
+	Unpack a range of bits from a bit-packed plane.
+
+	Parameters
+	----------
+	plane : ndarray
+		The packed uint8 plane.
+
+	start, stop : int
+		The range of flat cell indices.
+
+	Returns
+	-------
+	ndarray
+		A boolean array with stop - start entries.
+	"""
+	bits = np.unpackbits(plane[start // 8:(stop + 7) // 8], bitorder='little')
+	return bits[start % 8:start % 8 + stop - start].astype(bool)
+
+
+def findExitSide(room, exitCoordinates):
+	"""
+	Find the side of the room in which the exit cell has an open outer wall.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	exitCoordinates : tuple
+		The coordinates of the exit cell.
+
+	Returns
+	-------
+	int
+		The wall side of the exit, or -1 if the exit cell has no open outer wall.
+	"""
+	for side in range(len(room.walls)):
+		dim = side // 2
+		boundary = room.shape[dim] - 1 if side % 2 == 0 else 0
+		if exitCoordinates[dim] == boundary and not room.walls[side][tuple(exitCoordinates)]:
+			return side
+	return -1
+
+
+class MazeFile:
+	"""
+	A maze file opened with np.memmap. Opening reads only the header, so it is instant even for huge mazes;
+	cells, walls and distances are read on demand.
+	"""
+	def __init__(self, path):
+		# Packed mazes in memory (see packMaze) are read the same way as files
+		inMemory = isinstance(path, (bytes, bytearray, memoryview))
+		self.path = '<{:d} bytes in memory>'.format(len(path)) if inMemory else path
+		prefixSize = struct.calcsize(prefixFormat)
+		# Read the fixed prefix first, then exactly the three vectors of dimCount coordinates it announces
+		prefix = self.readBytes(path, 0, prefixSize)
+		if len(prefix) < prefixSize:
+			raise ValueError('{} is not a maze file.'.format(self.path))
+		fileMagic, version, dimCount, self.exitSide, distanceBytes, self.seed = struct.unpack(prefixFormat, prefix)
+		if fileMagic != magic:
+			raise ValueError('{} is not a maze file.'.format(self.path))
+		if version > formatVersion:
+			raise ValueError('{} was written by a newer version (format {:d}).'.format(self.path, version))
+		vectorBytes = self.readBytes(path, prefixSize, 24 * dimCount)
+		if len(vectorBytes) < 24 * dimCount:
+			raise ValueError('{} is cut off inside its header.'.format(self.path))
+		vectors = np.frombuffer(vectorBytes, dtype='<i8').reshape(3, dimCount)
+		self.shape = tuple(int(s) for s in vectors[0])
+		self.entrance = tuple(int(c) for c in vectors[1])
+		self.exit = tuple(int(c) for c in vectors[2])
+		self.cellCount = int(np.prod(self.shape))
+		self.strides = maze.helpers.flatStrides(self.shape)
+
+		offset = alignOffset(struct.calcsize(prefixFormat) + 24 * dimCount)
+		planeBytes = alignOffset((self.cellCount + 7) // 8)
+		self.planes = []
+		for plane in range(dimCount + 1):
+			self.planes.append(self.mapArray(path, np.uint8, offset, ((self.cellCount + 7) // 8,)))
+			offset += planeBytes
+		self.cellPlane = self.planes[0]
+		self.wallPlanes = self.planes[1:]
+		if distanceBytes > 0:
+			self.distance = self.mapArray(path, '<i{:d}'.format(distanceBytes), offset, self.shape)
+		else:
+			self.distance = None
+
+	def __repr__(self):
+		return 'Maze file {} with dimensions {}'.format(self.path, self.shape)
+
+	@staticmethod
+	def readBytes(source, offset, size):
+		"""
+		Read a few bytes of a maze file or a packed maze.
+		"""
+		if isinstance(source, (bytes, bytearray, memoryview)):
+			return bytes(source[offset:offset + size])
+		with open(source, 'rb') as mazeFile:
+			mazeFile.seek(offset)
+			return mazeFile.read(size)
+
+	@staticmethod
+	def mapArray(source, dtype, offset, shape):
+		"""
+		A read-only view of an array inside a maze file or a packed maze.
+		"""
+		if isinstance(source, (bytes, bytearray, memoryview)):
+			return np.frombuffer(source, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+		return np.memmap(source, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+	def flatIndices(self, coordinates):
+		"""
+		Convert coordinates into an int64 array and the matching flat cell indices.
+		"""
+		coordinates = np.asarray(coordinates, dtype=np.int64)
+		return coordinates, np.ravel_multi_index(tuple(coordinates.T), self.shape)
+
+	def isFilled(self, coordinates):
+		"""
+		Look up whether cells are filled.
+
+		Parameters
+		----------
+		coordinates : array_like
+			The coordinates of one cell, or one row of coordinates per cell.
+
+		Returns
+		-------
+		bool or ndarray
+			True for every filled cell.
+		"""
+		coordinates, indices = self.flatIndices(coordinates)
+		return (self.cellPlane[indices >> 3] >> (indices & 7)) & 1 == 1
+
+	def isWall(self, direction, coordinates):
+		"""
+		Look up whether the walls of cells in one direction are closed.
+
+		Parameters
+		----------
+		direction : int
+			The wall direction, as in room.walls.
+
+		coordinates : array_like
+			The coordinates of one cell, or one row of coordinates per cell.
+
+		Returns
+		-------
+		bool or ndarray
+			True for every closed wall.
+		"""
+		coordinates, indices = self.flatIndices(coordinates)
+		dim = direction // 2
+		plane = self.wallPlanes[dim]
+		if direction % 2 == 0:
+			return (plane[indices >> 3] >> (indices & 7)) & 1 == 1
+		# A backward wall is the forward wall of the previous cell
+		inside = coordinates[..., dim] > 0
+		previous = np.where(inside, indices - self.strides[dim], 0)
+		walls = np.where(inside, (plane[previous >> 3] >> (previous & 7)) & 1 == 1, True)
+		if self.exitSide == direction:
+			walls &= ~np.all(coordinates == np.array(self.exit), axis=-1)
+		return walls
+
+	def toRoom(self, room=None, slabCells=2**24):
+		"""
+		Unpack the maze into a Room.
+
+		Parameters
+		----------
+		room : Room, optional
+			A room with the right shape and contiguous arrays to unpack into, for example from helpers.memmapRoom().
+			By default a new room is created.
+
+		slabCells : int, optional
+			The number of cells that are unpacked at once.
+
+		Returns
+		-------
+		Room
+			The maze.
+		"""
+		if room is None:
+			room = maze.helpers.Room(self.shape)
+		slabCells = max(8, slabCells // 8 * 8)
+		cells = room.cells.reshape(-1)
+		walls = [w.reshape(-1) for w in room.walls]
+		for start in range(0, self.cellCount, slabCells):
+			stop = min(start + slabCells, self.cellCount)
+			cells[start:stop] = readBits(self.cellPlane, start, stop)
+			indices = np.arange(start, stop, dtype=np.int64)
+			for dim, plane in enumerate(self.wallPlanes):
+				stride = self.strides[dim]
+				walls[2 * dim][start:stop] = readBits(plane, start, stop)
+				backward = np.ones(stop - start, dtype=bool)
+				inside = (indices // stride) % self.shape[dim] > 0
+				previousStart = max(start - stride, 0)
+				previous = readBits(plane, previousStart, stop - stride) if stop - stride > 0 else np.zeros(0, dtype=bool)
+				backward[stop - start - previous.size:] = previous
+				walls[2 * dim + 1][start:stop] = backward | ~inside
+		if self.exitSide >= 0:
+			room.walls[self.exitSide][self.exit] = False
+		return room
+
+
+def mazeLayout(room, entrance, exitCoordinates, distance, seed):
+	"""
+	Build the header of a maze file and find the offsets of its sections.
+
+	Returns
+	-------
+	tuple
+		The header bytes, the offset of the first bit plane, the bytes per plane, the offset of the distance grid and
+		the bytes per distance entry.
+	"""
+	shape = tuple(int(s) for s in room.shape)
+	dimCount = len(shape)
+	cellCount = int(np.prod(shape))
+	distanceBytes = 0
+	if distance is not None:
+		distanceBytes = 4 if -2**31 <= np.min(distance) and np.max(distance) < 2**31 else 8
+	exitSide = findExitSide(room, exitCoordinates)
+
+	header = struct.pack(prefixFormat, magic, formatVersion, dimCount, exitSide, distanceBytes, seed)
+	header += np.array([shape, tuple(entrance), tuple(exitCoordinates)], dtype='<i8').tobytes()
+	planeBytes = alignOffset((cellCount + 7) // 8)
+	planeOffset = alignOffset(len(header))
+	distanceOffset = planeOffset + (dimCount + 1) * planeBytes
+	return header, planeOffset, planeBytes, distanceOffset, distanceBytes
+
+
+def saveMaze(path, room, entrance, exitCoordinates, distance=None, seed=-1, slabCells=2**24):
+	"""
+	Save a finished maze in the compact binary format, slab by slab.
+
+	Parameters
+	----------
+	path : str
+		The file to write.
+
+	room : object
+		The room with the finished maze. Its arrays should be C-contiguous (memory-mapped arrays are fine).
+
+	entrance, exitCoordinates : tuple
+		The entrance and exit of the maze.
+
+	distance : ndarray, optional
+		A grid with the distance of every cell from the entrance, as returned by the generators.
+		It is stored with 4 bytes per cell if the values allow it, else with 8 bytes.
+
+	seed : int, optional
+		The random seed that generated the maze, for reference.
+
+	slabCells : int, optional
+		The number of cells that are packed at once.
+	"""
+	header, planeOffset, planeBytes, distanceOffset, distanceBytes = mazeLayout(room, entrance, exitCoordinates, distance, seed)
+	dimCount = len(room.shape)
+	cellCount = int(np.prod(room.shape))
+	with open(path, 'wb') as mazeFile:
+		mazeFile.write(header)
+		mazeFile.truncate(distanceOffset + distanceBytes * cellCount)
+
+	slabCells = max(8, slabCells // 8 * 8)
+	planes = [room.cells] + [room.walls[2 * dim] for dim in range(dimCount)]
+	for index, array in enumerate(planes):
+		target = np.memmap(path, dtype=np.uint8, mode='r+', offset=planeOffset + index * planeBytes, shape=((cellCount + 7) // 8,))
+		source = array.reshape(-1)
+		for start in range(0, cellCount, slabCells):
+			stop = min(start + slabCells, cellCount)
+			target[start // 8:(stop + 7) // 8] = np.packbits(source[start:stop], bitorder='little')
+		target.flush()
+		del target
+	if distanceBytes > 0:
+		target = np.memmap(path, dtype='<i{:d}'.format(distanceBytes), mode='r+', offset=distanceOffset, shape=(cellCount,))
+		source = np.asarray(distance).reshape(-1)
+		for start in range(0, cellCount, slabCells):
+			target[start:start + slabCells] = source[start:start + slabCells]
+		target.flush()
+		del target
+
+
+def packMaze(room, entrance, exitCoordinates, distance=None, seed=-1):
+	"""
+	Pack a finished maze into bytes, in the same layout as a maze file, for example to send it to another process.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	entrance, exitCoordinates : tuple
+		The entrance and exit of the maze.
+
+	distance : ndarray, optional
+		A grid with the distance of every cell from the entrance.
+
+	seed : int, optional
+		The random seed that generated the maze, for reference.
+
+	Returns
+	-------
+	bytes
+		The packed maze; unpackMaze() or openMaze() read it back.
+	"""
+	header, planeOffset, planeBytes, distanceOffset, distanceBytes = mazeLayout(room, entrance, exitCoordinates, distance, seed)
+	cellCount = int(np.prod(room.shape))
+	data = bytearray(distanceOffset + distanceBytes * cellCount)
+	data[:len(header)] = header
+	planes = [room.cells] + [room.walls[2 * dim] for dim in range(len(room.shape))]
+	for index, array in enumerate(planes):
+		packed = np.packbits(np.asarray(array).reshape(-1), bitorder='little')
+		start = planeOffset + index * planeBytes
+		data[start:start + packed.size] = packed.tobytes()
+	if distanceBytes > 0:
+		data[distanceOffset:] = np.asarray(distance).astype('<i{:d}'.format(distanceBytes)).tobytes()
+	return bytes(data)
+
+
+def unpackMaze(data):
+	"""
+	Unpack a maze that was packed with packMaze().
+
+	Returns
+	-------
+	tuple
+		The room, the distance grid (or None), the entrance and the exit.
+	"""
+	return loadMaze(data)
+
+
+def openMaze(path):
+	"""
+	Open a maze file for random access, without reading it.
+
+	Parameters
+	----------
+	path : str
+		The maze file.
+
+	Returns
+	-------
+	MazeFile
+		The opened maze.
+	"""
+	return MazeFile(path)
+
+
+def loadMaze(path):
+	"""
+	Load a maze file completely.
+
+	Parameters
+	----------
+	path : str or bytes
+		The maze file, or a maze packed with packMaze().
+
+	Returns
+	-------
+	tuple
+		The room, the distance grid (or None), the entrance and the exit.
+	"""
+	mazeFile = MazeFile(path)
+	distance = None if mazeFile.distance is None else np.array(mazeFile.distance)
+	return mazeFile.toRoom(), distance, mazeFile.entrance, mazeFile.exit
@@ -0,0 +1,227 @@
+import itertools
+import json
+import maze.excavation
+import maze.helpers
+import maze.metrics
+import multiprocessing
+import numpy as np
+import os
+import random
+import time
+
+"""
+A parallel parameter sweep over maze generation settings.
+The parameterGrid() function expands a dictionary of value lists into all combinations.
+The runConfiguration() function generates and scores one maze; it runs inside the worker processes.
+The runSweep() function fans all (parameters, seed) combinations out across a process pool, and appends the small
+summaries to a JSON lines file as they come in. Combinations that are already in the file are skipped, and a line
+that an interruption cut off is removed, so an interrupted sweep can simply be started again.
+"""
+
+generators = maze.excavation.generators
+
+defaultParameters = {
+	'generator': 'passages',
+	'fillRatio': 0,
+	'typicalCavernDiameter': 5,
+	'sizeDeviation': 1,
+}
+
+
+def parameterGrid(grid):
+	"""
+	Expand a dictionary of value lists into a list of parameter dictionaries, one for every combination.
+
+	Parameters:
+	grid: dict
+		Maps every parameter name to a list of values, for example {'flatness': [(0, 0), (5, 0)], 'fillRatio': [0, 0.1]}.
+
+	Returns:
+	list of dict
+		One dictionary per combination.
+	"""
+	names = sorted(grid)
+	return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def configurationKey(parameters, seed, shape, startPosition):
+	"""
+	Build a unique, hashable key for a combination of parameters, seed, room shape and start position, used to skip
+	finished work.
+
+	Parameters:
+	parameters: dict
+		The parameters of one configuration. Values must be JSON serializable.
+	seed: int
+		The random seed.
+	shape: tuple of int
+		The shape of the room.
+	startPosition: tuple of int
+		The entrance of the maze.
+
+	Returns:
+	str
+		The key.
+	"""
+	return json.dumps([parameters, seed, [int(s) for s in shape], [int(p) for p in startPosition]], sort_keys=True)
+
+
+def summarizeMetrics(metrics):
+	"""
+	Reduce the result of maze.metrics.measureMaze() to a few numbers that are cheap to send and store.
+
+	Parameters:
+	metrics: dict
+		The full metrics of one maze.
+
+	Returns:
+	dict
+		Scalar metrics only: the histograms are replaced by fractions and mean corridor lengths.
+	"""
+	summary = dict()
+	summary['deadEndFraction'] = metrics['deadEnds'] / metrics['cells']
+	summary['junctionFraction'] = float(np.sum(metrics['degreeHistogram'][3:])) / metrics['cells']
+	summary['meanDeadEndLength'] = metrics['meanDeadEndLength']
+	summary['meanRunLengths'] = []
+	for histogram in metrics['runLengths']:
+		lengths = np.arange(histogram.size)
+		summary['meanRunLengths'].append(float(np.sum(histogram * lengths) / max(np.sum(histogram), 1)))
+	if 'solutionLength' in metrics:
+		summary['solutionLength'] = metrics['solutionLength']
+		summary['solutionFraction'] = metrics['solutionFraction']
+	return summary
+
+
+def runConfiguration(task):
+	"""
+	Generate and score a single maze. This is the work done by every worker process of runSweep().
+
+	Parameters:
+	task: tuple
+		The room shape, the start position, the parameters and the seed.
+		Recognized parameters are flatness, generator (a key of the generators dictionary), fillRatio,
+		typicalCavernDiameter and sizeDeviation; missing ones are taken from defaultParameters,
+		and flatness defaults to 0 in every dimension.
+
+	Returns:
+	dict
+		The parameters, the seed, the room shape, the start position, the summarized metrics and the time it took.
+	"""
+	shape, startPosition, parameters, seed = task
+	settings = dict(defaultParameters)
+	settings['flatness'] = [0] * len(shape)
+	settings.update(parameters)
+	startTime = time.time()
+	np.random.seed(seed)
+	random.seed(seed)
+	room = maze.helpers.Room(shape)
+	if settings['fillRatio'] > 0:
+		room = maze.excavation.carveCaverns(room, settings['fillRatio'], settings['typicalCavernDiameter'], settings['sizeDeviation'])
+	room, distance, exitCoordinates = generators[settings['generator']](room, startPosition, settings['flatness'])
+	result = dict()
+	result['parameters'] = parameters
+	result['seed'] = seed
+	result['shape'] = list(shape)
+	result['startPosition'] = list(startPosition)
+	result['metrics'] = summarizeMetrics(maze.metrics.measureMaze(room, startPosition, exitCoordinates))
+	result['seconds'] = time.time() - startTime
+	return result
+
+
+def loadResults(resultPath):
+	"""
+	Read the results of an earlier sweep, skipping a line that was cut off when the sweep was interrupted.
+
+	Parameters:
+	resultPath: str
+		The JSON lines file written by runSweep().
+
+	Returns:
+	list of dict
+		All complete results.
+	"""
+	results = []
+	if os.path.exists(resultPath):
+		with open(resultPath) as resultFile:
+			for line in resultFile:
+				try:
+					results.append(json.loads(line))
+				except ValueError:
+					continue
+	return results
+
+
+def dropPartialLine(resultPath):
+	"""
+	Cut off a line that an interrupted sweep left unfinished at the end of the result file, so that new results
+	start on a line of their own. loadResults() skips such a line, so it was not counted as finished.
+
+	Parameters:
+	resultPath: str
+		The JSON lines file written by runSweep().
+	"""
+	if not os.path.exists(resultPath):
+		return
+	with open(resultPath, 'rb+') as resultFile:
+		resultFile.seek(0, os.SEEK_END)
+		size = resultFile.tell()
+		# Search backwards for the end of the last complete line
+		end = size
+		while end > 0:
+			start = max(end - 2**16, 0)
+			resultFile.seek(start)
+			newline = resultFile.read(end - start).rfind(b'\n')
+			if newline >= 0:
+				end = start + newline + 1
+				break
+			end = start
+		if end < size:
+			resultFile.truncate(end)
+
+
+def runSweep(grid, seeds, resultPath, shape, startPosition=None, processes=None, chunkSize=4):
+	"""
+	Generate and score a maze for every combination of parameters and seeds, using every core.
+	Only the small metric summaries travel back to the parent process, which appends each of them to the
+	result file as soon as it arrives. Combinations that are already in the result file are not run again.
+
+	Parameters:
+	grid: dict
+		The parameter grid, see parameterGrid() and runConfiguration().
+	seeds: list of int
+		The random seeds; every configuration is run once per seed.
+	resultPath: str
+		The JSON lines file that receives the results.
+	shape: tuple of int
+		The shape of the room.
+	startPosition: tuple of int, optional (default: the first corner)
+		The entrance of the maze.
+	processes: int, optional (default: the number of cores)
+		The number of worker processes.
+	chunkSize: int, optional (default=4)
+		The number of configurations that are handed to a worker at once.
+
+	Returns:
+	int
+		The number of configurations that were run.
+	"""
+	if startPosition is None:
+		startPosition = (0,) * len(shape)
+	# Results of older files without a shape or start position never match, so they are run again
+	finished = set(configurationKey(r['parameters'], r['seed'], r.get('shape', ()), r.get('startPosition', ())) for r in loadResults(resultPath))
+	tasks = []
+	for parameters in parameterGrid(grid):
+		for seed in seeds:
+			key = configurationKey(parameters, seed, shape, startPosition)
+			if key not in finished:
+				finished.add(key)
+				tasks.append((tuple(shape), tuple(startPosition), parameters, seed))
+	if len(tasks) == 0:
+		return 0
+
+	dropPartialLine(resultPath)
+	with multiprocessing.Pool(processes) as pool, open(resultPath, 'a') as resultFile:
+		for result in pool.imap_unordered(runConfiguration, tasks, chunkSize):
+			resultFile.write(json.dumps(result) + '\n')
+			resultFile.flush()
+	return len(tasks)
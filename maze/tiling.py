@@ -0,0 +1,401 @@
+import maze.helpers
+import numpy as np
+
+"""
+A tiled storage backend for rooms with large homogeneous areas, such as rooms with many caverns.
+The room is split into fixed-size n-dimensional tiles. A tile that is completely solid (all cells filled, all walls closed)
+or completely open (all cells empty, all walls open except the outer walls of the room) is stored as a flag only;
+just the mixed tiles hold arrays, and a homogeneous tile is only materialized when it is first written to.
+The class TiledRoom holds the tiles, and offers cells and walls arrays with basic (integer and slice) indexing.
+The class TiledArray is one of those arrays.
+"""
+
+solidTile = 0
+openTile = 1
+mixedTile = 2
+
+
+class TiledArray:
+	"""
+	The cells array or one of the walls arrays of a TiledRoom.
+	It supports reading and writing with integers and slices (like room.cells[2:5, 7] = False),
+	but not flat or boolean indexing. Reading always returns a new dense array.
+	"""
+	def __init__(self, tiledRoom, arrayIndex):
+		self.tiledRoom = tiledRoom
+		self.arrayIndex = arrayIndex
+		self.shape = tiledRoom.shape
+		self.ndim = len(tiledRoom.shape)
+		self.dtype = np.dtype(bool)
+
+	def __repr__(self):
+		return 'Tiled array with dimensions {}'.format(self.shape)
+
+	def __getitem__(self, key):
+		return self.tiledRoom.read(self.arrayIndex, key)
+
+	def __setitem__(self, key, value):
+		self.tiledRoom.write(self.arrayIndex, key, value)
+
+	def __array__(self, dtype=None, copy=None):
+		dense = self.tiledRoom.read(self.arrayIndex, Ellipsis)
+		return dense if dtype is None else dense.astype(dtype)
+
+
+class TiledRoom:
+	"""
+	A room stored in tiles, with the same cells and walls semantics as helpers.Room.
+	Only mixed tiles take memory, so a room that consists mostly of caverns or untouched rock is stored in a fraction
+	of the space of a Room. Region-level operations (excavate_cavern, region, storeRegion) work tile by tile and
+	skip the arrays of homogeneous tiles entirely. Generators need a dense Room; carve a region() and store it back.
+	"""
+	def __init__(self, shape, tileShape=32):
+		self.shape = tuple(int(s) for s in shape)
+		if np.isscalar(tileShape):
+			tileShape = (tileShape,) * len(self.shape)
+		self.tileShape = tuple(int(t) for t in tileShape)
+		self.gridShape = tuple(-(-s // t) for s, t in zip(self.shape, self.tileShape))
+		self.states = np.full(self.gridShape, solidTile, dtype=np.uint8)
+		self.tiles = dict()
+		self.cells = TiledArray(self, 0)
+		self.walls = [TiledArray(self, 1 + d) for d in range(2 * len(self.shape))]
+
+	def __repr__(self):
+		return 'Tiled room grid with dimensions {} ({:d} of {:d} tiles materialized)'.format(self.shape, len(self.tiles), self.states.size)
+
+	@property
+	def nbytes(self):
+		"""
+		The memory taken by the tile flags and all materialized tiles, in bytes.
+		"""
+		return self.states.nbytes + sum(sum(a.nbytes for a in arrays) for arrays in self.tiles.values())
+
+	def normalizeKey(self, key):
+		"""
+		Convert a basic index into the box it selects.
+
+		Parameters
+		----------
+		key : int, slice, Ellipsis or tuple of those
+
+		Returns
+		-------
+		tuple
+			The start and stop coordinates of the box, and the dimensions that were selected with an integer.
+		"""
+		if not isinstance(key, tuple):
+			key = (key,)
+		if Ellipsis in key:
+			index = key.index(Ellipsis)
+			key = key[:index] + (slice(None),) * (len(self.shape) - len(key) + 1) + key[index + 1:]
+		key = key + (slice(None),) * (len(self.shape) - len(key))
+		if len(key) != len(self.shape):
+			raise IndexError('Too many indices for a room with {:d} dimensions.'.format(len(self.shape)))
+		starts, stops, integerDims = [], [], []
+		for dim, (k, size) in enumerate(zip(key, self.shape)):
+			if isinstance(k, slice):
+				start, stop, step = k.indices(size)
+				if step != 1:
+					raise IndexError('Tiled arrays only support slices with a step of 1.')
+				stop = max(start, stop)
+			else:
+				start = int(k) + size if int(k) < 0 else int(k)
+				if not 0 <= start < size:
+					raise IndexError('Index {:d} is out of bounds for dimension {:d}.'.format(int(k), dim))
+				stop = start + 1
+				integerDims.append(dim)
+			starts.append(start)
+			stops.append(stop)
+		return starts, stops, integerDims
+
+	def overlappingTiles(self, starts, stops):
+		"""
+		List the tiles that overlap a box, with the overlapping part of each.
+
+		Parameters
+		----------
+		starts, stops : list
+			The box.
+
+		Returns
+		-------
+		list
+			For every tile: its index, the overlap as slices within the tile, as slices within the box,
+			and the global start and stop coordinates of the overlap.
+		"""
+		if any(stop <= start for start, stop in zip(starts, stops)):
+			return []
+		first = [start // t for start, t in zip(starts, self.tileShape)]
+		last = [(stop - 1) // t for stop, t in zip(stops, self.tileShape)]
+		overlaps = []
+		for offset in np.ndindex(*[l - f + 1 for f, l in zip(first, last)]):
+			tileIndex = tuple(f + o for f, o in zip(first, offset))
+			overlapStarts = [max(start, i * t) for start, i, t in zip(starts, tileIndex, self.tileShape)]
+			overlapStops = [min(stop, (i + 1) * t) for stop, i, t in zip(stops, tileIndex, self.tileShape)]
+			tileSlices = tuple(slice(a - i * t, b - i * t) for a, b, i, t in zip(overlapStarts, overlapStops, tileIndex, self.tileShape))
+			boxSlices = tuple(slice(a - s, b - s) for a, b, s in zip(overlapStarts, overlapStops, starts))
+			overlaps.append((tileIndex, tileSlices, boxSlices, overlapStarts, overlapStops))
+		return overlaps
+
+	def homogeneousValues(self, state, arrayIndex, starts, stops):
+		"""
+		Generate the values of a solid or open tile inside a box.
+
+		Parameters
+		----------
+		state : int
+			solidTile or openTile.
+
+		arrayIndex : int
+			0 for the cells, 1 + direction for the walls.
+
+		starts, stops : list
+			The box, in global coordinates.
+
+		Returns
+		-------
+		ndarray
+			The values inside the box.
+		"""
+		boxShape = tuple(b - a for a, b in zip(starts, stops))
+		if state == solidTile:
+			return np.ones(boxShape, dtype=bool)
+		if arrayIndex == 0:
+			return np.zeros(boxShape, dtype=bool)
+		# Open tiles keep the outer walls of the room closed
+		direction = arrayIndex - 1
+		dim = direction // 2
+		outerLayer = self.shape[dim] - 1 if direction % 2 == 0 else 0
+		broadcastShape = [1] * len(boxShape)
+		broadcastShape[dim] = boxShape[dim]
+		isOuter = (np.arange(starts[dim], stops[dim]) == outerLayer).reshape(broadcastShape)
+		return np.broadcast_to(isOuter, boxShape).copy()
+
+	def tileBox(self, tileIndex):
+		"""
+		The global start and stop coordinates of a tile (tiles at the far end of the room may be smaller).
+		"""
+		starts = [i * t for i, t in zip(tileIndex, self.tileShape)]
+		stops = [min((i + 1) * t, s) for i, t, s in zip(tileIndex, self.tileShape, self.shape)]
+		return starts, stops
+
+	def materialize(self, tileIndex):
+		"""
+		Turn a homogeneous tile into a mixed tile with its own arrays.
+
+		Parameters
+		----------
+		tileIndex : tuple
+			The index of the tile in the tile grid.
+		"""
+		if self.states[tileIndex] == mixedTile:
+			return
+		starts, stops = self.tileBox(tileIndex)
+		state = self.states[tileIndex]
+		self.tiles[tileIndex] = [self.homogeneousValues(state, a, starts, stops) for a in range(1 + len(self.walls))]
+		self.states[tileIndex] = mixedTile
+
+	def classifyTile(self, arrays, starts, stops):
+		"""
+		Decide whether the arrays of a tile are solid, open or mixed.
+
+		Parameters
+		----------
+		arrays : list
+			The cells array followed by the walls arrays of the tile.
+
+		starts, stops : list
+			The box of the tile, in global coordinates.
+
+		Returns
+		-------
+		int
+			solidTile, openTile or mixedTile.
+		"""
+		if all(np.all(a) for a in arrays):
+			return solidTile
+		if not np.any(arrays[0]) and all(np.array_equal(a, self.homogeneousValues(openTile, i, starts, stops)) for i, a in enumerate(arrays) if i > 0):
+			return openTile
+		return mixedTile
+
+	def compact(self, tileIndices=None):
+		"""
+		Turn mixed tiles that have become homogeneous back into flags, releasing their arrays.
+
+		Parameters
+		----------
+		tileIndices : list, optional
+			The tiles to check. By default all mixed tiles are checked.
+		"""
+		if tileIndices is None:
+			tileIndices = list(self.tiles)
+		for tileIndex in tileIndices:
+			if self.states[tileIndex] != mixedTile:
+				continue
+			starts, stops = self.tileBox(tileIndex)
+			state = self.classifyTile(self.tiles[tileIndex], starts, stops)
+			if state != mixedTile:
+				self.states[tileIndex] = state
+				del self.tiles[tileIndex]
+
+	def read(self, arrayIndex, key):
+		"""
+		Read a box of one of the arrays.
+
+		Parameters
+		----------
+		arrayIndex : int
+			0 for the cells, 1 + direction for the walls.
+
+		key : index
+			A basic index, see normalizeKey().
+
+		Returns
+		-------
+		ndarray
+			A dense copy of the selected values.
+		"""
+		starts, stops, integerDims = self.normalizeKey(key)
+		result = np.empty([b - a for a, b in zip(starts, stops)], dtype=bool)
+		for tileIndex, tileSlices, boxSlices, overlapStarts, overlapStops in self.overlappingTiles(starts, stops):
+			state = self.states[tileIndex]
+			if state == mixedTile:
+				result[boxSlices] = self.tiles[tileIndex][arrayIndex][tileSlices]
+			else:
+				result[boxSlices] = self.homogeneousValues(state, arrayIndex, overlapStarts, overlapStops)
+		if integerDims:
+			result = result.reshape([s for dim, s in enumerate(result.shape) if dim not in integerDims])
+		return result
+
+	def write(self, arrayIndex, key, value):
+		"""
+		Write to a box of one of the arrays. Homogeneous tiles are only materialized if the write changes them.
+
+		Parameters
+		----------
+		arrayIndex : int
+			0 for the cells, 1 + direction for the walls.
+
+		key : index
+			A basic index, see normalizeKey().
+
+		value : bool or array_like
+			The new values, broadcastable to the selected box.
+		"""
+		starts, stops, integerDims = self.normalizeKey(key)
+		boxShape = [b - a for a, b in zip(starts, stops)]
+		value = np.asarray(value, dtype=bool)
+		if value.ndim > 0:
+			selectedShape = [s for dim, s in enumerate(boxShape) if dim not in integerDims]
+			value = np.broadcast_to(value, selectedShape).reshape(boxShape)
+		for tileIndex, tileSlices, boxSlices, overlapStarts, overlapStops in self.overlappingTiles(starts, stops):
+			piece = value if value.ndim == 0 else value[boxSlices]
+			state = self.states[tileIndex]
+			if state != mixedTile:
+				current = self.homogeneousValues(state, arrayIndex, overlapStarts, overlapStops)
+				if np.all(current == piece):
+					continue
+				self.materialize(tileIndex)
+			self.tiles[tileIndex][arrayIndex][tileSlices] = piece
+
+	def excavate_cavern(self, cavern):
+		"""
+		Excavate a cavern, like Room.excavate_cavern. Tiles that lie inside the cavern together with all their
+		neighbors become open tiles directly, without ever being materialized.
+
+		Parameters:
+		cavern: dict
+			A dictionary containing the position and shape of the cavern.
+		"""
+		position = [int(p) for p in cavern['position']]
+		shape = [int(s) for s in cavern['shape']]
+		stops = [p + s for p, s in zip(position, shape)]
+		for tileIndex, tileSlices, boxSlices, overlapStarts, overlapStops in self.overlappingTiles(position, stops):
+			tileStarts, tileStops = self.tileBox(tileIndex)
+			interior = all(p <= max(a - 1, 0) and q >= min(b + 1, s) for p, q, a, b, s in zip(position, stops, tileStarts, tileStops, self.shape))
+			if interior:
+				self.states[tileIndex] = openTile
+				self.tiles.pop(tileIndex, None)
+		coordinateSlices = [slice(p, q) for p, q in zip(position, stops)]
+		self.cells[tuple(coordinateSlices)] = False
+		for dim in range(len(shape)):
+			forwardSlices = list(coordinateSlices)
+			backwardSlices = list(coordinateSlices)
+			forwardSlices[dim] = slice(position[dim], stops[dim] - 1)
+			backwardSlices[dim] = slice(position[dim] + 1, stops[dim])
+			self.walls[2 * dim][tuple(forwardSlices)] = False
+			self.walls[2 * dim + 1][tuple(backwardSlices)] = False
+
+	def region(self, position, shape):
+		"""
+		Copy a box of the tiled room into a dense Room, for example to carve passages in it.
+
+		Parameters
+		----------
+		position : tuple
+			The lowest corner of the box.
+
+		shape : tuple
+			The size of the box.
+
+		Returns
+		-------
+		Room
+			A dense room with the contents of the box.
+		"""
+		key = tuple(slice(p, p + s) for p, s in zip(position, shape))
+		return maze.helpers.Room(shape, cells=self.cells[key], walls=[w[key] for w in self.walls])
+
+	def storeRegion(self, position, room):
+		"""
+		Write a dense Room back into a box of the tiled room, and compact the tiles it touched.
+
+		Parameters
+		----------
+		position : tuple
+			The lowest corner of the box.
+
+		room : Room
+			The dense room.
+		"""
+		key = tuple(slice(p, p + s) for p, s in zip(position, room.shape))
+		self.cells[key] = room.cells
+		for tiledWalls, walls in zip(self.walls, room.walls):
+			tiledWalls[key] = walls
+		starts, stops, integerDims = self.normalizeKey(key)
+		self.compact([t[0] for t in self.overlappingTiles(starts, stops)])
+
+	def toRoom(self):
+		"""
+		Expand the whole tiled room into a dense Room.
+		"""
+		return self.region((0,) * len(self.shape), self.shape)
+
+	@classmethod
+	def fromRoom(cls, room, tileShape=32):
+		"""
+		Store a dense Room in tiles.
+
+		Parameters
+		----------
+		room : Room
+			The dense room.
+
+		tileShape : int or tuple, optional
+			The size of every tile.
+
+		Returns
+		-------
+		TiledRoom
+			The tiled room.
+		"""
+		tiledRoom = cls(room.shape, tileShape)
+		for tileIndex in np.ndindex(*tiledRoom.gridShape):
+			starts, stops = tiledRoom.tileBox(tileIndex)
+			key = tuple(slice(a, b) for a, b in zip(starts, stops))
+			arrays = [np.array(room.cells[key])] + [np.array(w[key]) for w in room.walls]
+			state = tiledRoom.classifyTile(arrays, starts, stops)
+			tiledRoom.states[tileIndex] = state
+			if state == mixedTile:
+				tiledRoom.tiles[tileIndex] = arrays
+		return tiledRoom
@@ -0,0 +1,189 @@
+import maze.helpers
+import numpy as np
+
+"""
+Checks for finished mazes, working directly on the wall arrays of a Room.
+The labelComponents() function finds the connected parts of a maze with an array-based union-find, and numbers them
+in linear time.
+The validateMaze() function reports unreachable regions, loops and inconsistent walls.
+The repairMaze() function opens the fewest walls that connect all regions, and can optionally break loops.
+"""
+
+
+def labelComponents(room, slabCells=2**22):
+	"""
+	Label the connected components of a maze: two cells belong to the same component if a path of open walls
+	connects them. The open walls are fed slab by slab into an array-based union-find.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	slabCells : int, optional
+		The number of cells whose walls are processed at once.
+
+	Returns
+	-------
+	tuple
+		A grid with the component label of every cell (from 0 to the number of components - 1),
+		and the number of components.
+	"""
+	cellCount = int(np.prod(room.shape))
+	strides = maze.helpers.flatStrides(room.shape)
+	parent = np.arange(cellCount, dtype=np.int64)
+	for slab in maze.helpers.slabRanges(room.shape, slabCells):
+		for dim in range(len(room.shape)):
+			lowerCells = maze.helpers.forwardWallIndices(room, dim, slab)
+			maze.helpers.connectEdges(parent, lowerCells, lowerCells + strides[dim])
+	# Point every cell straight at its root, a slab at a time, so the search only needs temporaries per slab
+	chunks = [range(start, min(start + slabCells, cellCount)) for start in range(0, cellCount, max(slabCells, 1))]
+	for chunk in chunks:
+		parent[chunk.start:chunk.stop] = maze.helpers.findRoots(parent, np.arange(chunk.start, chunk.stop, dtype=np.int64))
+	# Number the roots in index order and relabel every cell in place, in linear time
+	isRoot = np.empty(cellCount, dtype=bool)
+	for chunk in chunks:
+		isRoot[chunk.start:chunk.stop] = parent[chunk.start:chunk.stop] == np.arange(chunk.start, chunk.stop, dtype=np.int64)
+	rootLabels = np.cumsum(isRoot, dtype=np.int64)
+	del isRoot
+	rootLabels -= 1
+	componentCount = int(rootLabels[-1]) + 1 if cellCount > 0 else 0
+	for chunk in chunks:
+		parent[chunk.start:chunk.stop] = rootLabels[parent[chunk.start:chunk.stop]]
+	del rootLabels
+	return parent.reshape(room.shape), componentCount
+
+
+def countAsymmetricWalls(room):
+	"""
+	Count the walls that are open on one side but closed on the other.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	Returns
+	-------
+	int
+		The number of inconsistent walls.
+	"""
+	count = 0
+	for dim in range(len(room.shape)):
+		forwardSelector = [slice(None)] * len(room.shape)
+		backwardSelector = [slice(None)] * len(room.shape)
+		forwardSelector[dim] = slice(0, -1)
+		backwardSelector[dim] = slice(1, None)
+		count += int(np.count_nonzero(room.walls[2 * dim][tuple(forwardSelector)] != room.walls[2 * dim + 1][tuple(backwardSelector)]))
+	return count
+
+
+def validateMaze(room, startPosition, slabCells=2**22):
+	"""
+	Check whether every cell of a maze can be reached from the entrance, and whether the maze has loops.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	startPosition : tuple
+		The entrance of the maze.
+
+	slabCells : int, optional
+		The number of cells whose walls are processed at once.
+
+	Returns
+	-------
+	dict
+		components: the number of connected components.
+		unreachableCells: the number of cells that cannot be reached from the entrance.
+		unreachableRegions: a list of (label, size) pairs for all components without the entrance.
+		loops: the number of independent loops (open walls that are not needed to connect the cells).
+			Caverns always contain loops.
+		asymmetricWalls: the number of walls that are open on one side only.
+		labels: the component label of every cell.
+	"""
+	labels, componentCount = labelComponents(room, slabCells)
+	sizes = np.bincount(labels.ravel(), minlength=componentCount)
+	startLabel = labels[tuple(startPosition)]
+	openWallCount = 0
+	for dim in range(len(room.shape)):
+		selector = [slice(None)] * len(room.shape)
+		selector[dim] = slice(0, -1)
+		openWallCount += int(np.count_nonzero(~room.walls[2 * dim][tuple(selector)]))
+	report = dict()
+	report['components'] = componentCount
+	report['unreachableCells'] = int(labels.size - sizes[startLabel])
+	report['unreachableRegions'] = [(int(label), int(sizes[label])) for label in range(componentCount) if label != startLabel]
+	report['loops'] = openWallCount - labels.size + componentCount
+	report['asymmetricWalls'] = countAsymmetricWalls(room)
+	report['labels'] = labels
+	return report
+
+
+def repairMaze(room, breakLoops=False, slabCells=2**22):
+	"""
+	Connect all components of a maze by opening the fewest possible walls: walls between two different
+	components are shuffled and opened whenever they join two components that are not connected yet.
+	Optionally, loops are broken afterwards by closing every open wall that is not needed to connect the cells.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze. Updated in place.
+
+	breakLoops : bool, optional
+		If True, redundant open walls are closed, which turns the maze into a perfect maze (this also fills up caverns).
+
+	slabCells : int, optional
+		The number of cells whose walls are processed at once.
+
+	Returns
+	-------
+	tuple
+		The number of walls that were opened, and the number of walls that were closed.
+	"""
+	strides = maze.helpers.flatStrides(room.shape)
+	dimCount = len(room.shape)
+	closedCount = 0
+	if breakLoops:
+		# Keep a spanning forest of the open walls, in random order, and close all others
+		cellCount = int(np.prod(room.shape))
+		parent = np.arange(cellCount, dtype=np.int64)
+		for slab in maze.helpers.slabRanges(room.shape, slabCells):
+			for dim in np.random.permutation(dimCount):
+				lowerCells = np.random.permutation(maze.helpers.forwardWallIndices(room, dim, slab))
+				upperCells = lowerCells + strides[dim]
+				redundant = ~maze.helpers.uniteEdges(parent, lowerCells, upperCells)
+				room.walls[2 * dim].flat[lowerCells[redundant]] = True
+				room.walls[2 * dim + 1].flat[upperCells[redundant]] = True
+				closedCount += int(np.count_nonzero(redundant))
+		del parent
+
+	labels, componentCount = labelComponents(room, slabCells)
+	openedCount = 0
+	if componentCount > 1:
+		# Collect the closed walls between different components
+		lowerCells = []
+		wallDims = []
+		for slab in maze.helpers.slabRanges(room.shape, slabCells):
+			for dim in range(dimCount):
+				candidates = maze.helpers.forwardWallIndices(room, dim, slab, isOpen=False)
+				candidates = candidates[labels.flat[candidates] != labels.flat[candidates + strides[dim]]]
+				lowerCells.append(candidates)
+				wallDims.append(np.full(candidates.size, dim, dtype=np.int8))
+		order = np.random.permutation(sum(c.size for c in lowerCells))
+		lowerCells = np.concatenate(lowerCells)[order]
+		wallDims = np.concatenate(wallDims)[order]
+		upperCells = lowerCells + np.take(strides, wallDims)
+
+		# Kruskal's algorithm on the components picks exactly componentCount - 1 walls
+		parent = np.arange(componentCount, dtype=np.int64)
+		opened = maze.helpers.uniteEdges(parent, labels.flat[lowerCells], labels.flat[upperCells])
+		for dim in range(dimCount):
+			selected = opened & (wallDims == dim)
+			room.walls[2 * dim].flat[lowerCells[selected]] = False
+			room.walls[2 * dim + 1].flat[upperCells[selected]] = False
+		openedCount = int(np.count_nonzero(opened))
+	return openedCount, closedCount
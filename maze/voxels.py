@@ -0,0 +1,103 @@
+import numpy as np
+
+"""
+Implicit voxel queries: decide for arbitrary voxel coordinates whether plotTools.renderWalls would put a wall there,
+without rendering anything else. A voxel coordinate is split into the index of its cell and the offset inside the cell,
+and the answer is looked up in the walls of that cell, so any subset of an astronomically large render is cheap to evaluate.
+The queryVoxels() function evaluates a list (or a broadcastable set) of voxel coordinates.
+The renderBox() function renders a box of voxels, using open grids so no coordinate arrays of the box size are needed.
+"""
+
+
+def queryVoxels(room, voxelCoordinates, passageSize, wallThickness):
+	"""
+	Evaluate whether voxels are walls, with the same result as indexing the output of plotTools.renderWalls.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	voxelCoordinates : ndarray or tuple of ndarray
+		Either an array with one row of voxel coordinates per voxel, or a tuple with one (broadcastable) coordinate array
+		per dimension, like the output of np.ogrid or np.nonzero.
+
+	passageSize : int
+		The size of the passage in voxels.
+
+	wallThickness : int
+		The thickness of the walls in voxels.
+
+	Returns
+	-------
+	ndarray
+		True for every voxel that is a wall. Voxels outside of the rendered room are False.
+	"""
+	if isinstance(voxelCoordinates, (tuple, list)):
+		coordinates = np.broadcast_arrays(*[np.asarray(c, dtype=np.int64) for c in voxelCoordinates])
+	else:
+		voxelCoordinates = np.asarray(voxelCoordinates, dtype=np.int64)
+		coordinates = [voxelCoordinates[..., dim] for dim in range(voxelCoordinates.shape[-1])]
+	return evaluateVoxels(room, coordinates, passageSize, wallThickness)
+
+
+def evaluateVoxels(room, coordinates, passageSize, wallThickness):
+	"""
+	The core of queryVoxels and renderBox, for one coordinate array per dimension (the arrays only have to be broadcastable).
+	"""
+	cellSize = passageSize + 2 * wallThickness
+	cellIndices = [c // cellSize for c in coordinates]
+	offsets = [c % cellSize for c in coordinates]
+	inside = True
+	for index, size in zip(cellIndices, room.shape):
+		inside = inside & (index >= 0) & (index < size)
+	# Look up outside voxels in cell 0; they are masked at the end
+	cellIndices = tuple(np.where(inside, index, 0) for index in cellIndices)
+
+	# The corner pillars: every offset is on the first or last voxel of the cell
+	isWall = True
+	for offset in offsets:
+		isWall = isWall & ((offset == 0) | (offset == cellSize - 1))
+	# The border walls of the cell, where the wall in that direction is closed
+	for dim, offset in enumerate(offsets):
+		farSide = offset >= cellSize - wallThickness
+		nearSide = offset < wallThickness
+		if np.any(farSide):
+			isWall = isWall | (farSide & room.walls[2 * dim][cellIndices])
+		if np.any(nearSide):
+			isWall = isWall | (nearSide & room.walls[2 * dim + 1][cellIndices])
+	return np.broadcast_to(isWall & inside, np.broadcast_shapes(*[np.shape(c) for c in coordinates]))
+
+
+def renderBox(room, voxelPosition, voxelShape, passageSize, wallThickness):
+	"""
+	Render a box of voxels, with the same result as slicing the output of plotTools.renderWalls.
+
+	Parameters
+	----------
+	room : object
+		The room with the finished maze.
+
+	voxelPosition : tuple
+		The lowest corner of the box, in voxel coordinates.
+
+	voxelShape : tuple
+		The size of the box, in voxels.
+
+	passageSize : int
+		The size of the passage in voxels.
+
+	wallThickness : int
+		The thickness of the walls in voxels.
+
+	Returns
+	-------
+	ndarray
+		A boolean array with the shape voxelShape, True where there is a wall.
+	"""
+	openGrid = []
+	for dim, (position, size) in enumerate(zip(voxelPosition, voxelShape)):
+		broadcastShape = [1] * len(voxelShape)
+		broadcastShape[dim] = size
+		openGrid.append(np.arange(position, position + size, dtype=np.int64).reshape(broadcastShape))
+	return np.array(evaluateVoxels(room, openGrid, passageSize, wallThickness))